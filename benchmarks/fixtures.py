@@ -0,0 +1,50 @@
+import json
+import os
+
+# Model folders the synthetic sources spread their files over
+FOLDERS = ("checkpoints", "loras", "vae", "clip", "unet", "controlnet", "upscale_models", "embeddings")
+
+def make_sparse_file(path, size):
+    """Create a file of size bytes that takes (almost) no disk space."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    return path
+
+def make_registry(path, base_url, sources, files_per_source):
+    """
+    Write a registry JSON with sources entries named bench-00000, ...
+    Each source has files_per_source downloads under /files/ on base_url.
+    Returns the sources dict.
+    """
+    registry = {}
+    for i in range(sources):
+        name = f"bench-{i:05d}"
+        downloads = []
+        for j in range(files_per_source):
+            folder = FOLDERS[(i + j) % len(FOLDERS)]
+            filename = f"{name}-{j}.safetensors"
+            downloads.append({
+                'url': f"{base_url}/files/{name}/resolve/main/{filename}",
+                'dest': f"models/{folder}/{filename}",
+            })
+        registry[name] = {'description': f"Synthetic source {i}", 'downloads': downloads}
+    with open(path, 'w') as f:
+        json.dump({'sources': registry}, f)
+    return registry
+
+def make_comfyui_root(root, registry, installed_every=10, file_size=1024 * 1024):
+    """
+    Create a ComfyUI tree where every installed_every-th source is
+    installed (as sparse files of file_size bytes).
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "main.py"), 'w') as f:
+        f.write("# synthetic ComfyUI root\n")
+    for folder in FOLDERS:
+        os.makedirs(os.path.join(root, "models", folder), exist_ok=True)
+    for i, config in enumerate(registry.values()):
+        if i % installed_every == 0:
+            for item in config['downloads']:
+                make_sparse_file(os.path.join(root, item['dest']), file_size)
+    return root
@@ -0,0 +1,246 @@
+"""
+Benchmark comfydl against a local HTTP stand-in.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --sources 5000 --file-size 4G --output results.json
+    python benchmarks/run.py --baseline results.json --threshold 0.2
+
+Everything runs in a temporary HOME with a synthetic registry, so the
+user's config, caches and registries are not touched. Results are printed
+as JSON (or written to --output); with --baseline, benchmarks that got
+slower than the threshold are listed under "regressions" and the exit
+status is 1.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Differences below this many seconds are noise, never regressions
+MIN_DELTA = 0.001
+
+def measure(fn, repeat, setup=None):
+    """Time fn() repeat times (running setup() untimed before each run)."""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {'seconds': round(statistics.median(runs), 6), 'min': round(min(runs), 6), 'max': round(max(runs), 6), 'runs': len(runs)}
+
+def quiet_call(fn, *args, **kwargs):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return fn(*args, **kwargs)
+
+def run_benchmarks(args, workdir):
+    # Imported here so comfydl picks up the temporary HOME
+    from comfydl import registry, urlindex
+    from comfydl.bandwidth import parse_rate
+    from comfydl.cache import get_remote_cache
+    from comfydl.config import add_registry, get_registry_path, get_registry_meta_path
+    from comfydl.main import list_sources_status
+    from comfydl.planner import plan_files
+    from comfydl.sources import search_url_in_sources
+    from comfydl.partials import discard
+    from comfydl.utils import download_file
+    from server import SyntheticServer
+    from fixtures import make_sparse_file, make_registry, make_comfyui_root
+
+    file_size = int(parse_rate(args.file_size))
+    payload = make_sparse_file(os.path.join(workdir, "payload.bin"), file_size)
+    documents = {}
+    results = {}
+
+    with SyntheticServer(payload, documents) as server:
+        registry_file = os.path.join(workdir, "registry.json")
+        sources = make_registry(registry_file, server.base_url, args.sources, args.files_per_source)
+        documents["/registry.json"] = registry_file
+        comfyui_path = make_comfyui_root(os.path.join(workdir, "ComfyUI"), sources)
+        add_registry("bench", server.url("/registry.json"))
+
+        def reset_registry_file():
+            for path in (get_registry_path("bench"), get_registry_meta_path("bench")):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        def update_registry():
+            if not quiet_call(registry.update_registry, "bench"):
+                raise RuntimeError("Could not fetch the synthetic registry")
+
+        results['registry.update'] = measure(update_registry, args.repeat, setup=reset_registry_file)
+
+        def reset_registry_index(persisted=False):
+            registry._registry_index = None
+            if not persisted:
+                index_path = registry._registry_index_path()
+                if index_path.exists():
+                    index_path.unlink()
+
+        results['registry.load_cold'] = measure(registry.load_registry_sources, args.repeat, setup=reset_registry_index)
+        results['registry.load_persisted'] = measure(registry.load_registry_sources, args.repeat, setup=lambda: reset_registry_index(persisted=True))
+        results['registry.load_warm'] = measure(registry.load_registry_sources, args.repeat)
+
+        all_downloads = [item for config in sources.values() for item in config['downloads']]
+        results['status.local'] = measure(lambda: plan_files(all_downloads, comfyui_path, fetch_remote_size=False), args.repeat)
+
+        probe_downloads = [item for config in list(sources.values())[:args.probe_sources] for item in config['downloads']]
+
+        def clear_remote_cache():
+            cache = get_remote_cache()
+            for item in probe_downloads:
+                cache.delete(item['url'])
+
+        results['status.remote_cold'] = measure(lambda: plan_files(probe_downloads, comfyui_path), args.repeat, setup=clear_remote_cache)
+        results['status.remote_cached'] = measure(lambda: plan_files(probe_downloads, comfyui_path), args.repeat)
+
+        hit_url = all_downloads[len(all_downloads) // 2]['url']
+        miss_url = server.url("/files/not-in-any-source.safetensors")
+
+        def reset_url_index():
+            urlindex._url_index = None
+            index_path = urlindex._index_path()
+            if index_path.exists():
+                index_path.unlink()
+
+        results['search.cold'] = measure(lambda: search_url_in_sources(hit_url), args.repeat, setup=reset_url_index)
+        results['search.hit'] = measure(lambda: search_url_in_sources(hit_url), args.repeat)
+        results['search.miss'] = measure(lambda: search_url_in_sources(miss_url), args.repeat)
+        results['sources.list_status'] = measure(lambda: quiet_call(list_sources_status, comfyui_path), args.repeat)
+
+        dest = os.path.join(workdir, "downloads", "payload.safetensors")
+
+        def reset_download():
+            discard(dest)
+            if os.path.exists(dest):
+                os.remove(dest)
+
+        for engine in args.engines:
+            name = f"download.{engine}"
+            if engine != "native" and not shutil.which(engine):
+                results[name] = {'status': "skipped", 'reason': f"{engine} not installed"}
+                continue
+            url = server.url(f"/files/{engine}/payload.safetensors")
+            ok = []
+            result = measure(lambda: ok.append(quiet_call(download_file, url, dest, engine, quiet=True)), args.download_repeat, setup=reset_download)
+            reset_download()
+            if not all(ok):
+                results[name] = {'status': "failed"}
+                continue
+            result['bytes'] = file_size
+            result['throughput'] = round(file_size / result['seconds'])
+            results[name] = result
+
+    # Write caches now, not at exit after the workdir is gone
+    get_remote_cache().flush()
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Add 'change' (fraction slower than baseline, negative if faster) to
+    each result found in baseline. Runs are compared by their fastest
+    time, which is the least affected by noise from other processes.
+    Returns the names of regressions.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base or 'min' not in result or 'min' not in base:
+            continue
+        change = result['min'] / base['min'] - 1 if base['min'] else 0
+        result['change'] = round(change, 3)
+        if change > threshold and result['min'] - base['min'] > MIN_DELTA:
+            regressions.append(name)
+    return regressions
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(results, regressions, file):
+    for name, result in results.items():
+        if 'seconds' not in result:
+            print(f"{name:<26} {result.get('status')} {result.get('reason', '')}", file=file)
+            continue
+        line = f"{name:<26} {result['seconds'] * 1000:>10.2f} ms"
+        if result.get('throughput'):
+            line += f" {result['throughput'] / 1024 ** 2:>10.1f} MB/s"
+        if 'change' in result:
+            line += f" {result['change'] * 100:>+7.1f}%"
+        if name in regressions:
+            line += "  REGRESSION"
+        print(line, file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark comfydl against a local HTTP stand-in")
+    parser.add_argument("--sources", type=int, default=2000, help="Sources in the synthetic registry (default: 2000)")
+    parser.add_argument("--files-per-source", type=int, default=3, help="Downloads per source (default: 3)")
+    parser.add_argument("--probe-sources", type=int, default=100, help="Sources whose remote sizes are probed (default: 100)")
+    parser.add_argument("--file-size", default="2G", help="Size of the (sparse) download payload (default: 2G)")
+    parser.add_argument("--engines", default="aria2c,wget,native", help="Download engines to measure (default: aria2c,wget,native)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark (default: 5)")
+    parser.add_argument("--download-repeat", type=int, default=1, help="Runs per download benchmark (default: 1)")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown that counts as a regression (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+    args.engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="comfydl-bench-")
+    os.environ["HOME"] = os.path.join(workdir, "home")
+    os.makedirs(os.environ["HOME"])
+    sys.path.insert(0, REPO_ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        from comfydl import __version__
+        results = run_benchmarks(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    report = {
+        'comfydl_version': __version__,
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'params': {
+            'sources': args.sources,
+            'files_per_source': args.files_per_source,
+            'probe_sources': args.probe_sources,
+            'file_size': args.file_size,
+            'repeat': args.repeat,
+            'download_repeat': args.download_repeat,
+        },
+        'results': results,
+        'regressions': regressions,
+    }
+
+    print_table(results, regressions, sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
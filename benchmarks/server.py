@@ -0,0 +1,110 @@
+import email.utils
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        """Map a request path to a file: /files/* all serve the payload."""
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/files/"):
+            return self.server.payload
+        return self.server.documents.get(path)
+
+    def _send_file(self, head):
+        path = self._resolve()
+        if path is None:
+            self.send_error(404)
+            return
+        st = os.stat(path)
+        size = st.st_size
+        etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        status = 200
+        match = _RANGE_RE.match(self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(st.st_mtime, usegmt=True))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head:
+            return
+        with open(path, 'rb') as f:
+            try:
+                self.connection.sendfile(f, start, length)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def do_HEAD(self):
+        self._send_file(head=True)
+
+    def do_GET(self):
+        self._send_file(head=False)
+
+class SyntheticServer:
+    """
+    Local HTTP stand-in for Hugging Face, Civitai and registry hosts.
+    Every /files/<name> URL serves the same (sparse) payload file with
+    Range, ETag and conditional request support; documents maps other
+    paths (e.g. "/registry.json") to files. Use as a context manager.
+    """
+
+    def __init__(self, payload, documents=None):
+        self.payload = payload
+        self.documents = documents if documents is not None else {}
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path):
+        return self.base_url + path
+
+    def __enter__(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.payload = self.payload
+        self._httpd.documents = self.documents
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,260 @@
+"""
+Non-interactive asyncio API for embedding comfydl in other programs.
+
+Nothing here prompts. Results are plain dicts, failures raise, and
+progress is reported through callbacks, which may be plain functions or
+coroutine functions:
+
+    import asyncio
+    from comfydl import api
+
+    async def main():
+        plan = await api.plan("/srv/ComfyUI", sources=["flux1"])
+        results = await api.download(plan, on_progress=lambda item, done, total: ...)
+
+    asyncio.run(main())
+
+The blocking work (HTTP, disk, download engines) runs in worker threads,
+so one event loop can drive many downloads into many ComfyUI roots. All
+download() calls on a loop share the MAX_CONCURRENT_DOWNLOADS and
+HOST_CONCURRENCY limits and a pool of transfer threads of that size;
+planning and probing use a separate pool, so they never wait behind
+downloads. It is the same code the command line uses, minus the prompts
+and progress bars: download engines run quietly, but retries, warnings
+and errors are still printed to stdout.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from .partials import part_path
+from .planner import plan_entries
+from .scheduler import get_max_concurrent, get_host_limits, host_key, bytes_on_disk, expected_size, run_item
+from .sources import get_source_config, get_available_sources, installed_source_names, source_entries, installed_files, remove_files, collect_entries
+from .utils import check_downloader, get_remote_file_sizes
+
+PROGRESS_INTERVAL = 0.5
+
+# Planning, probing and other blocking calls; transfers have their own threads
+_worker_pool = ThreadPoolExecutor(thread_name_prefix="comfydl-api")
+
+async def _run(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_worker_pool, functools.partial(func, *args, **kwargs))
+
+class _Dispatcher:
+    """
+    The global and per-host download limits of one event loop, shared by
+    all download() calls on it, and the threads that run the transfers.
+    """
+
+    def __init__(self):
+        self.max_concurrent = get_max_concurrent()
+        self.host_limits = get_host_limits()
+        self.slots = asyncio.Semaphore(self.max_concurrent)
+        self.hosts = {}
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="comfydl-download")
+
+    def host_slots(self, url):
+        key = host_key(url, self.host_limits)
+        if key not in self.hosts:
+            self.hosts[key] = asyncio.Semaphore(self.host_limits.get(key, self.max_concurrent))
+        return self.hosts[key]
+
+_dispatchers = weakref.WeakKeyDictionary()
+
+def _get_dispatcher():
+    loop = asyncio.get_running_loop()
+    dispatcher = _dispatchers.get(loop)
+    if dispatcher is None:
+        dispatcher = _dispatchers[loop] = _Dispatcher()
+        weakref.finalize(loop, dispatcher.executor.shutdown, wait=False)
+    return dispatcher
+
+async def _notify(callback, *args):
+    if callback is None:
+        return
+    result = callback(*args)
+    if inspect.isawaitable(result):
+        await result
+
+def _resolve_source(name, priority=None):
+    entries, origin = source_entries(name, priority=priority)
+    if entries is None:
+        raise LookupError(f"Unknown model source '{name}'")
+    config, _ = get_source_config(name)
+    description = config.get('description') if isinstance(config, dict) else None
+    return {'name': name, 'origin': origin, 'description': description, 'entries': entries}
+
+async def resolve_source(name):
+    """
+    Load a model source by name or path. Returns a dict with 'name',
+    'origin', 'description' and 'entries' (its downloads, ready for
+    plan()). Raises LookupError if there is no such source.
+    """
+    return await _run(_resolve_source, name)
+
+async def list_sources():
+    """Names of all available model sources."""
+    return await _run(get_available_sources)
+
+def _build(comfyui_path, sources, urls, entries, fetch_remote_size, verify):
+    collected, errors = collect_entries(sources=sources, urls=urls)
+    if errors:
+        raise errors[0]
+    return plan_entries(collected + entries, comfyui_path, fetch_remote_size=fetch_remote_size, verify=verify)
+
+async def plan(comfyui_path, sources=(), urls=(), entries=(), fetch_remote_size=True, verify=None):
+    """
+    Plan installing sources (names, or dicts with 'name' and 'priority'),
+    urls (strings, or dicts with 'url' and optional 'dest', 'dir',
+    'sha256', 'mirrors', 'priority') and ready-made plan entries into
+    comfyui_path. Returns the plan dict of planner.build_plan plus
+    'conflicts' (dests claimed with different URLs; the first one wins).
+    verify ('size', 'quick' or 'full') also checks installed files.
+    """
+    return await _run(_build, os.path.abspath(comfyui_path), list(sources), list(urls), list(entries), fetch_remote_size, verify)
+
+async def probe(urls):
+    """Remote sizes of urls (cached where fresh): {url: size or None}."""
+    return await _run(get_remote_file_sizes, list(urls))
+
+async def download(plan, downloader=None, max_concurrent=None, host_limits=None, on_progress=None, on_file_done=None):
+    """
+    Download the files of plan (a plan dict or a list of its files) that
+    are not installed, higher 'priority' first. Transfers wait for the
+    limits shared by all download() calls on this event loop;
+    max_concurrent and host_limits further limit this call alone.
+
+    on_progress(item, done_bytes, total_bytes) is called about twice a
+    second for each running download (total_bytes may be None);
+    on_file_done(item, ok, retries) when a file finishes.
+    Returns a dict with 'succeeded', 'failed' and 'retried' lists of
+    items and 'seconds'. Each item gets 'ok', 'retries' and 'error' (why
+    it failed, None on success).
+    """
+    files = plan['files'] if isinstance(plan, dict) else plan
+    pending = sorted((item for item in files if not item['is_installed']), key=lambda item: -(item.get('priority') or 0))
+    results = {'succeeded': [], 'failed': [], 'retried': [], 'seconds': 0}
+    if not pending:
+        return results
+
+    downloader = downloader or await _run(check_downloader)
+    dispatcher = _get_dispatcher()
+    loop = asyncio.get_running_loop()
+    call_slots = asyncio.Semaphore(max_concurrent) if max_concurrent else None
+    call_hosts = {}
+    running = {}
+    start = time.time()
+
+    def call_host_slots(url):
+        if not host_limits:
+            return None
+        key = host_key(url, host_limits)
+        if key not in host_limits:
+            return None
+        if key not in call_hosts:
+            call_hosts[key] = asyncio.Semaphore(host_limits[key])
+        return call_hosts[key]
+
+    async def fetch(item):
+        # This call's own limits are taken before the shared ones, so an
+        # item held back by them never blocks other calls, and host limits
+        # before global ones, so an item waiting for a busy host never
+        # holds a slot another host could use.
+        async with AsyncExitStack() as stack:
+            for slots in (call_host_slots(item['url']), call_slots, dispatcher.host_slots(item['url']), dispatcher.slots):
+                if slots is not None:
+                    await stack.enter_async_context(slots)
+            running[item['path']] = item
+            try:
+                ok = await loop.run_in_executor(dispatcher.executor, run_item, item, downloader, True)
+            finally:
+                running.pop(item['path'], None)
+        item['ok'] = ok
+        results['succeeded' if ok else 'failed'].append(item)
+        if item['retries']:
+            results['retried'].append(item)
+        await _notify(on_file_done, item, ok, item['retries'])
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            for item in list(running.values()):
+                done = bytes_on_disk(part_path(item['path'])) or bytes_on_disk(item['path'])
+                await _notify(on_progress, item, done, expected_size(item))
+
+    progress = asyncio.ensure_future(report_progress()) if on_progress is not None else None
+    try:
+        await asyncio.gather(*(fetch(item) for item in pending))
+    finally:
+        if progress is not None:
+            progress.cancel()
+    results['seconds'] = round(time.time() - start, 3)
+    return results
+
+async def install(comfyui_path, sources=(), urls=(), entries=(), downloader=None, max_concurrent=None, on_progress=None, on_file_done=None):
+    """
+    plan() and download() in one step. Raises OSError if the files do
+    not fit on the disk. Returns {'plan': ..., 'results': ...}.
+    """
+    result = await plan(comfyui_path, sources=sources, urls=urls, entries=entries)
+    if not result['has_space']:
+        raise OSError(f"Not enough disk space in {result['comfyui_path']}: "
+                      f"{result['total_download_size']} bytes needed, {result['free_space']} free")
+    results = await download(result, downloader=downloader, max_concurrent=max_concurrent,
+                             on_progress=on_progress, on_file_done=on_file_done)
+    return {'plan': result, 'results': results}
+
+async def verify(comfyui_path, sources=None, mode="size"):
+    """
+    Check the installed files of sources (default: every source with
+    installed files) against the server; see verify.verify_files for the
+    modes. Returns a plan whose files have a 'status' of 'installed',
+    'missing', 'incomplete' or 'corrupt' and a 'verify_note'.
+    """
+    comfyui_path = os.path.abspath(comfyui_path)
+    if sources is None:
+        sources = await _run(installed_source_names, comfyui_path)
+    return await plan(comfyui_path, sources=sources, verify=mode)
+
+async def repair(plan, mode="size", downloader=None, max_concurrent=None, on_progress=None, on_file_done=None):
+    """
+    Fix the incomplete and corrupt files of a verify() plan: incomplete
+    files are resumed, corrupt ones downloaded again, and the downloaded
+    files are checked again in mode. Returns the download() results plus
+    'still_damaged', the rechecked files that are still not intact.
+    """
+    from .verify import prepare_repair, recheck
+    damaged = [item for item in plan['files'] if item['status'] in ("incomplete", "corrupt")]
+    if not damaged:
+        return {'succeeded': [], 'failed': [], 'retried': [], 'seconds': 0, 'still_damaged': []}
+    downloader = downloader or await _run(check_downloader)
+    for item in damaged:
+        await _run(prepare_repair, item, downloader)
+    results = await download(damaged, downloader=downloader, max_concurrent=max_concurrent,
+                             on_progress=on_progress, on_file_done=on_file_done)
+    results['still_damaged'] = await _run(recheck, results['succeeded'], plan['comfyui_path'], mode) if results['succeeded'] else []
+    return results
+
+def _remove(comfyui_path, sources, dry_run):
+    files = []
+    for name in sources:
+        found, _ = installed_files(_resolve_source(name)['entries'], comfyui_path)
+        files.extend(found)
+    if not dry_run:
+        return remove_files(files)
+    sizes = dict(files)
+    return {'removed': list(sizes), 'bytes': sum(sizes.values()), 'errors': {}}
+
+async def remove(comfyui_path, sources, dry_run=False):
+    """
+    Delete the installed files of sources from comfyui_path. Returns
+    {'removed': [paths], 'bytes': total size, 'errors': {path: message}};
+    with dry_run nothing is deleted but the same result is returned.
+    """
+    return await _run(_remove, os.path.abspath(comfyui_path), list(sources), dry_run)
@@ -0,0 +1,262 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from .config import get_config_value
+from .scheduler import host_key, get_max_concurrent, get_host_limits
+
+_RATE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?\s*$', re.IGNORECASE)
+_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+_WINDOW_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$')
+
+def parse_rate(value):
+    """
+    Parse a rate like "500K", "20M" or "1.5G" (bytes per second).
+    Returns bytes/second, or None for no limit ("0", empty).
+    """
+    if value is None or value == "":
+        return None
+    match = _RATE_RE.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid rate '{value}'")
+    rate = float(match.group(1)) * _UNITS[match.group(2).lower()]
+    return rate or None
+
+def _parse_pairs(value):
+    if isinstance(value, dict):
+        return list(value.items())
+    pairs = []
+    for part in str(value or "").split(","):
+        if "=" in part:
+            key, rate = part.split("=", 1)
+            pairs.append((key.strip(), rate.strip()))
+    return pairs
+
+def parse_host_rates(value):
+    """Parse per-host caps like "huggingface.co=20M,civitai.com=5M"."""
+    rates = {}
+    for host, rate in _parse_pairs(value):
+        try:
+            rates[host.lower()] = parse_rate(rate)
+        except ValueError:
+            print(f"Warning: Invalid bandwidth limit for host '{host}': {rate}")
+    return rates
+
+def parse_schedule(value):
+    """
+    Parse time windows like "09:00-18:00=5M,18:00-23:00=50M".
+    Windows may wrap past midnight. Returns a list of
+    (start_minute, end_minute, rate).
+    """
+    windows = []
+    for window, rate in _parse_pairs(value):
+        match = _WINDOW_RE.match(window)
+        try:
+            if not match:
+                raise ValueError(window)
+            h1, m1, h2, m2 = (int(g) for g in match.groups())
+            windows.append((h1 * 60 + m1, h2 * 60 + m2, parse_rate(rate)))
+        except ValueError:
+            print(f"Warning: Invalid bandwidth window '{window}={rate}'")
+    return windows
+
+def _in_window(minute, start, end):
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+class TokenBucket:
+    """
+    Shared rate limiter. Callers take tokens for the bytes they just
+    transferred and sleep off any debt, so all users of one bucket
+    together stay at rate_fn() bytes/second (with up to one second of
+    burst).
+    """
+
+    def __init__(self, rate_fn):
+        self.rate_fn = rate_fn
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        rate = self.rate_fn()
+        if not rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(rate, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+class Transfer:
+    """Handle for one running download, given to the download engine."""
+
+    def __init__(self, limiter, url):
+        self.limiter = limiter
+        self.url = url
+        self.host = limiter.host_key(url)
+        # Fixed rates handed out by rate(), returned when the transfer ends
+        self.allotted = None
+        self.host_allotted = None
+
+    def rate(self):
+        """
+        Bytes/second this transfer may use for its whole run: its share
+        of the global budget and of its host's cap, taken from what other
+        transfers have not been allotted. For external engines (aria2c,
+        wget), which read their rate once at start.
+        """
+        return self.limiter.allot(self)
+
+    def throttle(self, amount):
+        """Account for amount bytes received (in-process engines)."""
+        self.limiter.consume(self.host, amount)
+
+class BandwidthLimiter:
+    """
+    Global bandwidth budget (BANDWIDTH_LIMIT, adjusted by time windows in
+    BANDWIDTH_SCHEDULE) and per-host caps (HOST_BANDWIDTH) shared by all
+    concurrent transfers of this process.
+
+    In-process engines draw from token buckets continuously. Engines that
+    take a fixed rate get the budget divided by the number of transfers
+    that may run at once (slots, and host_slots(url) for a host cap), or
+    by the number running if that is higher, and never more than what is
+    still unallotted, so the fixed rates never add up past a limit. A
+    transfer waits in allot() until enough of the budget is returned.
+    """
+
+    def __init__(self, limit=None, host_rates=None, schedule=None, slots=1, host_slots=None):
+        self.limit = limit
+        self.host_rates = host_rates or {}
+        self.schedule = schedule or []
+        self.slots = max(1, slots)
+        self.host_slots = host_slots or (lambda url: self.slots)
+        self._global = TokenBucket(self.global_rate)
+        self._host_buckets = {}
+        self._active = {}
+        self._allotted = 0.0
+        self._host_allotted = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def global_rate(self):
+        if self.schedule:
+            now = datetime.now()
+            minute = now.hour * 60 + now.minute
+            for start, end, rate in self.schedule:
+                if _in_window(minute, start, end):
+                    return rate
+        return self.limit
+
+    def host_key(self, url):
+        return host_key(url, self.host_rates)
+
+    def _host_bucket(self, host):
+        with self._lock:
+            if host not in self._host_buckets:
+                self._host_buckets[host] = TokenBucket(lambda: self.host_rates.get(host))
+            return self._host_buckets[host]
+
+    def _fair_shares(self, transfer):
+        """
+        (global rate, global share, host rate, host share) for transfer;
+        None where there is no limit.
+        """
+        global_rate = self.global_rate()
+        host_rate = self.host_rates.get(transfer.host)
+        total = sum(self._active.values())
+        on_host = self._active.get(transfer.host, 0)
+        global_share = global_rate / max(total, self.slots) if global_rate else None
+        host_share = host_rate / max(on_host, min(self.slots, self.host_slots(transfer.url))) if host_rate else None
+        return global_rate, global_share, host_rate, host_share
+
+    def allot(self, transfer):
+        """
+        Reserve a fixed rate for transfer until it ends (see class doc).
+        Returns bytes/second, or None if nothing limits it.
+        """
+        with self._lock:
+            while True:
+                global_rate, global_share, host_rate, host_share = self._fair_shares(transfer)
+                global_free = global_rate - self._allotted if global_rate else None
+                host_free = host_rate - self._host_allotted.get(transfer.host, 0) if host_rate else None
+                # Allow for rounding in the sums of divided rates
+                if (global_rate is None or global_free + 1 >= global_share) and (host_rate is None or host_free + 1 >= host_share):
+                    break
+                self._released.wait()
+            shares = [share for share in (global_share, host_share) if share]
+            if not shares:
+                return None
+            rate = min(shares)
+            if global_rate:
+                transfer.allotted = rate
+                self._allotted += rate
+            if host_rate:
+                transfer.host_allotted = rate
+                self._host_allotted[transfer.host] = self._host_allotted.get(transfer.host, 0) + rate
+            return rate
+
+    def allotted_rate(self, host=None):
+        """Sum of the fixed rates held by running transfers (of host)."""
+        with self._lock:
+            return self._host_allotted.get(host, 0) if host is not None else self._allotted
+
+    def consume(self, host, amount):
+        self._global.consume(amount)
+        if self.host_rates.get(host):
+            self._host_bucket(host).consume(amount)
+
+    @contextmanager
+    def transfer(self, url):
+        transfer = Transfer(self, url)
+        with self._lock:
+            self._active[transfer.host] = self._active.get(transfer.host, 0) + 1
+        try:
+            yield transfer
+        finally:
+            with self._lock:
+                self._active[transfer.host] -= 1
+                if transfer.allotted:
+                    self._allotted -= transfer.allotted
+                if transfer.host_allotted:
+                    self._host_allotted[transfer.host] -= transfer.host_allotted
+                self._released.notify_all()
+
+_limiter = None
+_limiter_lock = threading.Lock()
+_rate_override = None
+
+def set_rate_override(rate):
+    """Use rate (bytes/second, None for unlimited) instead of BANDWIDTH_LIMIT."""
+    global _rate_override, _limiter
+    with _limiter_lock:
+        _rate_override = rate
+        _limiter = None
+
+def get_limiter():
+    """The process-wide BandwidthLimiter built from config."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            limit = _rate_override
+            if limit is None:
+                try:
+                    limit = parse_rate(get_config_value("BANDWIDTH_LIMIT"))
+                except ValueError as e:
+                    print(f"Warning: {e} in BANDWIDTH_LIMIT, not limiting.")
+            host_limits = get_host_limits()
+            slots = get_max_concurrent()
+            _limiter = BandwidthLimiter(
+                limit=limit,
+                host_rates=parse_host_rates(get_config_value("HOST_BANDWIDTH")),
+                schedule=parse_schedule(get_config_value("BANDWIDTH_SCHEDULE")),
+                slots=slots,
+                host_slots=lambda url: host_limits.get(host_key(url, host_limits), slots),
+            )
+        return _limiter
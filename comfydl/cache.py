@@ -0,0 +1,156 @@
+import atexit
+import json
+import threading
+import time
+from .config import get_comfydl_dir, get_config_value, atomic_write
+
+DEFAULT_REMOTE_CACHE_TTL = 7 * 24 * 3600
+DEFAULT_REMOTE_CACHE_MAX_ENTRIES = 5000
+DEFAULT_CIVITAI_CACHE_TTL = 7 * 24 * 3600
+DEFAULT_CIVITAI_CACHE_MAX_ENTRIES = 2000
+# Reads refresh an entry's LRU timestamp in memory, but only make the cache
+# worth saving again once the stored timestamp is this old.
+USED_AT_RESOLUTION = 24 * 3600
+
+class DiskCache:
+    """
+    A small JSON-backed key/value cache with TTL and LRU eviction.
+
+    Entries are kept in memory once loaded and written back atomically on
+    flush() (and automatically at interpreter exit if modified; a cache
+    hit alone only counts as a modification when the entry's stored LRU
+    timestamp is older than USED_AT_RESOLUTION). Stale
+    entries are still returned by get(..., allow_stale=True) so callers can
+    revalidate them or fall back to them when offline.
+    """
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._entries = data
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable cache {self.path}: {e}")
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get('stored_at', 0) < self.ttl
+
+    def get(self, key, allow_stale=False):
+        """
+        Return the cached value dict for key, or None.
+        Stale entries are only returned when allow_stale is True.
+        """
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not allow_stale and not self.is_fresh(entry):
+                return None
+            now = time.time()
+            if now - entry.get('used_at', 0) >= USED_AT_RESOLUTION:
+                self._dirty = True
+            entry['used_at'] = now
+            return entry
+
+    def set(self, key, value):
+        with self._lock:
+            self._load()
+            now = time.time()
+            self._entries[key] = {'value': value, 'stored_at': now, 'used_at': now}
+            self._dirty = True
+            self._evict()
+
+    def touch(self, key):
+        """Mark an entry as revalidated without changing its value."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['stored_at'] = entry['used_at'] = time.time()
+                self._dirty = True
+
+    def delete(self, key):
+        with self._lock:
+            self._load()
+            if self._entries.pop(key, None) is not None:
+                self._dirty = True
+
+    def _evict(self):
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        by_use = sorted(self._entries.items(), key=lambda kv: kv[1].get('used_at', 0))
+        for key, _ in by_use[:excess]:
+            del self._entries[key]
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty or self._entries is None:
+                return
+            try:
+                atomic_write(self.path, json.dumps(self._entries, separators=(",", ":")))
+                self._dirty = False
+            except Exception as e:
+                print(f"Warning: Could not save cache {self.path}: {e}")
+
+def _int_config(key, default):
+    value = get_config_value(key)
+    try:
+        return int(value) if value is not None else default
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid {key} '{value}', using {default}.")
+        return default
+
+_remote_cache = None
+_remote_cache_lock = threading.Lock()
+
+def get_remote_cache():
+    """
+    Cache of remote file metadata keyed by URL (without tokens).
+    Values hold size, etag, linked_etag, last_modified and final_url.
+    """
+    global _remote_cache
+    with _remote_cache_lock:
+        if _remote_cache is None:
+            _remote_cache = DiskCache(
+                get_comfydl_dir() / "remote_cache.json",
+                ttl=_int_config("REMOTE_CACHE_TTL", DEFAULT_REMOTE_CACHE_TTL),
+                max_entries=_int_config("REMOTE_CACHE_MAX_ENTRIES", DEFAULT_REMOTE_CACHE_MAX_ENTRIES),
+            )
+        return _remote_cache
+
+_civitai_cache = None
+_civitai_cache_lock = threading.Lock()
+
+def get_civitai_cache():
+    """Cache of Civitai model-version API payloads keyed by version ID."""
+    global _civitai_cache
+    with _civitai_cache_lock:
+        if _civitai_cache is None:
+            _civitai_cache = DiskCache(
+                get_comfydl_dir() / "civitai_cache.json",
+                ttl=_int_config("CIVITAI_CACHE_TTL", DEFAULT_CIVITAI_CACHE_TTL),
+                max_entries=_int_config("CIVITAI_CACHE_MAX_ENTRIES", DEFAULT_CIVITAI_CACHE_MAX_ENTRIES),
+            )
+        return _civitai_cache
+
+def is_offline():
+    """True if the OFFLINE config value is set to a truthy value."""
+    value = get_config_value("OFFLINE")
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
@@ -1,10 +1,19 @@
 import os
+import time
 import requests
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from .config import get_config_value
-from .utils import download_file, check_downloader, format_size, check_disk_space, get_remote_file_size, user_confirm
+from .utils import check_downloader, format_size, user_confirm, get_http_session
+from .scheduler import download_items
+from .cache import get_civitai_cache, is_offline
+from .events import emit
+from .retry import get_retry_policy
 import questionary
 
+API_BASE_URL = "https://civitai.com/api/v1"
+MAX_API_WORKERS = 4
+
 def get_safe_headers():
     token = get_config_value("CIVITAI_TOKEN")
     headers = {
@@ -15,25 +24,84 @@ def get_safe_headers():
         headers["Authorization"] = f"Bearer {token}"
     return headers
 
-def fetch_model_version(version_id):
-    url = f"https://civitai.com/api/v1/model-versions/{version_id}"
+def fetch_model_version(version_id, session=None, offline=False, refresh=False):
+    """
+    Return the model-version payload for version_id.
+    Payloads are cached on disk; a fresh cache entry is used without
+    contacting the API unless refresh is set. With offline, only the cache
+    is consulted. A stale entry is used as a fallback if the API fails.
+    """
+    cache = get_civitai_cache()
+    key = str(version_id)
+    entry = cache.get(key, allow_stale=True)
+    if entry and not refresh and (offline or cache.is_fresh(entry)):
+        return entry['value']
+    if offline:
+        print(f"Error: Model version {version_id} is not cached (offline mode).")
+        return None
+
+    url = f"{API_BASE_URL}/model-versions/{version_id}"
     headers = get_safe_headers()
-    
+    if session is None:
+        session = get_http_session()
+
+    start = time.time()
+    latency = 0
+    retries = 0
+
+    def report(outcome):
+        emit("civitai_version", version_id=key, url=url, latency=round(latency, 3),
+             seconds=round(time.time() - start, 3), retries=retries, outcome=outcome)
+
+    def send():
+        nonlocal latency
+        request_start = time.time()
+        try:
+            return session.get(url, headers=headers, timeout=30)
+        finally:
+            latency += time.time() - request_start
+
     try:
-        response = requests.get(url, headers=headers)
+        response, retries = get_retry_policy().request(send)
         if response.status_code == 403:
+             report("forbidden")
              print("Error: 403 Forbidden. Is your CIVITAI_TOKEN correct and does it have permission?")
              return None
         if response.status_code == 404:
+             report("not_found")
              print(f"Error: Model version {version_id} not found.")
+             cache.delete(key)
              return None
              
         response.raise_for_status()
-        return response.json()
+        data = response.json()
+        cache.set(key, data)
+        report("ok")
+        return data
     except requests.exceptions.RequestException as e:
+        if entry:
+            report("stale")
+            print(f"Warning: Could not refresh model version {version_id} ({e}), using cached info.")
+            return entry['value']
+        report("failed")
         print(f"Error fetching model info: {e}")
         return None
 
+def fetch_model_versions(version_ids, max_workers=MAX_API_WORKERS, offline=False, refresh=False):
+    """
+    Fetch several model versions concurrently over the shared session.
+    Returns {version_id: data_or_None}.
+    """
+    session = get_http_session()
+    if not version_ids:
+        return {}
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(version_ids))) as executor:
+            results = executor.map(lambda vid: fetch_model_version(vid, session, offline=offline, refresh=refresh), version_ids)
+            return dict(zip(version_ids, results))
+    finally:
+        get_civitai_cache().flush()
+
 def determine_folder(model_type, base_model=None):
     # Map Civitai types to ComfyUI folders
     # Checkpoints, LORA, LoCon, TextualInversion, Hypernetwork, ControlNet, VAE, Upscaler, MotionModule
@@ -83,88 +151,247 @@ def extract_version_id(input_str):
         
     return None
 
-def process_civitai_download(input_str, comfyui_root, downloader=None, skip_prompt=False):
-    version_id = extract_version_id(input_str)
-    
-    if not version_id:
-        print(f"Error: Could not extract model version ID from '{input_str}'.")
-        return False
+def select_primary_file(files):
+    """Find primary file, or default to first."""
+    for f in files:
+        if f.get("primary"):
+            return f
+    return files[0] if files else None
 
-    if not downloader:
-        downloader = check_downloader()
-        if not downloader:
-             print("Error: No downloader found (aria2c/wget).")
-             return False
+def _matches(value, wanted):
+    """Case-insensitive match that treats 'safetensors' and 'SafeTensor' alike."""
+    if not wanted:
+        return True
+    value = str(value or "").lower().rstrip("s")
+    return any(value == w.lower().rstrip("s") for w in wanted)
 
-    print(f"Fetching info for model version: {version_id}...")
-    data = fetch_model_version(version_id)
-    
-    if not data:
-        return False
-        
+def select_files(files, filters=None):
+    """
+    Choose which files of a model version to download.
+
+    filters may contain:
+      'format' - list of formats (e.g. ['safetensors'])
+      'fp'     - list of precisions (e.g. ['fp16'])
+      'size'   - list of 'pruned' / 'full'
+      'types'  - list of file types (e.g. ['Model', 'VAE'])
+      'smallest' - pick the smallest matching file
+      'all'    - download every matching file
+    Without filters the primary file is chosen, as before.
+    Returns a list of file dicts (empty if nothing matches).
+    """
+    if not files:
+        return []
+    filters = filters or {}
+    if not any(filters.get(k) for k in ("format", "fp", "size", "types", "smallest", "all")):
+        return [select_primary_file(files)]
+
+    candidates = []
+    for f in files:
+        metadata = f.get("metadata") or {}
+        if not _matches(metadata.get("format"), filters.get("format")):
+            continue
+        if not _matches(metadata.get("fp"), filters.get("fp")):
+            continue
+        if not _matches(metadata.get("size"), filters.get("size")):
+            continue
+        if not _matches(f.get("type"), filters.get("types")):
+            continue
+        candidates.append(f)
+
+    if not candidates or filters.get("all"):
+        return candidates
+    if not filters.get("types"):
+        # Picking a single file: prefer the model itself over VAE/config files
+        model_files = [f for f in candidates if f.get("type") in (None, "Model", "Pruned Model")]
+        candidates = model_files or candidates
+    if filters.get("smallest"):
+        return [min(candidates, key=lambda f: f.get("sizeKB") or float("inf"))]
+    primary = [f for f in candidates if f.get("primary")]
+    return [primary[0] if primary else candidates[0]]
+
+def describe_file(f):
+    metadata = f.get("metadata") or {}
+    details = [str(v) for v in (f.get("type"), metadata.get("format"), metadata.get("fp"), metadata.get("size")) if v]
+    size_kb = f.get("sizeKB")
+    size_str = format_size(int(size_kb * 1024)) if size_kb else "unknown size"
+    return f"{f.get('name')} ({', '.join(details)}; {size_str})"
+
+def file_folder(file_type, model_type, base_model=None):
+    """ComfyUI folder for one file of a version: VAEs go to models/vae."""
+    if file_type == "VAE":
+        return "models/vae"
+    return determine_folder(model_type, base_model)
+
+def build_download_items(version_id, data, comfyui_root, filters=None):
+    """
+    Turn a model-version payload into download items for the selected files.
+    Returns (items, error_message).
+    """
     model_info = data.get("model", {})
     files = data.get("files", [])
     
     model_name = model_info.get("name", "Unknown Model")
     model_type = model_info.get("type", "Checkpoint")
     
-    print(f"Found model: {model_name} ({model_type})")
-    
     if not files:
-        print("Error: No files found for this model version.")
-        return False
+        return [], "No files found for this model version."
     
-    # Find primary file, or default to first
-    target_file = None
-    for f in files:
-        if f.get("primary"):
-            target_file = f
-            break
-            
-    if not target_file:
-        target_file = files[0]
-        
-    file_name = target_file.get("name")
-    download_url = target_file.get("downloadUrl")
-    
-    if not file_name or not download_url:
-        print("Error: Invalid file data from API.")
-        return False
-        
-    # Determine folder
+    selected = select_files(files, filters)
+    if not selected:
+        available = "\n".join(f"  - {describe_file(f)}" for f in files)
+        return [], f"No files match the selection filters. Available files:\n{available}"
+
     base_model = data.get("baseModel")
-    subfolder = determine_folder(model_type, base_model)
-    dest_path = os.path.join(comfyui_root, subfolder, file_name)
-    
-    print(f"Target: {subfolder}/{file_name}")
-    
-    # Get size
-    size_kb = target_file.get("sizeKB")
-    size_bytes = 0
-    if size_kb:
-        size_bytes = int(size_kb * 1024)
-    else:
-        # Fallback to remote fetch
-        print("Fetching remote file size...")
-        size_bytes = get_remote_file_size(download_url) or 0
+    items = []
+    for target_file in selected:
+        file_name = target_file.get("name")
+        download_url = target_file.get("downloadUrl")
         
-    # Check disk space
-    has_space, free_space = check_disk_space(comfyui_root, size_bytes)
+        if not file_name or not download_url:
+            return [], "Invalid file data from API."
+            
+        # Determine folder
+        subfolder = file_folder(target_file.get("type"), model_type, base_model)
+        size_kb = target_file.get("sizeKB")
+
+        items.append({
+            'version_id': version_id,
+            'model_name': model_name,
+            'model_type': model_type,
+            'url': download_url,
+            'dest': f"{subfolder}/{file_name}",
+            'path': os.path.join(comfyui_root, subfolder, file_name),
+            'size': int(size_kb * 1024) if size_kb else None,
+            'sha256': (target_file.get("hashes") or {}).get("SHA256"),
+        })
+    return items, None
+
+def read_civitai_inputs(inputs, input_file=None):
+    """
+    Combine IDs/URLs/AIR URNs from arguments and an optional file
+    (one per line, '#' starts a comment).
+    """
+    collected = list(inputs or [])
+    if input_file:
+        with open(input_file, 'r') as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    collected.append(line)
+    return collected
+
+def collect_civitai_items(inputs, comfyui_root, offline=False, refresh=False, filters=None):
+    """
+    Resolve IDs/URLs/AIR URNs to download items, fetching metadata
+    concurrently. Items are deduplicated by destination path.
+    Returns (items, ok) where ok is False if any input failed.
+    """
+    version_ids = []
+    ok = True
+    for input_str in inputs:
+        version_id = extract_version_id(input_str)
+        if not version_id:
+            print(f"Error: Could not extract model version ID from '{input_str}'.")
+            ok = False
+        elif version_id not in version_ids:
+            version_ids.append(version_id)
+
+    if not version_ids:
+        return [], False
+
+    if len(version_ids) == 1:
+        print(f"Fetching info for model version: {version_ids[0]}...")
+    else:
+        print(f"Fetching info for {len(version_ids)} model versions...")
+    results = fetch_model_versions(version_ids, offline=offline, refresh=refresh)
+
+    items = []
+    seen_paths = set()
+    for version_id in version_ids:
+        data = results.get(version_id)
+        if not data:
+            ok = False
+            continue
+        version_items, error = build_download_items(version_id, data, comfyui_root, filters)
+        print(f"Found model: {data.get('model', {}).get('name', 'Unknown Model')} ({data.get('model', {}).get('type', 'Checkpoint')})")
+        if error:
+            print(f"Error: {error}")
+            ok = False
+            continue
+        for item in version_items:
+            if item['path'] in seen_paths:
+                continue
+            seen_paths.add(item['path'])
+            items.append(item)
+    return items, ok
+
+def plan_civitai_batch(inputs, comfyui_root, offline=False, refresh=False, filters=None):
+    """
+    Build a download plan (see planner.build_plan) for Civitai inputs
+    without downloading. Returns (plan, ok); plan is None if nothing
+    could be resolved.
+    """
+    from .planner import build_plan
+    offline = offline or is_offline()
+    items, ok = collect_civitai_items(inputs, comfyui_root, offline=offline, refresh=refresh, filters=filters)
+    if not items:
+        return None, False
+    for item in items:
+        item['source'] = f"civitai:{item['version_id']}"
+    return build_plan(items, comfyui_root, fetch_remote_size=not offline), ok
+
+def process_civitai_batch(inputs, comfyui_root, downloader=None, skip_prompt=False, max_concurrent=None, offline=False, refresh=False, filters=None):
+    """
+    Download many Civitai model versions in one run: metadata is fetched
+    concurrently, sizes and disk space are checked for the whole batch,
+    the user confirms once, and files go through one download queue.
+    With offline, metadata comes only from the local cache. filters select
+    which files of each version to fetch (see select_files).
+    Returns True if every requested model was downloaded.
+    """
+    downloader = downloader or check_downloader()
+
+    plan, ok = plan_civitai_batch(inputs, comfyui_root, offline=offline, refresh=refresh, filters=filters)
+    if plan is None:
+        return False
+
+    pending = []
+    for item in plan['files']:
+        size = item['local_size'] if item['is_installed'] else item['remote_size']
+        size_str = format_size(size) if size else "unknown"
+        status = "✓" if item['is_installed'] else " "
+        print(f"  [{status}] {item['dest']} [{size_str:>10}]")
+        if not item['is_installed']:
+            pending.append(dict(item, size=item['remote_size']))
+
+    if not pending:
+        print("All files are already installed.")
+        return ok
+
+    size_bytes = plan['total_download_size']
     
     if size_bytes > 0:
-        print(f"File size: {format_size(size_bytes)}")
-        print(f"Free disk space: {format_size(free_space)}")
+        label = "File size" if len(pending) == 1 else "Total download size"
+        print(f"{label}: {format_size(size_bytes)}")
+        print(f"Free disk space: {format_size(plan['free_space'])}")
         
-        if not has_space:
+        if not plan['has_space']:
             print("Warning: Not enough disk space!")
             if not skip_prompt:
                  if not user_confirm("Warning: Not enough disk space. Proceed anyway?"):
                      return False
 
         if not skip_prompt:
-            if not user_confirm(f"Do you want to download '{model_name}'?"):
+            if len(pending) == 1:
+                question = f"Do you want to download '{pending[0]['model_name']}'?"
+            else:
+                question = f"Do you want to download {len(pending)} files?"
+            if not user_confirm(question):
                 print("Aborted.")
                 return False
 
-    download_file(download_url, dest_path, downloader)
-    return True
+    download_results = download_items(pending, downloader, max_concurrent=max_concurrent)
+    return ok and not download_results['failed']
+
+def process_civitai_download(input_str, comfyui_root, downloader=None, skip_prompt=False, max_concurrent=None, offline=False, filters=None):
+    return process_civitai_batch([input_str], comfyui_root, downloader=downloader, skip_prompt=skip_prompt, max_concurrent=max_concurrent, offline=offline, filters=filters)
@@ -1,59 +1,159 @@
+import copy
 import os
+import tempfile
+import threading
 import yaml
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 CONFIG_FILE = Path.home() / ".comfydl_config"
 
-def load_config():
-    if not CONFIG_FILE.exists():
-        return {}
+def get_comfydl_dir():
+    """Return ~/.comfydl, creating it if needed."""
+    path = Path.home() / ".comfydl"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def atomic_write(path, data):
+    """
+    Write data (str or bytes) to path via a temp file in the same directory
+    followed by a rename, so readers never observe a partially written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    mode = "wb" if isinstance(data, bytes) else "w"
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            return yaml.safe_load(f) or {}
-    except Exception as e:
-        print(f"Warning: Could not load config file: {e}")
-        return {}
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class ConfigFile:
+    """
+    The YAML config, parsed once per process.
+
+    Every read checks the file's mtime and size and only re-parses it when
+    another process has changed it. Saves go through atomic_write, and
+    read-modify-write updates hold a lock (plus an advisory file lock where
+    available) so concurrent writers can't interleave.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._data = None
+        self._signature = None
+
+    def _stat_signature(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return yaml.safe_load(f) or {}
+        except Exception as e:
+            print(f"Warning: Could not load config file: {e}")
+            return {}
+
+    def data(self):
+        """The cached config dict. Callers must not mutate it."""
+        signature = self._stat_signature()
+        with self._lock:
+            if self._data is None or signature != self._signature:
+                self._data = self._read()
+                self._signature = signature
+            return self._data
+
+    def save(self, config):
+        with self._lock:
+            try:
+                atomic_write(self.path, yaml.dump(config))
+                self._data = copy.deepcopy(config)
+                self._signature = self._stat_signature()
+            except Exception as e:
+                print(f"Error: Could not save config file: {e}")
+
+    @contextmanager
+    def update(self):
+        """
+        Yield a private copy of the config and save it on exit.
+        """
+        with self._lock:
+            lock_file = None
+            if fcntl is not None:
+                try:
+                    lock_file = open(str(self.path) + ".lock", 'w')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                except OSError:
+                    lock_file = None
+            try:
+                config = copy.deepcopy(self.data())
+                yield config
+                self.save(config)
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
+_config = ConfigFile(CONFIG_FILE)
+
+def load_config():
+    return copy.deepcopy(_config.data())
 
 def save_config(config):
-    try:
-        with open(CONFIG_FILE, 'w') as f:
-            yaml.dump(config, f)
-    except Exception as e:
-        print(f"Error: Could not save config file: {e}")
+    _config.save(config)
 
 def set_config_value(key, value):
-    config = load_config()
-    config[key] = value
-    save_config(config)
+    with _config.update() as config:
+        config[key] = value
     print(f"Configuration saved: {key} = {value}")
 
 def get_config_value(key):
-    config = load_config()
-    return config.get(key)
+    return _config.data().get(key)
 
 def get_registries():
-    config = load_config()
-    registries = config.get("registries", {})
+    registries = dict(_config.data().get("registries") or {})
     # Ensure default exists if not present (only if config was empty or missing default)
     # Actually, main.py/registry logic might handle initialization, but good to have a getter.
     return registries
 
 def add_registry(name, url):
-    config = load_config()
-    if "registries" not in config:
-        config["registries"] = {}
-    config["registries"][name] = url
-    save_config(config)
+    with _config.update() as config:
+        if "registries" not in config:
+            config["registries"] = {}
+        config["registries"][name] = url
 
 def remove_registry(name):
-    config = load_config()
-    if "registries" in config and name in config["registries"]:
-        del config["registries"][name]
-        save_config(config)
-        return True
+    with _config.update() as config:
+        if "registries" in config and name in config["registries"]:
+            del config["registries"][name]
+            return True
     return False
 
 def get_registry_path(name):
-    registries_dir = Path.home() / ".comfydl" / "registries"
+    registries_dir = get_comfydl_dir() / "registries"
     registries_dir.mkdir(parents=True, exist_ok=True)
     return registries_dir / f"{name}.json"
+
+def get_registry_meta_path(name):
+    """Where the ETag/Last-Modified of a registry's last fetch are kept."""
+    return get_registry_path(name).with_suffix(".meta")
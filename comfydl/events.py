@@ -0,0 +1,160 @@
+import atexit
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from .config import get_config_value, atomic_write
+
+# Rewrite the metrics textfile at most this often (seconds); always at exit
+METRICS_INTERVAL = 5
+
+# name: (type, help, label names)
+METRICS = {
+    'comfydl_downloads_total': ("counter", "Files handled by download_file, by outcome.", ('outcome',)),
+    'comfydl_download_bytes_total': ("counter", "Bytes downloaded, by host.", ('host',)),
+    'comfydl_download_seconds_total': ("counter", "Seconds spent downloading, by host.", ('host',)),
+    'comfydl_download_retries_total': ("counter", "Download attempts retried, on the same host after backoff or on another mirror.", ()),
+    'comfydl_remote_probes_total': ("counter", "Remote file metadata lookups, by outcome.", ('outcome',)),
+    'comfydl_remote_probe_seconds_total': ("counter", "Seconds spent on remote metadata requests.", ()),
+    'comfydl_registry_updates_total': ("counter", "Registry fetches, by outcome.", ('outcome',)),
+    'comfydl_civitai_requests_total': ("counter", "Civitai model-version lookups, by outcome.", ('outcome',)),
+    'comfydl_civitai_request_seconds_total': ("counter", "Seconds spent on Civitai API requests.", ()),
+    'comfydl_civitai_retries_total': ("counter", "Civitai API requests retried after rate limiting, server errors or connection failures.", ()),
+    'comfydl_last_event_timestamp_seconds': ("gauge", "Unix time of the last event.", ()),
+}
+
+class EventSink:
+    """
+    Writes events as JSON lines to a file (or stdout for "-") and keeps
+    counters that are exported in the Prometheus text format, for
+    node_exporter's textfile collector.
+    """
+
+    def __init__(self, events_file=None, metrics_file=None):
+        self.events_file = events_file
+        self.metrics_file = metrics_file
+        self._lock = threading.Lock()
+        self._stream = None
+        self._values = {}
+        self._metrics_written = 0
+        if metrics_file:
+            atexit.register(self.write_metrics)
+
+    def _open(self):
+        if self.events_file == "-":
+            return sys.stdout
+        if self._stream is None:
+            path = os.path.expanduser(self.events_file)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._stream = open(path, 'a')
+        return self._stream
+
+    def emit(self, event, fields):
+        record = {'ts': round(time.time(), 3), 'event': event, 'host': socket.gethostname(), 'pid': os.getpid()}
+        record.update(fields)
+        with self._lock:
+            if self.events_file:
+                try:
+                    stream = self._open()
+                    stream.write(json.dumps(record, default=str) + "\n")
+                    stream.flush()
+                except OSError as e:
+                    print(f"Warning: Could not write event to {self.events_file}: {e}", file=sys.stderr)
+                    self.events_file = None
+            if self.metrics_file:
+                _count(self._values, event, fields)
+                self._values[('comfydl_last_event_timestamp_seconds', ())] = record['ts']
+                due = time.time() - self._metrics_written >= METRICS_INTERVAL
+        if self.metrics_file and due:
+            self.write_metrics()
+
+    def write_metrics(self):
+        """Write the current counters to metrics_file atomically."""
+        with self._lock:
+            text = format_metrics(self._values)
+            self._metrics_written = time.time()
+        try:
+            atomic_write(os.path.expanduser(self.metrics_file), text)
+        except OSError as e:
+            print(f"Warning: Could not write metrics to {self.metrics_file}: {e}", file=sys.stderr)
+
+def _inc(values, name, amount=1, **labels):
+    key = (name, tuple(labels[label] for label in METRICS[name][2]))
+    values[key] = values.get(key, 0) + amount
+
+def _count(values, event, fields):
+    """Update the metric counters for one event."""
+    outcome = fields.get('outcome')
+    if event == "download":
+        _inc(values, 'comfydl_downloads_total', outcome=outcome)
+        if fields.get('mirror'):
+            _inc(values, 'comfydl_download_bytes_total', fields.get('bytes') or 0, host=fields['mirror'])
+            _inc(values, 'comfydl_download_seconds_total', fields.get('seconds') or 0, host=fields['mirror'])
+        _inc(values, 'comfydl_download_retries_total', fields.get('retries') or 0)
+    elif event == "remote_size":
+        _inc(values, 'comfydl_remote_probes_total', outcome=outcome)
+        _inc(values, 'comfydl_remote_probe_seconds_total', fields.get('latency') or 0)
+    elif event == "registry_update":
+        _inc(values, 'comfydl_registry_updates_total', outcome=outcome)
+    elif event == "civitai_version":
+        _inc(values, 'comfydl_civitai_requests_total', outcome=outcome)
+        _inc(values, 'comfydl_civitai_request_seconds_total', fields.get('latency') or 0)
+        _inc(values, 'comfydl_civitai_retries_total', fields.get('retries') or 0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(round(float(value), 3))
+
+def format_metrics(values):
+    """Render counters in the Prometheus text exposition format."""
+    lines = []
+    for name, (metric_type, help_text, label_names) in METRICS.items():
+        samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        if not samples:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            label_str = ",".join(f'{label}="{_escape(v)}"' for label, v in zip(label_names, labels))
+            sample = f"{name}{{{label_str}}}" if label_str else name
+            lines.append(f"{sample} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+_sink = None
+_sink_lock = threading.Lock()
+_overrides = {}
+
+def set_event_outputs(events_file=None, metrics_file=None):
+    """Use these outputs instead of EVENTS_FILE / METRICS_FILE for this run."""
+    global _sink
+    with _sink_lock:
+        if events_file:
+            _overrides['events_file'] = events_file
+        if metrics_file:
+            _overrides['metrics_file'] = metrics_file
+        _sink = None
+
+def get_sink():
+    """The process-wide EventSink, or None when no output is configured."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            events_file = _overrides.get('events_file') or get_config_value("EVENTS_FILE")
+            metrics_file = _overrides.get('metrics_file') or get_config_value("METRICS_FILE")
+            _sink = EventSink(events_file, metrics_file) if events_file or metrics_file else False
+        return _sink or None
+
+def emit(event, **fields):
+    """
+    Record an event (e.g. "download" with url, bytes, seconds, throughput,
+    retries and outcome). Does nothing unless events or metrics are enabled.
+    """
+    sink = get_sink()
+    if sink is not None:
+        sink.emit(event, fields)
@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from urllib.parse import urlparse
+from .config import get_comfydl_dir, atomic_write
+
+# Weight of the newest sample in the moving average
+EWMA_ALPHA = 0.3
+# Transfers shorter than this say more about latency than bandwidth, so
+# they count for proportionally less in the average
+MIN_SAMPLE_BYTES = 1024 * 1024
+
+_lock = threading.Lock()
+_stats = None
+
+def _stats_path():
+    return get_comfydl_dir() / "host_stats.json"
+
+def _load():
+    global _stats
+    if _stats is None:
+        _stats = {}
+        path = _stats_path()
+        if path.exists():
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    _stats = data
+            except Exception:
+                pass
+    return _stats
+
+def url_host(url):
+    """Host (and non-default port) that stats are kept under."""
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    return f"{host}:{parsed.port}" if parsed.port else host
+
+def _update(url, update):
+    """Apply update(entry) to url's host entry and persist the stats."""
+    host = url_host(url)
+    with _lock:
+        stats = _load()
+        update(stats.setdefault(host, {}))
+        try:
+            atomic_write(_stats_path(), json.dumps(stats, indent=2))
+        except Exception:
+            pass
+
+def _ewma(previous, sample, alpha=EWMA_ALPHA):
+    return sample if previous is None else alpha * sample + (1 - alpha) * previous
+
+def record_transfer(url, num_bytes, seconds):
+    """
+    Fold a completed transfer into the host's average throughput.
+    Transfers under MIN_SAMPLE_BYTES are weighted by their share of it.
+    """
+    if num_bytes <= 0 or seconds <= 0:
+        return
+    alpha = EWMA_ALPHA * min(1.0, num_bytes / MIN_SAMPLE_BYTES)
+    def update(entry):
+        entry['throughput'] = _ewma(entry.get('throughput'), num_bytes / seconds, alpha)
+        entry['samples'] = entry.get('samples', 0) + 1
+        entry['updated_at'] = time.time()
+    _update(url, update)
+
+def record_latency(url, seconds):
+    """Fold a request round-trip time into the host's average latency."""
+    def update(entry):
+        entry['latency'] = _ewma(entry.get('latency'), seconds)
+        entry['latency_at'] = time.time()
+    _update(url, update)
+
+def record_failure(url):
+    """Remember that a download or probe from url's host failed."""
+    def update(entry):
+        entry['failures'] = entry.get('failures', 0) + 1
+        entry['last_failure'] = time.time()
+    _update(url, update)
+
+def get_host_stats(url):
+    """A copy of everything recorded for url's host (may be empty)."""
+    with _lock:
+        return dict(_load().get(url_host(url), {}))
+
+def get_throughput(url):
+    """Average measured bytes/second for url's host, or None if unmeasured."""
+    return get_host_stats(url).get('throughput')
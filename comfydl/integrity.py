@@ -0,0 +1,125 @@
+import hashlib
+import os
+import re
+import threading
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+QUARANTINE_SUFFIX = ".corrupt"
+
+_SHA256_RE = re.compile(r'^[0-9a-fA-F]{64}$')
+
+def normalize_sha256(value):
+    """Return value as a lowercase hex SHA256 digest, or None if it isn't one."""
+    if not value:
+        return None
+    value = str(value).strip().strip('"')
+    if value.lower().startswith("sha256:"):
+        value = value[7:]
+    return value.lower() if _SHA256_RE.match(value) else None
+
+def lfs_sha256(url):
+    """
+    SHA256 of a Hugging Face LFS file, taken from the X-Linked-Etag
+    header (the LFS object id) recorded by get_remote_file_info.
+    """
+    if "huggingface.co" not in url:
+        return None
+    from .utils import get_remote_file_info
+    info = get_remote_file_info(url)
+    return normalize_sha256(info.get('linked_etag')) if info else None
+
+class HashFollower(threading.Thread):
+    """
+    Hash a file while another writer fills it.
+
+    watermark is a callable returning how many bytes from the start of the
+    file are complete; the follower only reads below it, so it consumes
+    data straight from the page cache rather than re-reading the whole
+    file from disk after the download.
+    """
+
+    def __init__(self, path, watermark):
+        super().__init__(daemon=True)
+        self.path = path
+        self.watermark = watermark
+        self.offset = 0
+        self._hasher = hashlib.sha256()
+        self._finishing = threading.Event()
+        self.error = None
+
+    def run(self):
+        f = None
+        try:
+            while True:
+                finishing = self._finishing.is_set()
+                limit = self.watermark()
+                if limit > self.offset:
+                    if f is None:
+                        try:
+                            f = open(self.path, 'rb')
+                        except FileNotFoundError:
+                            if finishing:
+                                break
+                            self._finishing.wait(0.2)
+                            continue
+                    f.seek(self.offset)
+                    while self.offset < limit:
+                        data = f.read(min(HASH_CHUNK_SIZE, limit - self.offset))
+                        if not data:
+                            break
+                        self._hasher.update(data)
+                        self.offset += len(data)
+                elif finishing:
+                    break
+                else:
+                    self._finishing.wait(0.2)
+        except Exception as e:
+            self.error = e
+        finally:
+            if f is not None:
+                f.close()
+
+    def finish(self, total=None):
+        """
+        Stop following and return the hex digest of the first total bytes
+        (or of everything below the watermark).
+        """
+        if total is not None:
+            self.watermark = lambda: total
+        self._finishing.set()
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self._hasher.hexdigest()
+
+def file_size_watermark(path):
+    """Watermark for sequential writers (wget): the current file size."""
+    def watermark():
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    return watermark
+
+def sha256_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(HASH_CHUNK_SIZE)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher.hexdigest()
+
+def quarantine(path):
+    """
+    Move a corrupted download aside so it is neither loaded by ComfyUI
+    nor treated as installed. Returns the new path, or None.
+    """
+    target = path + QUARANTINE_SUFFIX
+    try:
+        os.replace(path, target)
+        return target
+    except OSError as e:
+        print(f"Warning: Could not quarantine {path}: {e}")
+        return None
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .config import get_comfydl_dir, atomic_write
+from .integrity import QUARANTINE_SUFFIX
+from .partials import is_partial_name, ENGINE_SUFFIXES
+
+DEFAULT_SCAN_WORKERS = 16
+# Notes, quarantined corrupt downloads and engine sidecars
+SKIP_SUFFIXES = ('.txt', '.md', QUARANTINE_SUFFIX) + ENGINE_SUFFIXES
+
+def is_model_file(name):
+    return not name.startswith('.') and not name.endswith(SKIP_SUFFIXES) and not is_partial_name(name)
+
+def _scan_one(path, previous):
+    """
+    Scan a single directory. If its mtime matches the previous snapshot the
+    file list is reused without listing or stat-ing its files.
+    Returns (dir_record, reused).
+    """
+    mtime_ns = os.stat(path).st_mtime_ns
+    if previous and previous.get('mtime_ns') == mtime_ns:
+        return previous, True
+
+    files = []
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file() and is_model_file(entry.name):
+                    # DirEntry caches stat results; symlinks (e.g. model
+                    # store links) report the size of their target.
+                    files.append([entry.name, entry.stat().st_size])
+            except OSError:
+                continue
+    return {'mtime_ns': mtime_ns, 'files': files, 'subdirs': subdirs}, False
+
+def _snapshot_path(models_dir):
+    key = hashlib.sha1(os.path.abspath(models_dir).encode("utf-8")).hexdigest()[:16]
+    return get_comfydl_dir() / "inventory" / f"{key}.json"
+
+def _load_snapshot(models_dir):
+    path = _snapshot_path(models_dir)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data.get('models_dir') == os.path.abspath(models_dir):
+            return data.get('dirs', {})
+    except Exception:
+        pass
+    return {}
+
+def scan_models(models_dir, workers=DEFAULT_SCAN_WORKERS, use_snapshot=False):
+    """
+    Inventory the model files under models_dir, scanning directories in
+    parallel with os.scandir.
+
+    With use_snapshot, the per-directory results are persisted under
+    ~/.comfydl/inventory/ and directories whose mtime is unchanged are not
+    re-listed. (A directory's mtime changes when entries are added, removed
+    or renamed, not when an existing file grows in place.)
+
+    Returns a dict with 'files' (list of {'path', 'size'}, paths relative
+    to models_dir), 'total_size', 'dirs_scanned' and 'dirs_reused'.
+    """
+    previous = _load_snapshot(models_dir) if use_snapshot else {}
+    dirs = {}
+    files = []
+    scanned = 0
+    reused = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_scan_one, models_dir, previous.get(".")): "."}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel = pending.pop(future)
+                try:
+                    record, was_reused = future.result()
+                except OSError as e:
+                    print(f"Warning: Could not scan {os.path.join(models_dir, rel)}: {e}")
+                    continue
+                dirs[rel] = record
+                if was_reused:
+                    reused += 1
+                else:
+                    scanned += 1
+                for name, size in record['files']:
+                    # Snapshots from older versions may list skipped files
+                    if not is_model_file(name):
+                        continue
+                    files.append({'path': os.path.normpath(os.path.join(rel, name)), 'size': size})
+                for name in record['subdirs']:
+                    sub_rel = os.path.normpath(os.path.join(rel, name))
+                    future = executor.submit(_scan_one, os.path.join(models_dir, sub_rel), previous.get(sub_rel))
+                    pending[future] = sub_rel
+
+    if use_snapshot:
+        try:
+            snapshot = {'models_dir': os.path.abspath(models_dir), 'dirs': dirs}
+            atomic_write(_snapshot_path(models_dir), json.dumps(snapshot, separators=(",", ":")))
+        except Exception as e:
+            print(f"Warning: Could not save inventory snapshot: {e}")
+
+    return {
+        'files': files,
+        'total_size': sum(f['size'] for f in files),
+        'dirs_scanned': scanned,
+        'dirs_reused': reused,
+    }
+
+def folder_totals(files):
+    """Aggregate file count and size by top-level folder (e.g. 'checkpoints')."""
+    totals = {}
+    for f in files:
+        parts = f['path'].split(os.sep)
+        folder = parts[0] if len(parts) > 1 else "."
+        entry = totals.setdefault(folder, {'count': 0, 'size': 0})
+        entry['count'] += 1
+        entry['size'] += f['size']
+    return totals
+
+def sort_files(files, key="name"):
+    if key == "size":
+        return sorted(files, key=lambda f: (-f['size'], f['path']))
+    return sorted(files, key=lambda f: f['path'])
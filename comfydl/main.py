@@ -1,130 +1,56 @@
 import argparse
+import contextlib
+import json
 import os
 import sys
 import yaml
 import math
-from pathlib import Path
 from .config import set_config_value, get_config_value
-from .utils import check_downloader, download_file, get_remote_file_size, format_size, check_disk_space, user_confirm
+from .utils import check_downloader, format_size, user_confirm
 import questionary
 from . import __version__
-from .registry import init_registries, update_registry, load_registry_sources, resolve_registry_source, add_registry, remove_registry, get_registries
+from .registry import update_registry, source_downloads, add_registry, remove_registry, get_registries
+from .scheduler import download_items
+from .store import get_model_store
+from .inventory import scan_models, sort_files, folder_totals
+from .planner import build_plan, plan_entries, plan_to_json, print_plan_summary
+from .bandwidth import parse_rate, set_rate_override
+from .events import set_event_outputs
+from .sources import get_source_config, get_available_sources, get_batch_downloads_status, installed_source_names, source_entries, installed_files, remove_files, search_url_in_sources, url_filename, url_entry, collect_entries
+from .civitai import process_civitai_download, process_civitai_batch, plan_civitai_batch, collect_civitai_items, read_civitai_inputs
+from .cache import is_offline
 
 
 
 
 def handle_set(key, value):
-    valid_keys = ["COMFYUI_ROOT", "CIVITAI_TOKEN", "HF_TOKEN", "MODEL_SOURCES_PATH"]
+    valid_keys = ["COMFYUI_ROOT", "CIVITAI_TOKEN", "HF_TOKEN", "MODEL_SOURCES_PATH", "MAX_CONCURRENT_DOWNLOADS", "HOST_CONCURRENCY", "REMOTE_CACHE_TTL", "REMOTE_CACHE_MAX_ENTRIES", "DOWNLOADER", "NATIVE_SEGMENTS", "MODEL_STORE_PATH", "MODEL_STORE_LINK", "CIVITAI_CACHE_TTL", "CIVITAI_CACHE_MAX_ENTRIES", "OFFLINE", "MIRRORS", "BANDWIDTH_LIMIT", "HOST_BANDWIDTH", "BANDWIDTH_SCHEDULE", "EVENTS_FILE", "METRICS_FILE", "RETRY_ATTEMPTS"]
     if key not in valid_keys:
         print(f"Warning: '{key}' is not a standard configuration key. Valid keys: {valid_keys}")
     set_config_value(key, value)
 
-def resolve_model_source(source_name):
-    # Check if exact path
-    if os.path.exists(source_name):
-        return source_name
-
-    # Check custom model sources path
-    custom_sources_path = get_config_value("MODEL_SOURCES_PATH")
-    if custom_sources_path and os.path.exists(custom_sources_path):
-        custom_sources = Path(custom_sources_path)
-        candidate = custom_sources / f"{source_name}.yaml"
-        if candidate.exists():
-            return str(candidate)
-
-        candidate = custom_sources / source_name
-        if candidate.exists():
-            return str(candidate)
-
-
-    
-
-            
-
-             
-    # Maybe package provided sources? For now we assume local execution context
-    return None
-
-def get_source_config(source_name):
-    """
-    Resolve a source name to a configuration dictionary.
-    Returns (config_dict, source_origin_description)
-    """
-    # 1. Check local file paths (legacy/development override)
-    path = resolve_model_source(source_name)
-    if path:
-        try:
-            with open(path, 'r') as f:
-                return yaml.safe_load(f), path
-        except Exception as e:
-            print(f"Error loading local source {path}: {e}")
-            return None, None
-
-    # 2. Check registries
-    init_registries()
-    config = resolve_registry_source(source_name)
-    if config:
-        return config, f"registry:{source_name}"
-        
-    return None, None
-
-def get_available_sources():
-    sources = set()
-    
-    # Check custom model sources path
-    custom_sources_path = get_config_value("MODEL_SOURCES_PATH")
-    if custom_sources_path and os.path.exists(custom_sources_path):
-        for f in Path(custom_sources_path).glob("*.yaml"):
-            sources.add(f.stem)
-
-
-
-
-    
-
-            
-    # Add registry sources
-    init_registries()
-    registry_sources = load_registry_sources()
-    sources.update(registry_sources.keys())
-
-    return sorted(list(sources))
-
-def get_downloads_status(downloads, comfyui_path, fetch_remote_size=False):
-    """
-    Check the status of download items.
-    Returns a list of (dest, is_installed, local_size, remote_size).
-    """
-    items_status = []
-    for item in downloads:
-        url = item.get('url')
-        dest = item.get('dest')
-        if not dest:
-            continue
-        
-        full_path = os.path.join(comfyui_path, dest)
-        is_installed = os.path.exists(full_path) and os.path.isfile(full_path)
-        
-        local_size = os.path.getsize(full_path) if is_installed else 0
-        remote_size = None
-        
-        if not is_installed and fetch_remote_size and url:
-            remote_size = get_remote_file_size(url)
-            
-        items_status.append({
-            'dest': dest,
-            'is_installed': is_installed,
-            'local_size': local_size,
-            'remote_size': remote_size,
-            'url': url
-        })
-    return items_status
+STATUS_SYMBOLS = {'installed': "✓", 'incomplete': "~", 'corrupt': "x"}
+
+def _item_label(item):
+    """Status symbol and size column for one file of a source tree."""
+    status = item.get('status') or ("installed" if item['is_installed'] else "missing")
+    symbol = STATUS_SYMBOLS.get(status, " ")
+    size_str = ""
+    if status == "installed":
+        size_str = f" [{format_size(item['local_size']):>10}]"
+    elif status in ("incomplete", "corrupt"):
+        note = f": {item['verify_note']}" if item.get('verify_note') else ""
+        size_str = f" [{format_size(item['local_size']):>10}] ({status}{note})"
+    elif item['remote_size']:
+        size_str = f" [{format_size(item['remote_size']):>10}] (remote)"
+    return symbol, size_str
 
 def print_source_tree(source_name, items_status, indent=""):
     """
     Print a formatted file tree for a model source.
     """
     installed_count = sum(1 for item in items_status if item['is_installed'])
+    damaged = any(item.get('status') in ("incomplete", "corrupt") for item in items_status)
     total_count = len(items_status)
     total_local_size = sum(item['local_size'] for item in items_status)
     
@@ -144,17 +70,11 @@ def print_source_tree(source_name, items_status, indent=""):
     
     if total_count == 1:
         item = items_status[0]
-        status_symbol = "✓" if item['is_installed'] else " "
-        size_str = ""
-        if item['is_installed']:
-            size_str = f" [{format_size(item['local_size']):>10}]"
-        elif item['remote_size']:
-            size_str = f" [{format_size(item['remote_size']):>10}] (remote)"
-            
+        status_symbol, size_str = _item_label(item)
         label = f"[{status_symbol}] {source_name}"
         print(f"{indent}{label:<{padding + 4}}{size_str}")
     else:
-        status_symbol = "✓" if installed_count == total_count else ("!" if installed_count > 0 else " ")
+        status_symbol = "✓" if installed_count == total_count else ("!" if installed_count > 0 or damaged else " ")
         total_size_str = f" [{format_size(total_local_size):>10}]" if total_local_size > 0 else ""
         
         label = f"[{status_symbol}] {source_name}"
@@ -162,76 +82,49 @@ def print_source_tree(source_name, items_status, indent=""):
         
         for i, item in enumerate(items_status):
             connector = "└──" if i == len(items_status) - 1 else "├──"
-            item_symbol = "✓" if item['is_installed'] else " "
-            
-            size_str = ""
-            if item['is_installed']:
-                size_str = f" [{format_size(item['local_size']):>10}]"
-            elif item['remote_size']:
-                size_str = f" [{format_size(item['remote_size']):>10}] (remote)"
-            
+            item_symbol, size_str = _item_label(item)
             name = os.path.basename(item['dest'])
             child_label = f" {connector} [{item_symbol}] {name}"
             print(f"{indent}  {child_label:<{padding + 2}}{size_str}")
 
-def process_download(source_name, comfyui_path, downloader=None, skip_prompt=False):
-    if not downloader:
-        downloader = check_downloader()
-        if not downloader:
-            print("Error: Neither aria2c nor wget found. Please install one of them.")
-            return False
-            
-    config_data, origin = get_source_config(source_name)
-    
-    if not config_data:
+def source_plan_entries(source_name, priority=None):
+    """source_entries, printing an error if the source cannot be loaded."""
+    entries, origin = source_entries(source_name, priority=priority)
+    if entries is None:
         print(f"Error: Could not load configuration for source '{source_name}'")
-        return False
+    return entries, origin
 
-    if config_data is None:
-        print(f"Error: Empty configuration for: {source_name}")
+def process_download(source_name, comfyui_path, downloader=None, skip_prompt=False, max_concurrent=None):
+    downloader = downloader or check_downloader()
+    entries, origin = source_plan_entries(source_name)
+    if entries is None:
         return False
-
-    downloads = []
-    if isinstance(config_data, list):
-        downloads = config_data
-    elif isinstance(config_data, dict):
-        downloads = config_data.get('downloads', [])
     
-    if not downloads:
-        print(f"Warning: No downloads found in {model_source_path}")
+    if not entries:
+        print(f"Warning: No downloads found in {origin}")
         return True
 
-    source_name = source_name # kept for display
-        
     print(f"\nSource: {source_name} ({origin})")
     print(f"ComfyUI Path: {comfyui_path}")
     
     # Show status tree before downloading
     print("\nFile status:")
-    items_status = get_downloads_status(downloads, comfyui_path, fetch_remote_size=True)
-    print_source_tree(source_name, items_status, indent="  ")
+    plan = build_plan(entries, comfyui_path)
+    print_source_tree(source_name, plan['files'], indent="  ")
     print()
 
     # If all items are installed, we can skip or confirm
-    all_installed = all(item['is_installed'] for item in items_status)
-    if all_installed:
+    if not plan['pending_count']:
         print("All files are already installed.")
         return True
 
-    # Calculate total download size
-    total_download_size = 0
-    for item in items_status:
-        if not item['is_installed'] and item['remote_size']:
-            total_download_size += item['remote_size']
-
-    # Check disk space
-    has_space, free_space = check_disk_space(comfyui_path, total_download_size)
+    total_download_size = plan['total_download_size']
     
     if total_download_size > 0:
         print(f"Total download size: {format_size(total_download_size)}")
-        print(f"Free disk space: {format_size(free_space)}")
+        print(f"Free disk space: {format_size(plan['free_space'])}")
         
-        if not has_space:
+        if not plan['has_space']:
             print("Warning: Not enough disk space!")
             if not skip_prompt:
                  if not user_confirm("Warning: Not enough disk space. Proceed anyway?"):
@@ -242,14 +135,9 @@ def process_download(source_name, comfyui_path, downloader=None, skip_prompt=Fal
                 print("Aborted.")
                 return False
 
-    for item in items_status:
-        if item['is_installed']:
-            # print(f"Skipping existing file: {os.path.basename(item['dest'])}")
-            continue
-            
-        full_dest = os.path.join(comfyui_path, item['dest'])
-        download_file(item['url'], full_dest, downloader)
-    return True
+    pending = [item for item in plan['files'] if not item['is_installed']]
+    results = download_items(pending, downloader, max_concurrent=max_concurrent)
+    return not results['failed']
 
 def handle_rm(model_sources, comfyui_path, force=False, dry_run=False):
     if not model_sources:
@@ -269,44 +157,21 @@ def handle_rm(model_sources, comfyui_path, force=False, dry_run=False):
             return
 
     for source_name in model_sources:
-        config_data, _ = get_source_config(source_name)
-        
-        if not config_data:
+        downloads, _ = source_entries(source_name)
+        if downloads is None:
             print(f"Error: Model source '{source_name}' not found.")
             continue
             
         print(f"\nProcessing removal for: {source_name}")
         
-        # indent fix? No, just logic flow replacement
-        pass
-            
-            
-            
-        downloads = []
-        if isinstance(config_data, list):
-            downloads = config_data
-        elif isinstance(config_data, dict):
-            downloads = config_data.get('downloads', [])
-            
         if not downloads:
             print("No files to remove in this source.")
             continue
             
-        files_to_delete = []
-        total_size = 0
-        
-        for item in downloads:
-            dest = item.get('dest')
-            if not dest:
-                continue
-            full_path = os.path.join(comfyui_path, dest)
-            if os.path.exists(full_path):
-                if os.path.isfile(full_path):
-                    size = os.path.getsize(full_path)
-                    files_to_delete.append((full_path, size))
-                    total_size += size
-                else:
-                    print(f"Warning: '{full_path}' exists but is a directory. Skipping.")
+        files_to_delete, directories = installed_files(downloads, comfyui_path)
+        for full_path in directories:
+            print(f"Warning: '{full_path}' exists but is a directory. Skipping.")
+        total_size = sum(size for _, size in files_to_delete)
         
         if not files_to_delete:
             print("No installed files found for this source.")
@@ -329,72 +194,147 @@ def handle_rm(model_sources, comfyui_path, force=False, dry_run=False):
                 print("Skipped.")
                 continue
                 
-        for path, _ in files_to_delete:
-            try:
-                os.remove(path)
-                rel_path = os.path.relpath(path, comfyui_path)
-                print(f"Deleted: {rel_path}")
-            except Exception as e:
-                print(f"Error deleting {path}: {e}")
+        result = remove_files(files_to_delete)
+        for path in result['removed']:
+            print(f"Deleted: {os.path.relpath(path, comfyui_path)}")
+        for path, error in result['errors'].items():
+            print(f"Error deleting {path}: {error}")
 
-from .civitai import process_civitai_download
+def handle_recover(comfyui_path, downloader=None, clean=False, dry_run=False, skip_prompt=False, max_concurrent=None):
+    """
+    Resume or clean up downloads that were interrupted (e.g. by a crash or
+    a killed process). Journaled partial files are resumed; partial files
+    that cannot be resumed and leftovers of finished downloads are
+    removed. With clean, all partial files are removed instead.
+    Returns True if nothing failed.
+    """
+    from .partials import find_partials, discard
+    models_dir = os.path.join(comfyui_path, "models")
+    partials = find_partials(models_dir) if os.path.isdir(models_dir) else []
+    if not partials:
+        print("No unfinished downloads found.")
+        return True
 
-def list_sources_status(comfyui_path):
+    print(f"Unfinished downloads in {models_dir}:")
+    for partial in partials:
+        rel_path = os.path.relpath(partial['path'], comfyui_path)
+        print(f"  - [{format_size(partial['part_size']):>10}] {rel_path} ({partial['state']})")
+
+    active = [p for p in partials if p['state'] == "active"]
+    resumable = [p for p in partials if p['state'] == "resumable"]
+    to_remove = [p for p in partials if p['state'] in ("finished", "orphaned")]
+    if clean:
+        to_remove += resumable
+        resumable = []
+    if active:
+        print(f"Skipping {len(active)} download(s) still in progress.")
+
+    if dry_run:
+        print(f"\nDry run: would resume {len(resumable)} and remove {len(to_remove)} partial download(s).")
+        return True
+    if not resumable and not to_remove:
+        return True
+    if not skip_prompt:
+        if not user_confirm(f"Resume {len(resumable)} and remove {len(to_remove)} partial download(s)?"):
+            print("Aborted.")
+            return False
+
+    for partial in to_remove:
+        discard(partial['path'])
+        print(f"Removed partial files of {os.path.relpath(partial['path'], comfyui_path)}")
+
+    if not resumable:
+        return True
+    downloader = downloader or check_downloader()
+    items = [{
+        'url': p['journal']['url'],
+        'path': p['path'],
+        'size': None,
+        'sha256': p['journal'].get('sha256'),
+        'mirrors': p['journal'].get('mirrors'),
+    } for p in resumable]
+    results = download_items(items, downloader, max_concurrent=max_concurrent)
+    return not results['failed']
+
+def list_sources_status(comfyui_path, verify=None):
+    """
+    Show the sources with installed files. With verify ('size', 'quick' or
+    'full', see verify.verify_files) their files are checked as well.
+    """
     sources = get_available_sources()
     if not sources:
         print("No model sources found.")
         return
 
     print(f"Installation status in: {comfyui_path}")
-    print("Legend: [✓] Installed, [ ] Missing, [!] Partially Installed\n")
+    if verify:
+        print("Legend: [✓] Installed, [ ] Missing, [!] Partially Installed, [~] Incomplete, [x] Corrupt\n")
+    else:
+        print("Legend: [✓] Installed, [ ] Missing, [!] Partially Installed\n")
     
+    sources_downloads = {}
     for source_name in sources:
         config_data, _ = get_source_config(source_name)
         
         if not config_data:
             continue
             
-        downloads = []
-        if isinstance(config_data, list):
-            downloads = config_data
-        elif isinstance(config_data, dict):
-            downloads = config_data.get('downloads', [])
-            
-        if not downloads:
-            continue
-
-        items_status = get_downloads_status(downloads, comfyui_path)
-        
-        installed_count = sum(1 for item in items_status if item['is_installed'])
-        if installed_count == 0:
-            continue
-
+        downloads = [item for item in source_downloads(config_data) if isinstance(item, dict)]
+        if downloads:
+            sources_downloads[source_name] = downloads
+
+    statuses = get_batch_downloads_status(sources_downloads, comfyui_path)
+    shown = {
+        source_name: items_status for source_name, items_status in statuses.items()
+        if any(item['is_installed'] for item in items_status)
+    }
+    if verify:
+        from .verify import verify_files
+        verify_files([item for items_status in shown.values() for item in items_status], mode=verify)
+
+    for source_name, items_status in shown.items():
         print_source_tree(source_name, items_status, indent="  ")
 
-
-def search_url_in_sources(url):
+def handle_verify(source_names, comfyui_path, mode="size", repair=False, skip_prompt=False, downloader=None, max_concurrent=None, as_json=False):
     """
-    Search for a URL in all available model sources to find a suggested destination.
-    Returns the folder path (dirname of dest) if found, else None.
+    Verify installed files of the given sources (default: every source
+    with installed files) and optionally repair them: incomplete files are
+    resumed with ranged requests, corrupt ones downloaded again.
+    Returns True if every file checked out (or was repaired).
     """
-    sources = get_available_sources()
-    for source in sources:
-        config_data, _ = get_source_config(source)
-        if not config_data:
-            continue
-            
-        downloads = []
-        if isinstance(config_data, list):
-            downloads = config_data
-        elif isinstance(config_data, dict):
-            downloads = config_data.get('downloads', [])
-            
-        for item in downloads:
-            if item.get('url') == url:
-                dest = item.get('dest')
-                if dest:
-                    return os.path.dirname(dest)
-    return None
+    from .verify import prepare_repair, recheck
+    with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+        if not source_names:
+            source_names = installed_source_names(comfyui_path)
+
+        entries, _ = collect_plan_entries(sources=source_names)
+        plan = plan_entries(entries, comfyui_path, verify=mode)
+        print_conflicts(plan)
+
+    show_plan(plan, as_json=as_json)
+    damaged = [item for item in plan['files'] if item['status'] in ("incomplete", "corrupt")]
+    if as_json or not damaged:
+        return not damaged
+    if not repair:
+        print(f"\n{len(damaged)} damaged file(s). Run with --repair to fix them.")
+        return False
+
+    downloader = downloader or check_downloader()
+    if not skip_prompt:
+        if not user_confirm(f"Repair {len(damaged)} file(s)?"):
+            print("Aborted.")
+            return False
+
+    for item in damaged:
+        prepare_repair(item, downloader)
+    results = download_items(damaged, downloader, max_concurrent=max_concurrent)
+    if results['failed']:
+        return False
+    still_damaged = recheck(damaged, comfyui_path, mode)
+    for item in still_damaged:
+        note = f": {item['verify_note']}" if item.get('verify_note') else ""
+        print(f"Error: {item['dest']} is still {item['status']} after repair{note}")
+    return not still_damaged
 
 def get_common_folders(comfyui_path):
     """
@@ -429,32 +369,21 @@ def get_common_folders(comfyui_path):
             
     return sorted(common)
 
-def handle_url_download(url, comfyui_path, target_dir=None, skip_prompt=False, downloader=None):
-    from urllib.parse import urlparse, unquote
-    
-    if not downloader:
-        downloader = check_downloader()
-        if not downloader:
-             print("Error: Neither aria2c nor wget found. Please install one of them.")
-             return
-
-    # Extract filename
-    parsed = urlparse(url)
-    filename = os.path.basename(parsed.path)
-    filename = unquote(filename)
-    
-    if not filename:
-        # Try to guess from content-disposition? 
-        # For now, if no filename in URL, ask user or fail.
-        # But most safetensors URLs have filename.
+def url_plan_entry(url, comfyui_path, target_dir=None, interactive=True):
+    """
+    Work out where a direct URL download goes.
+    Without target_dir the folder is chosen interactively (suggesting one
+    from the model sources), or taken from the suggestion when not
+    interactive. Returns a plan entry dict, or None.
+    """
+    if not url_filename(url):
         print("Error: Could not determine filename from URL.")
-        return
+        return None
 
     # Determine target directory
-    if not target_dir:
+    if not target_dir and interactive:
         # Search for suggestion
         suggested = search_url_in_sources(url)
-        
         # If suggested is like "models/checkpoints", strip "models/"
         # We assume the default standard is inside models/
         if suggested and suggested.startswith("models/"):
@@ -479,35 +408,39 @@ def handle_url_download(url, comfyui_path, target_dir=None, skip_prompt=False, d
         
         if not selected_folder:
             print("No folder selected. Aborting.")
-            return
+            return None
             
         # Construct path relative to ComfyUI/models
         # BUT wait, the user might have selected something that we extracted from 'models/' root
         # So we prepend 'models/'
         target_dir = os.path.join("models", selected_folder)
-    
-    # Construct full path
-    full_dest_path = os.path.join(comfyui_path, target_dir, filename)
+
+    try:
+        return url_entry(url, directory=target_dir)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+
+def handle_url_download(url, comfyui_path, target_dir=None, skip_prompt=False, downloader=None):
+    downloader = downloader or check_downloader()
+    entry = url_plan_entry(url, comfyui_path, target_dir=target_dir)
+    if not entry:
+        return
     
     # Check remote size and disk space
-    print(f"\nTarget: {os.path.relpath(full_dest_path, comfyui_path)}")
+    print(f"\nTarget: {entry['dest']}")
     
-    remote_size = get_remote_file_size(url)
-    has_space = True
-    free_space = 0
+    plan = build_plan([entry], comfyui_path)
+    item = plan['files'][0]
+    remote_size = item['remote_size']
     
     if remote_size:
-        has_space, free_space = check_disk_space(comfyui_path, remote_size)
         print(f"Download size: {format_size(remote_size)}")
-        print(f"Free disk space: {format_size(free_space)}")
     else:
         print("Remote size: Unknown")
-        # Check free space anyway just to show
-        from .utils import get_free_disk_space
-        free_space = get_free_disk_space(comfyui_path)
-        print(f"Free disk space: {format_size(free_space)}")
+    print(f"Free disk space: {format_size(plan['free_space'])}")
 
-    if not has_space:
+    if not plan['has_space']:
         print("Warning: Not enough disk space!")
         if not skip_prompt:
              if not user_confirm("Warning: Not enough disk space. Proceed anyway?"):
@@ -518,7 +451,154 @@ def handle_url_download(url, comfyui_path, target_dir=None, skip_prompt=False, d
              print("Aborted.")
              return
 
-    download_file(url, full_dest_path, downloader)
+    if item['is_installed']:
+        print(f"Skipping existing file: {os.path.basename(item['path'])}")
+        return
+    download_items([item], downloader)
+
+def show_plan(plan, as_json=False):
+    """Print a plan as per-source file trees and totals, or as JSON."""
+    if as_json:
+        print(plan_to_json(plan))
+        return
+    print(f"Plan for: {plan['comfyui_path']}\n")
+    by_source = {}
+    for item in plan['files']:
+        by_source.setdefault(item.get('source') or item['dest'], []).append(item)
+    for source_name, items in by_source.items():
+        print_source_tree(source_name, items, indent="  ")
+    print()
+    print_plan_summary(plan)
+
+def plan_sources(source_names, comfyui_path):
+    """Build one plan covering several model sources."""
+    entries, _ = collect_plan_entries(sources=source_names)
+    plan = plan_entries(entries, comfyui_path)
+    print_conflicts(plan)
+    return plan
+
+def load_manifest(path):
+    """
+    Load an install manifest (YAML or JSON). A plain list is taken as a
+    list of source names. Returns a dict with 'sources', 'urls' and
+    'civitai' lists and an optional 'comfyui_path'.
+    """
+    with open(path, 'r') as f:
+        data = yaml.safe_load(f) or {}
+    if isinstance(data, list):
+        data = {'sources': data}
+    if not isinstance(data, dict):
+        raise ValueError("manifest must be a mapping or a list of sources")
+    manifest = {'comfyui_path': data.get('comfyui_path')}
+    for key in ("sources", "urls", "civitai"):
+        value = data.get(key) or []
+        if not isinstance(value, list):
+            raise ValueError(f"'{key}' must be a list")
+        manifest[key] = value
+    return manifest
+
+def manifest_entries(manifest, comfyui_path, offline=False):
+    """
+    Resolve every source, URL and Civitai input of a manifest to plan
+    entries. Returns (entries, ok) where ok is False if any item failed.
+    """
+    entries, ok = collect_plan_entries(sources=manifest['sources'], urls=manifest['urls'])
+    if manifest['civitai']:
+        civitai_items, civitai_ok = collect_civitai_items([str(i) for i in manifest['civitai']], comfyui_path, offline=offline or is_offline())
+        for item in civitai_items:
+            item['source'] = f"civitai:{item['version_id']}"
+        entries.extend(civitai_items)
+        ok = ok and civitai_ok
+    return entries, ok
+
+def collect_plan_entries(sources=(), urls=()):
+    """collect_entries, printing the sources and URLs that failed. Returns (entries, ok)."""
+    entries, errors = collect_entries(sources=sources, urls=urls)
+    for error in errors:
+        print(f"Error: {error}")
+    return entries, not errors
+
+def print_conflicts(plan):
+    """Warn about dests of a plan_entries plan claimed with different URLs."""
+    for conflict in plan['conflicts']:
+        print(f"Warning: {conflict['dest']} is claimed by '{conflict['kept']}' and '{conflict['dropped']}' with different URLs; using '{conflict['kept']}'.")
+
+def install_entries(entries, comfyui_path, downloader=None, skip_prompt=False, max_concurrent=None, fetch_remote_size=True):
+    """
+    Install plan entries from any number of sources as one batch: files
+    claimed by several sources are fetched once, disk space is checked
+    for the whole batch, the user confirms once, and everything goes
+    through one download queue. Returns True if nothing failed.
+    """
+    downloader = downloader or check_downloader()
+    plan = plan_entries(entries, comfyui_path, fetch_remote_size=fetch_remote_size)
+    print_conflicts(plan)
+    show_plan(plan)
+    print()
+
+    if not plan['pending_count']:
+        print("All files are already installed.")
+        return True
+
+    if not plan['has_space']:
+        if not skip_prompt:
+            if not user_confirm("Warning: Not enough disk space. Proceed anyway?"):
+                return False
+
+    if not skip_prompt:
+        if not user_confirm(f"Do you want to download {plan['pending_count']} files?"):
+            print("Aborted.")
+            return False
+
+    pending = [item for item in plan['files'] if not item['is_installed']]
+    results = download_items(pending, downloader, max_concurrent=max_concurrent)
+
+    sources = list(dict.fromkeys(item.get('source') for item in plan['files']))
+    failed_sources = list(dict.fromkeys(item.get('source') for item in results['failed']))
+    print(f"Sources complete: {len(sources) - len(failed_sources)}/{len(sources)}")
+    for source_name in failed_sources:
+        print(f"  - incomplete: {source_name}")
+    return not results['failed']
+
+def build_source_plan(model_source, comfyui_path, target_dir=None):
+    """
+    Build a plan for what 'comfydl <model_source>' would download: an AIR
+    URN, a direct URL, a source name, or (with no model_source) sources
+    picked interactively. Returns None if nothing could be planned.
+    """
+    if model_source and model_source.startswith("urn:air:"):
+        plan, _ = plan_civitai_batch([model_source], comfyui_path)
+        return plan
+    if model_source and (model_source.startswith("http://") or model_source.startswith("https://")):
+        entry = url_plan_entry(model_source, comfyui_path, target_dir=target_dir, interactive=False)
+        return build_plan([entry], comfyui_path) if entry else None
+    if model_source:
+        entries, _ = source_plan_entries(model_source)
+        return build_plan(entries, comfyui_path) if entries is not None else None
+
+    sources = get_available_sources()
+    if not sources:
+        print("No model sources found.")
+        return None
+    selected = questionary.checkbox("Select model sources to plan:", choices=sources).ask()
+    if not selected:
+        print("No sources selected.")
+        return None
+    return plan_sources(selected, comfyui_path)
+
+def apply_run_options(args):
+    """
+    Apply the --limit-rate, --events and --metrics-file options of a
+    download command for this run. Exits on an invalid rate.
+    """
+    if args.limit_rate is not None:
+        try:
+            set_rate_override(parse_rate(args.limit_rate))
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    set_event_outputs(events_file=args.events, metrics_file=args.metrics_file)
+
 def main():
     parser = argparse.ArgumentParser(
         description="""ComfyDL: ComfyUI Model Downloader
@@ -537,14 +617,73 @@ Usage:
     set_parser.add_argument("value", help="Configuration value")
     
     # Civitai command
-    civitai_parser = subparsers.add_parser("civitai", help="Download model from Civitai by Model Version ID, URL, or AIR URN")
-    civitai_parser.add_argument("version_id", help="Civitai Model Version ID (integer), Download URL, or AIR URN")
-    civitai_parser.add_argument("comfyui_path", nargs="?", help="ComfyUI root directory override")
+    civitai_parser = subparsers.add_parser("civitai", help="Download models from Civitai by Model Version ID, URL, or AIR URN")
+    civitai_parser.add_argument("version_ids", nargs="*", help="Civitai Model Version IDs (integer), Download URLs, or AIR URNs, optionally followed by the ComfyUI root directory")
+    civitai_parser.add_argument("-f", "--file", help="Read IDs/URLs/AIR URNs from a file (one per line)")
+    civitai_parser.add_argument("--comfyui_path", dest="comfyui_path_option", help="ComfyUI root directory override")
     civitai_parser.add_argument("-y", "--yes", action="store_true", help="Skip confirmation prompt")
+    civitai_parser.add_argument("-j", "--jobs", type=int, help="Maximum number of files to download in parallel")
+    civitai_parser.add_argument("--downloader", choices=["aria2c", "wget", "native"], help="Download engine to use (default: auto-detect)")
+    civitai_parser.add_argument("--offline", action="store_true", help="Use only cached Civitai metadata")
+    civitai_parser.add_argument("--refresh", action="store_true", help="Ignore cached Civitai metadata and query the API")
+    civitai_parser.add_argument("--format", action="append", help="Only files in this format (e.g. safetensors); repeatable")
+    civitai_parser.add_argument("--fp", action="append", help="Only files with this precision (e.g. fp16); repeatable")
+    civitai_parser.add_argument("--size", action="append", choices=["pruned", "full"], help="Only pruned or full files; repeatable")
+    civitai_parser.add_argument("--file-type", action="append", dest="file_types", help="Only files of this type (e.g. Model, VAE, Config); repeatable")
+    civitai_parser.add_argument("--smallest", action="store_true", help="Pick the smallest matching file")
+    civitai_parser.add_argument("--all-files", action="store_true", help="Download every matching file instead of one per version")
+    civitai_parser.add_argument("--plan", action="store_true", help="Show what would be downloaded without downloading")
+    civitai_parser.add_argument("--json", action="store_true", help="Print the download plan as JSON (implies --plan)")
+    civitai_parser.add_argument("--limit-rate", help="Limit total download bandwidth, e.g. 20M (overrides BANDWIDTH_LIMIT)")
+    civitai_parser.add_argument("--events", help="Append JSON-lines progress events to this file ('-' for stdout)")
+    civitai_parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file (for node_exporter's textfile collector)")
+
+    # Install command
+    install_parser = subparsers.add_parser("install", help="Install the sources, URLs and Civitai models listed in a manifest")
+    install_parser.add_argument("manifest", help="Manifest file (YAML or JSON)")
+    install_parser.add_argument("--comfyui_path", help="ComfyUI root directory override")
+    install_parser.add_argument("-y", "--yes", action="store_true", help="Skip confirmation prompt")
+    install_parser.add_argument("-j", "--jobs", type=int, help="Maximum number of files to download in parallel")
+    install_parser.add_argument("--downloader", choices=["aria2c", "wget", "native"], help="Download engine to use (default: auto-detect)")
+    install_parser.add_argument("--offline", action="store_true", help="Use only cached Civitai metadata and remote sizes")
+    install_parser.add_argument("--plan", action="store_true", help="Show what would be downloaded without downloading")
+    install_parser.add_argument("--json", action="store_true", help="Print the download plan as JSON (implies --plan)")
+    install_parser.add_argument("--limit-rate", help="Limit total download bandwidth, e.g. 20M (overrides BANDWIDTH_LIMIT)")
+    install_parser.add_argument("--events", help="Append JSON-lines progress events to this file ('-' for stdout)")
+    install_parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file (for node_exporter's textfile collector)")
+
+    # Verify command
+    verify_parser = subparsers.add_parser("verify", help="Check installed files against the remote and repair damaged ones")
+    verify_parser.add_argument("model_sources", nargs="*", help="Model source names (default: all sources with installed files)")
+    verify_parser.add_argument("--comfyui_path", help="ComfyUI root directory override")
+    verify_group = verify_parser.add_mutually_exclusive_group()
+    verify_group.add_argument("--quick", action="store_true", help="Also compare the first and last blocks of each file with the server")
+    verify_group.add_argument("--full", action="store_true", help="Also hash each file completely against its known SHA256")
+    verify_parser.add_argument("--repair", action="store_true", help="Resume incomplete files and download corrupt ones again")
+    verify_parser.add_argument("-y", "--yes", action="store_true", help="Skip confirmation prompt")
+    verify_parser.add_argument("-j", "--jobs", type=int, help="Maximum number of files to download in parallel")
+    verify_parser.add_argument("--downloader", choices=["aria2c", "wget", "native"], help="Download engine to use (default: auto-detect)")
+    verify_parser.add_argument("--json", action="store_true", help="Print the verification result as JSON")
+    verify_parser.add_argument("--limit-rate", help="Limit total download bandwidth, e.g. 20M (overrides BANDWIDTH_LIMIT)")
+    verify_parser.add_argument("--events", help="Append JSON-lines progress events to this file ('-' for stdout)")
+    verify_parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file (for node_exporter's textfile collector)")
+
+    # Recover command
+    recover_parser = subparsers.add_parser("recover", help="Resume or clean up interrupted downloads")
+    recover_parser.add_argument("comfyui_path", nargs="?", help="ComfyUI root directory override")
+    recover_parser.add_argument("--clean", action="store_true", help="Remove all partial downloads instead of resuming them")
+    recover_parser.add_argument("--dry-run", action="store_true", help="Show what would be done without changing anything")
+    recover_parser.add_argument("-y", "--yes", action="store_true", help="Skip confirmation prompt")
+    recover_parser.add_argument("-j", "--jobs", type=int, help="Maximum number of files to download in parallel")
+    recover_parser.add_argument("--downloader", choices=["aria2c", "wget", "native"], help="Download engine to use (default: auto-detect)")
+    recover_parser.add_argument("--limit-rate", help="Limit total download bandwidth, e.g. 20M (overrides BANDWIDTH_LIMIT)")
+    recover_parser.add_argument("--events", help="Append JSON-lines progress events to this file ('-' for stdout)")
+    recover_parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file (for node_exporter's textfile collector)")
 
     # Sources command
     sources_parser = subparsers.add_parser("sources", help="List available model sources")
     sources_parser.add_argument("--installed", action="store_true", help="Show installation status in ComfyUI")
+    sources_parser.add_argument("--verify", action="store_true", help="With --installed, compare local file sizes with the remote")
 
     sources_parser.add_argument("--comfyui_path", help="ComfyUI root directory override")
 
@@ -569,9 +708,20 @@ Usage:
     reg_update.add_argument("registry_name", nargs="?", help="Specific registry name to update")
 
 
+    # Store command
+    store_parser = subparsers.add_parser("store", help="Manage the shared model store")
+    store_subparsers = store_parser.add_subparsers(dest="store_command", required=True)
+    store_gc = store_subparsers.add_parser("gc", help="Remove blobs no longer used by any ComfyUI root")
+    store_gc.add_argument("--dry-run", action="store_true", help="Show what would be removed without deleting")
+    store_subparsers.add_parser("info", help="Show model store location and usage")
+
     # List command (local models)
     list_parser = subparsers.add_parser("list", help="List downloaded models in ComfyUI models directory")
     list_parser.add_argument("comfyui_path", nargs="?", help="ComfyUI root directory override")
+    list_parser.add_argument("--json", action="store_true", help="Output the inventory as JSON")
+    list_parser.add_argument("--sort", choices=["name", "size"], default="name", help="Sort files by name or size (default: name)")
+    list_parser.add_argument("--by-folder", action="store_true", help="Show total size per model folder")
+    list_parser.add_argument("--cache", action="store_true", help="Reuse and update an inventory snapshot to skip unchanged directories")
 
     # Rm command
     rm_parser = subparsers.add_parser("rm", help="Remove models associated with a model source")
@@ -595,8 +745,13 @@ Usage:
             return
         elif sys.argv[1] == "civitai":
             args = parser.parse_args()
+            apply_run_options(args)
             
-            comfyui_path = args.comfyui_path
+            inputs = list(args.version_ids)
+            comfyui_path = args.comfyui_path_option
+            # Legacy form: comfydl civitai <id> <comfyui_path>
+            if not comfyui_path and len(inputs) > 1 and os.path.isdir(inputs[-1]):
+                comfyui_path = inputs.pop()
             if not comfyui_path:
                 comfyui_path = get_config_value("COMFYUI_ROOT")
                 
@@ -613,7 +768,71 @@ Usage:
             if not os.path.exists(os.path.join(comfyui_path, "main.py")):
                 print(f"Warning: '{comfyui_path}' does not look like a ComfyUI directory (main.py missing).")
 
-            process_civitai_download(args.version_id, comfyui_path, skip_prompt=args.yes)
+            try:
+                inputs = read_civitai_inputs(inputs, args.file)
+            except OSError as e:
+                print(f"Error: Could not read {args.file}: {e}")
+                sys.exit(1)
+            if not inputs:
+                print("Error: No model version IDs given.")
+                sys.exit(1)
+
+            filters = {
+                'format': args.format,
+                'fp': args.fp,
+                'size': args.size,
+                'types': args.file_types,
+                'smallest': args.smallest,
+                'all': args.all_files,
+            }
+            if args.plan or args.json:
+                # Keep stdout clean for the JSON document
+                with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+                    plan, ok = plan_civitai_batch(inputs, comfyui_path, offline=args.offline, refresh=args.refresh, filters=filters)
+                if plan is None:
+                    sys.exit(1)
+                show_plan(plan, as_json=args.json)
+                if not ok:
+                    sys.exit(1)
+                return
+            if not process_civitai_batch(inputs, comfyui_path, downloader=args.downloader, skip_prompt=args.yes, max_concurrent=args.jobs, offline=args.offline, refresh=args.refresh, filters=filters):
+                sys.exit(1)
+            return
+        elif sys.argv[1] == "install":
+            args = parser.parse_args()
+            apply_run_options(args)
+            try:
+                manifest = load_manifest(args.manifest)
+            except (OSError, ValueError, yaml.YAMLError) as e:
+                print(f"Error: Could not read manifest {args.manifest}: {e}")
+                sys.exit(1)
+
+            comfyui_path = args.comfyui_path or manifest['comfyui_path'] or get_config_value("COMFYUI_ROOT")
+            if not comfyui_path:
+                print("Error: ComfyUI path not specified.")
+                sys.exit(1)
+            comfyui_path = os.path.abspath(os.path.expanduser(comfyui_path))
+            if not os.path.exists(comfyui_path):
+                print(f"Error: ComfyUI directory '{comfyui_path}' does not exist.")
+                sys.exit(1)
+
+            offline = args.offline or is_offline()
+            if args.plan or args.json:
+                with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+                    entries, ok = manifest_entries(manifest, comfyui_path, offline=offline)
+                    plan = plan_entries(entries, comfyui_path, fetch_remote_size=not offline)
+                    print_conflicts(plan)
+                show_plan(plan, as_json=args.json)
+                if not ok:
+                    sys.exit(1)
+                return
+
+            entries, ok = manifest_entries(manifest, comfyui_path, offline=offline)
+            if not entries:
+                print("Error: Nothing to install.")
+                sys.exit(1)
+            if not install_entries(entries, comfyui_path, downloader=args.downloader, skip_prompt=args.yes, max_concurrent=args.jobs, fetch_remote_size=not offline) or not ok:
+                sys.exit(1)
             return
         elif sys.argv[1] == "registry":
             args, _ = parser.parse_known_args()
@@ -641,10 +860,10 @@ Usage:
                     # delete cache file?
                     # we should delete the cache file too ideally
                     try:
-                        from .config import get_registry_path
-                        p = get_registry_path(found_name)
-                        if p.exists():
-                            os.remove(p)
+                        from .config import get_registry_path, get_registry_meta_path
+                        for p in (get_registry_path(found_name), get_registry_meta_path(found_name)):
+                            if p.exists():
+                                os.remove(p)
                     except Exception:
                         pass
                 else:
@@ -667,6 +886,32 @@ Usage:
                 update_registry(args.registry_name)
             
             return
+        elif sys.argv[1] == "store":
+            args, _ = parser.parse_known_args()
+            store = get_model_store()
+            if store is None:
+                print("Model store is not enabled. Set it with: comfydl set MODEL_STORE_PATH <path>")
+                sys.exit(1)
+
+            if args.store_command == "gc":
+                removed, reclaimed = store.gc(dry_run=args.dry_run)
+                if args.dry_run:
+                    print(f"Dry run: {removed} blob(s) would be removed, reclaiming {format_size(reclaimed)}.")
+                else:
+                    print(f"Removed {removed} blob(s), reclaimed {format_size(reclaimed)}.")
+            elif args.store_command == "info":
+                total_size = 0
+                count = 0
+                blobs_dir = store.root / "blobs"
+                if blobs_dir.exists():
+                    for root, dirs, files in os.walk(blobs_dir):
+                        for file in files:
+                            total_size += os.path.getsize(os.path.join(root, file))
+                            count += 1
+                print(f"Model store: {store.root}")
+                print(f"Link mode: {store.link_mode}")
+                print(f"Blobs: {count} ({format_size(total_size)})")
+            return
         elif sys.argv[1] == "sources":
             args, _ = parser.parse_known_args()
             if args.installed:
@@ -683,7 +928,7 @@ Usage:
                     print(f"Error: ComfyUI directory '{comfyui_path}' does not exist.")
                     sys.exit(1)
                 
-                list_sources_status(comfyui_path)
+                list_sources_status(comfyui_path, verify="size" if args.verify else None)
             else:
                 sources = get_available_sources()
                 if not sources:
@@ -710,25 +955,55 @@ Usage:
                 print(f"Error: Models directory not found at {models_dir}")
                 sys.exit(1)
             
+            inventory = scan_models(models_dir, use_snapshot=args.cache)
+            files = sort_files(inventory['files'], args.sort)
+            totals = folder_totals(files)
+
+            if args.json:
+                print(json.dumps({
+                    'models_dir': models_dir,
+                    'files': files,
+                    'folders': totals,
+                    'total_size': inventory['total_size'],
+                }, indent=2))
+                return
+
             print(f"Models in {models_dir}:")
-            found = False
-            total_size = 0
-            for root, dirs, files in os.walk(models_dir):
-                for file in files:
-                    if file.startswith('.') or file.endswith('.txt') or file.endswith('.md'):
-                        continue
-                    found = True
-                    file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(file_path, models_dir)
-                    size = os.path.getsize(file_path)
-                    total_size += size
-                    size_str = format_size(size)
-                    print(f"  - [{size_str:>10}] {rel_path}")
+            if args.by_folder:
+                ordered = sorted(totals.items(), key=lambda kv: -kv[1]['size'] if args.sort == "size" else kv[0])
+                for folder, entry in ordered:
+                    print(f"  - [{format_size(entry['size']):>10}] {folder} ({entry['count']} files)")
+            else:
+                for f in files:
+                    print(f"  - [{format_size(f['size']):>10}] {f['path']}")
             
-            if not found:
+            if not files:
                 print("  (No models found)")
             else:
-                print(f"\nTotal size: {format_size(total_size)}")
+                print(f"\nTotal size: {format_size(inventory['total_size'])}")
+            return
+        elif sys.argv[1] == "verify":
+            args = parser.parse_args()
+            apply_run_options(args)
+            comfyui_path = args.comfyui_path or get_config_value("COMFYUI_ROOT")
+            if not comfyui_path:
+                print("Error: ComfyUI path not specified.")
+                sys.exit(1)
+            comfyui_path = os.path.abspath(comfyui_path)
+            mode = "full" if args.full else ("quick" if args.quick else "size")
+            if not handle_verify(args.model_sources, comfyui_path, mode=mode, repair=args.repair, skip_prompt=args.yes, downloader=args.downloader, max_concurrent=args.jobs, as_json=args.json):
+                sys.exit(1)
+            return
+        elif sys.argv[1] == "recover":
+            args, _ = parser.parse_known_args()
+            apply_run_options(args)
+            comfyui_path = args.comfyui_path or get_config_value("COMFYUI_ROOT")
+            if not comfyui_path:
+                print("Error: ComfyUI path not specified.")
+                sys.exit(1)
+            comfyui_path = os.path.abspath(comfyui_path)
+            if not handle_recover(comfyui_path, downloader=args.downloader, clean=args.clean, dry_run=args.dry_run, skip_prompt=args.yes, max_concurrent=args.jobs):
+                sys.exit(1)
             return
         elif sys.argv[1] == "rm":
             args, _ = parser.parse_known_args()
@@ -751,8 +1026,16 @@ Usage:
     parser.add_argument("comfyui_path", nargs="?", help="ComfyUI root directory override")
     parser.add_argument("-d", "--directory", help="Target directory relative to ComfyUI root (e.g. models/checkpoints)")
     parser.add_argument("-y", "--yes", action="store_true", help="Skip confirmation prompt")
+    parser.add_argument("-j", "--jobs", type=int, help="Maximum number of files to download in parallel")
+    parser.add_argument("--downloader", choices=["aria2c", "wget", "native"], help="Download engine to use (default: auto-detect)")
+    parser.add_argument("--plan", action="store_true", help="Show what would be downloaded without downloading")
+    parser.add_argument("--json", action="store_true", help="Print the download plan as JSON (implies --plan)")
+    parser.add_argument("--limit-rate", help="Limit total download bandwidth, e.g. 20M (overrides BANDWIDTH_LIMIT)")
+    parser.add_argument("--events", help="Append JSON-lines progress events to this file ('-' for stdout)")
+    parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file (for node_exporter's textfile collector)")
     
     args = parser.parse_args()
+    apply_run_options(args)
     
     # Logic for download
     # Check for ComfyUI path first as it is required for any download
@@ -775,19 +1058,24 @@ Usage:
     if not os.path.exists(os.path.join(comfyui_path, "main.py")):
         print(f"Warning: '{comfyui_path}' does not look like a ComfyUI directory (main.py missing).")
 
-    downloader = check_downloader()
-    if not downloader:
-        print("Error: Neither aria2c nor wget found. Please install one of them.")
-        sys.exit(1)
+    if args.plan or args.json:
+        with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+            plan = build_source_plan(args.model_source, comfyui_path, target_dir=args.directory)
+        if plan is None:
+            sys.exit(1)
+        show_plan(plan, as_json=args.json)
+        return
+
+    downloader = args.downloader or check_downloader()
     print(f"Using downloader: {downloader}")
 
     if args.model_source:
         if args.model_source.startswith("urn:air:"):
-            process_civitai_download(args.model_source, comfyui_path, skip_prompt=args.yes)
+            process_civitai_download(args.model_source, comfyui_path, downloader=downloader, skip_prompt=args.yes, max_concurrent=args.jobs)
         elif args.model_source.startswith("http://") or args.model_source.startswith("https://"):
             handle_url_download(args.model_source, comfyui_path, target_dir=args.directory, skip_prompt=args.yes, downloader=downloader)
         else:
-            process_download(args.model_source, comfyui_path, downloader, skip_prompt=args.yes)
+            process_download(args.model_source, comfyui_path, downloader, skip_prompt=args.yes, max_concurrent=args.jobs)
     else:
         # Interactive mode
         sources = get_available_sources()
@@ -804,8 +1092,15 @@ Usage:
             print("No sources selected.")
             sys.exit(0)
             
-        for source_name in selected:
-             process_download(source_name, comfyui_path, downloader, skip_prompt=args.yes)
+        if len(selected) == 1:
+            process_download(selected[0], comfyui_path, downloader, skip_prompt=args.yes, max_concurrent=args.jobs)
+        else:
+            entries = []
+            for source_name in selected:
+                selected_entries, _ = source_plan_entries(source_name)
+                if selected_entries:
+                    entries.extend(selected_entries)
+            install_entries(entries, comfyui_path, downloader, skip_prompt=args.yes, max_concurrent=args.jobs)
 
 if __name__ == "__main__":
     main()
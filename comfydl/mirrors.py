@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .config import get_config_value
+from .hoststats import url_host, get_host_stats, record_latency, record_failure
+
+# Re-measure a host's latency after this many seconds
+LATENCY_TTL = 3600
+# Hosts that failed this recently are tried last
+FAILURE_PENALTY = 600
+PROBE_TIMEOUT = 5
+
+def parse_mirror_rules(value):
+    """
+    Parse URL prefix rewrites from config.
+    Accepts a dict {prefix: replacement or [replacements]} or a string like
+    "https://huggingface.co/=http://cache.local/hf/,https://huggingface.co/=https://hf-mirror.com/".
+    Returns a list of (prefix, replacement) pairs in order.
+    """
+    rules = []
+    if not value:
+        return rules
+    if isinstance(value, dict):
+        for prefix, replacements in value.items():
+            if isinstance(replacements, str):
+                replacements = [replacements]
+            rules.extend((prefix, replacement) for replacement in replacements)
+    else:
+        for part in str(value).split(","):
+            if "=" in part:
+                prefix, replacement = part.split("=", 1)
+                rules.append((prefix.strip(), replacement.strip()))
+    return [(prefix, replacement) for prefix, replacement in rules if prefix and replacement]
+
+def get_mirror_rules():
+    return parse_mirror_rules(get_config_value("MIRRORS"))
+
+def candidate_urls(url, mirrors=None):
+    """
+    All URLs a file can be fetched from: the item's own URL, the mirrors
+    listed with it, and rewrites from the MIRRORS config. Deduplicated,
+    in that order.
+    """
+    candidates = [url] + list(mirrors or [])
+    for prefix, replacement in get_mirror_rules():
+        for candidate in list(candidates):
+            if candidate.startswith(prefix):
+                candidates.append(replacement + candidate[len(prefix):])
+    return list(dict.fromkeys(candidates))
+
+def probe_latency(url, session=None):
+    """
+    Time a HEAD request to url (first hop only) and record it for the
+    host. Returns the seconds taken, or None if the host failed.
+    """
+    from .utils import get_http_session, append_civitai_token, auth_headers
+    session = session or get_http_session()
+    final_url = append_civitai_token(url)
+    start = time.time()
+    try:
+        response = session.head(final_url, headers=auth_headers(final_url), allow_redirects=False, timeout=PROBE_TIMEOUT)
+        if response.status_code >= 400:
+            raise IOError(f"HTTP {response.status_code}")
+    except Exception:
+        record_failure(url)
+        return None
+    elapsed = time.time() - start
+    record_latency(url, elapsed)
+    return elapsed
+
+def _rank_key(stats, prior):
+    recently_failed = time.time() - stats.get('last_failure', 0) < FAILURE_PENALTY
+    # Hosts never downloaded from are assumed as fast as the best measured
+    # one, so the lower latency decides whether they get measured next.
+    throughput = stats.get('throughput') or prior
+    return (recently_failed, -throughput, stats.get('latency', float("inf")))
+
+def rank_urls(urls, probe=True):
+    """
+    Order candidate URLs fastest first using the recorded per-host
+    throughput, latency and recent failures; a host never downloaded
+    from counts as fast as the best measured one. With probe, hosts whose
+    latency is unknown or old are measured first (concurrently).
+    """
+    if len(urls) < 2:
+        return list(urls)
+    if probe:
+        now = time.time()
+        stale = {}
+        for url in urls:
+            stats = get_host_stats(url)
+            if now - stats.get('latency_at', 0) > LATENCY_TTL:
+                stale.setdefault(url_host(url), url)
+        if stale:
+            with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+                list(executor.map(probe_latency, stale.values()))
+    stats = {url: get_host_stats(url) for url in urls}
+    prior = max((entry.get('throughput') or 0 for entry in stats.values()), default=0)
+    return sorted(urls, key=lambda url: _rank_key(stats[url], prior))
@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+import time
+from tqdm import tqdm
+from .config import get_config_value, atomic_write
+from .utils import get_http_session
+
+DEFAULT_SEGMENTS = 8
+MIN_SEGMENT_SIZE = 16 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+STATE_SAVE_INTERVAL = 2.0
+STATE_SUFFIX = ".comfydl"
+
+def get_state_path(filepath):
+    return filepath + STATE_SUFFIX
+
+def get_segment_count():
+    value = get_config_value("NATIVE_SEGMENTS")
+    try:
+        return max(1, int(value)) if value else DEFAULT_SEGMENTS
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid NATIVE_SEGMENTS '{value}', using {DEFAULT_SEGMENTS}.")
+        return DEFAULT_SEGMENTS
+
+def _probe(session, url, headers):
+    """
+    Resolve redirects and find the total size and whether byte ranges
+    are supported. Returns (final_url, size_or_None, accepts_ranges).
+    """
+    probe_headers = dict(headers)
+    probe_headers["Range"] = "bytes=0-0"
+    with session.get(url, headers=probe_headers, stream=True, allow_redirects=True, timeout=30) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            content_range = response.headers.get("Content-Range", "")
+            total = content_range.rsplit("/", 1)[-1]
+            size = int(total) if total.isdigit() else None
+            return response.url, size, size is not None
+        content_length = response.headers.get("Content-Length")
+        return response.url, int(content_length) if content_length else None, False
+
+def _split(size, count):
+    count = max(1, min(count, size // MIN_SEGMENT_SIZE or 1))
+    step = size // count
+    segments = []
+    for i in range(count):
+        start = i * step
+        end = size - 1 if i == count - 1 else start + step - 1
+        segments.append({'start': start, 'end': end, 'done': 0})
+    return segments
+
+class _PositionalWriter:
+    """
+    Write at absolute offsets. Uses os.pwrite where available so segment
+    threads never contend on a shared file position.
+    """
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+        self._lock = None if hasattr(os, "pwrite") else threading.Lock()
+
+    def write(self, data, offset):
+        if self._lock is None:
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(self.fd, view, offset)
+                view = view[written:]
+                offset += written
+        else:
+            with self._lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                os.write(self.fd, data)
+
+    def close(self):
+        os.close(self.fd)
+
+class NativeDownload:
+    """
+    A single-file download over HTTP Range requests, split into segments
+    fetched in parallel and written into a preallocated file. Progress is
+    persisted to a sidecar state file so an interrupted download resumes
+    where each segment stopped.
+    """
+
+    def __init__(self, url, filepath, headers=None, segments=None, quiet=False, throttle=None):
+        self.url = url
+        self.filepath = filepath
+        self.headers = headers or {}
+        self.segment_count = segments or get_segment_count()
+        self.quiet = quiet
+        # Called with the size of each received chunk; may sleep to limit the rate
+        self.throttle = throttle
+        self.state_path = get_state_path(filepath)
+        self.session = get_http_session()
+        self._lock = threading.Lock()
+        self._last_save = 0
+        self._error = None
+        self._streamed = 0
+        self.state = None
+        self.bar = None
+
+    def contiguous_bytes(self):
+        """
+        Number of bytes complete from the start of the file. Segments are
+        written out of order, so this is the prefix up to the first
+        unfinished segment.
+        """
+        if self.state is None:
+            return self._streamed
+        total = 0
+        for segment in self.state['segments']:
+            length = segment['end'] - segment['start'] + 1
+            total += segment['done']
+            if segment['done'] < length:
+                break
+        return total
+
+    def _load_state(self, size):
+        if not os.path.exists(self.state_path) or not os.path.exists(self.filepath):
+            return None
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except Exception:
+            return None
+        if state.get('size') != size or os.path.getsize(self.filepath) != size:
+            return None
+        return state
+
+    def _save_state(self, force=False):
+        now = time.time()
+        if not force and now - self._last_save < STATE_SAVE_INTERVAL:
+            return
+        self._last_save = now
+        atomic_write(self.state_path, json.dumps(self.state))
+
+    def _fetch_segment(self, url, segment, writer):
+        while segment['done'] < segment['end'] - segment['start'] + 1:
+            if self._error is not None:
+                return
+            offset = segment['start'] + segment['done']
+            headers = dict(self.headers)
+            headers["Range"] = f"bytes={offset}-{segment['end']}"
+            with self.session.get(url, headers=headers, stream=True, timeout=30) as response:
+                if response.status_code != 206:
+                    if response.status_code == 200:
+                        raise IOError("Server ignored range request (HTTP 200)")
+                    # HTTPError carries the response, so 429/5xx are retried
+                    # and Retry-After is honored (see retry.py)
+                    response.raise_for_status()
+                    raise IOError(f"Unexpected response to range request (HTTP {response.status_code})")
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if self._error is not None:
+                        return
+                    if not chunk:
+                        continue
+                    writer.write(chunk, offset)
+                    offset += len(chunk)
+                    with self._lock:
+                        segment['done'] += len(chunk)
+                        if self.bar is not None:
+                            self.bar.update(len(chunk))
+                        self._save_state()
+                    if self.throttle is not None:
+                        self.throttle(len(chunk))
+
+    def _run_segment(self, url, segment, writer):
+        try:
+            self._fetch_segment(url, segment, writer)
+        except Exception as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+
+    def _stream_whole(self, url):
+        """Fallback for servers without range support: one sequential stream."""
+        with self.session.get(url, headers=self.headers, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            with open(self.filepath, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        f.flush()
+                        self._streamed += len(chunk)
+                        if self.bar is not None:
+                            self.bar.update(len(chunk))
+                        if self.throttle is not None:
+                            self.throttle(len(chunk))
+
+    def run(self):
+        final_url, size, accepts_ranges = _probe(self.session, self.url, self.headers)
+        filename = os.path.basename(self.filepath)
+        if not self.quiet:
+            self.bar = tqdm(total=size, unit="B", unit_scale=True, unit_divisor=1024, desc=filename[:40])
+        try:
+            if not accepts_ranges or not size:
+                self._stream_whole(final_url)
+                return
+
+            self.state = self._load_state(size)
+            if self.state is None:
+                self.state = {'size': size, 'segments': _split(size, self.segment_count)}
+                # Preallocate (sparse where supported) so segments can be
+                # written at their final offsets.
+                with open(self.filepath, 'wb') as f:
+                    f.truncate(size)
+                self._save_state(force=True)
+            elif self.bar is not None:
+                self.bar.update(sum(s['done'] for s in self.state['segments']))
+
+            writer = _PositionalWriter(self.filepath)
+            try:
+                threads = [
+                    threading.Thread(target=self._run_segment, args=(final_url, segment, writer), daemon=True)
+                    for segment in self.state['segments']
+                ]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            finally:
+                writer.close()
+                with self._lock:
+                    if self._error is None:
+                        os.remove(self.state_path)
+                    else:
+                        self._save_state(force=True)
+            if self._error is not None:
+                raise self._error
+        finally:
+            if self.bar is not None:
+                self.bar.close()
+
+def seed_state(filepath, size, done):
+    """
+    Describe a file whose first done bytes are already downloaded (e.g. a
+    truncated copy) so the next run fetches only the remaining bytes.
+    """
+    with open(filepath, 'r+b') as f:
+        f.truncate(size)
+    segments = [{'start': 0, 'end': done - 1, 'done': done}] if done else []
+    for segment in _split(size - done, get_segment_count()):
+        segments.append({'start': segment['start'] + done, 'end': segment['end'] + done, 'done': 0})
+    atomic_write(get_state_path(filepath), json.dumps({'size': size, 'segments': segments}))
@@ -0,0 +1,177 @@
+import json
+import os
+import socket
+import time
+from .config import atomic_write
+
+# Downloads are written to <dest>.part and renamed into place when verified;
+# <dest>.part.json records what is being downloaded so it can be resumed.
+PART_SUFFIX = ".part"
+JOURNAL_SUFFIX = ".part.json"
+# Sidecars the engines keep next to the file they write
+ENGINE_SUFFIXES = (".aria2", ".comfydl")
+
+def part_path(filepath):
+    return filepath + PART_SUFFIX
+
+def journal_path(filepath):
+    return filepath + JOURNAL_SUFFIX
+
+def is_partial_name(name):
+    return name.endswith(PART_SUFFIX) or name.endswith(JOURNAL_SUFFIX) or any(
+        name.endswith(PART_SUFFIX + suffix) for suffix in ENGINE_SUFFIXES)
+
+def write_journal(filepath, url, sha256=None, mirrors=None):
+    """Record an in-progress download of url (without tokens) to filepath."""
+    atomic_write(journal_path(filepath), json.dumps({
+        'url': url,
+        'mirrors': mirrors or [],
+        'sha256': sha256,
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'started_at': time.time(),
+    }))
+
+def read_journal(filepath):
+    try:
+        with open(journal_path(filepath), 'r') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except (OSError, ValueError):
+        return None
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def discard(filepath):
+    """Remove the partial file, its engine sidecars and its journal."""
+    part = part_path(filepath)
+    for path in [part] + [part + suffix for suffix in ENGINE_SUFFIXES] + [journal_path(filepath)]:
+        _remove(path)
+
+def adopt_legacy_partial(filepath):
+    """
+    Move a partial download that older versions left at the final path
+    (with an aria2c or native sidecar next to it) to the .part name, so it
+    is resumed rather than restarted.
+    """
+    part = part_path(filepath)
+    if os.path.exists(part) or not os.path.exists(filepath):
+        return
+    for suffix in ENGINE_SUFFIXES:
+        if os.path.exists(filepath + suffix):
+            os.replace(filepath + suffix, part + suffix)
+            os.replace(filepath, part)
+            return
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def finalize(filepath):
+    """
+    Flush the verified .part file to disk, rename it to filepath and drop
+    the journal. After a crash, filepath either does not exist or is
+    complete.
+    """
+    part = part_path(filepath)
+    with open(part, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(part, filepath)
+    _fsync_dir(os.path.dirname(filepath) or ".")
+    _remove(journal_path(filepath))
+
+def _is_active(journal):
+    """True if the process that wrote journal is still running on this host."""
+    if not journal or journal.get('host') != socket.gethostname():
+        return False
+    try:
+        os.kill(int(journal.get('pid')), 0)
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+def _partial_base(name):
+    """The final file name that name is a partial, journal or sidecar of, or None."""
+    if name.endswith(JOURNAL_SUFFIX):
+        return name[:-len(JOURNAL_SUFFIX)]
+    if name.endswith(PART_SUFFIX):
+        return name[:-len(PART_SUFFIX)]
+    sidecar = next((s for s in ENGINE_SUFFIXES if name.endswith(PART_SUFFIX + s)), None)
+    if sidecar is not None:
+        return name[:-len(PART_SUFFIX + sidecar)]
+    return None
+
+def _classify(filepaths):
+    from .scheduler import bytes_on_disk
+    partials = []
+    for filepath in sorted(filepaths):
+        part = part_path(filepath)
+        journal = read_journal(filepath)
+        part_size = bytes_on_disk(part)
+        if _is_active(journal):
+            state = "active"
+        elif os.path.exists(filepath) and not any(os.path.exists(filepath + s) for s in ENGINE_SUFFIXES):
+            state = "finished"
+        elif journal and journal.get('url') and os.path.exists(part):
+            state = "resumable"
+        else:
+            state = "orphaned"
+        partials.append({'path': filepath, 'part_size': part_size, 'journal': journal, 'state': state})
+    return partials
+
+def find_partials(root):
+    """
+    Find unfinished downloads under root.
+    Returns a list of dicts with 'path' (final destination), 'part_size'
+    (bytes written so far), 'journal' and 'state', one of:
+      'resumable' - partial file with a journal naming its URL
+      'active'    - still being written by a running comfydl
+      'finished'  - leftovers of a download whose file is in place
+      'orphaned'  - partial file, journal or engine sidecar that cannot
+                    be resumed
+    """
+    found = set()
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            base = _partial_base(name)
+            if base is not None:
+                found.add(os.path.join(dirpath, base))
+    return _classify(found)
+
+def clean_stale_partials(directories):
+    """
+    Look for unfinished downloads in directories (not their subfolders),
+    as find_partials does. Leftovers of finished downloads, and journals
+    or sidecars whose partial file is gone, are removed. Returns the
+    other unfinished downloads that no running comfydl is writing; their
+    partial files are kept, since downloading the file again resumes them.
+    """
+    found = set()
+    for directory in dict.fromkeys(directories):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            continue
+        for name in names:
+            base = _partial_base(name)
+            if base is not None:
+                found.add(os.path.join(directory, base))
+    unfinished = []
+    for partial in _classify(found):
+        if partial['state'] == "finished" or (partial['state'] == "orphaned" and not os.path.exists(part_path(partial['path']))):
+            discard(partial['path'])
+        elif partial['state'] != "active":
+            unfinished.append(partial)
+    return unfinished
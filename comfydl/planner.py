@@ -0,0 +1,184 @@
+import json
+import os
+from .utils import stat_paths, get_remote_file_sizes, get_free_disk_space, format_size
+from .cache import get_remote_cache
+from .hoststats import url_host, get_throughput
+from .mirrors import candidate_urls, rank_urls
+
+def _resolved_host(url):
+    """Host that actually serves url, from the cached redirect target."""
+    entry = get_remote_cache().get(url, allow_stale=True)
+    final_url = entry['value'].get('final_url') if entry else None
+    return url_host(final_url or url)
+
+def plan_files(entries, comfyui_path, fetch_remote_size=True, verify=None):
+    """
+    Work out the status of download entries without downloading anything.
+
+    entries are dicts with 'url' and 'dest' (relative to comfyui_path) and
+    optionally 'sha256', 'size' (a known remote size), 'mirrors',
+    'priority' and 'source'. Other keys are passed through. Each returned file adds 'path',
+    'is_installed', 'status', 'local_size', 'remote_size', 'download_size',
+    'mirror' (the host the download would start from, after redirects)
+    and 'estimated_seconds' (at that host's measured throughput, None if
+    never measured).
+    verify ('size', 'quick' or 'full', see verify.verify_files) also
+    checks installed files, which may then be 'incomplete' or 'corrupt'.
+    """
+    entries = [entry for entry in entries if entry.get('dest')]
+    stats = stat_paths([os.path.join(comfyui_path, entry['dest']) for entry in entries])
+
+    files = []
+    for entry in entries:
+        path = os.path.join(comfyui_path, entry['dest'])
+        info = stats[path]
+        is_installed = info['is_file'] and not info['pending']
+        item = dict(entry)
+        remote_size = item.pop('size', None)
+        item.update({
+            'source': entry.get('source'),
+            'url': entry.get('url'),
+            'sha256': entry.get('sha256'),
+            'path': path,
+            'is_installed': is_installed,
+            'status': "installed" if is_installed else "missing",
+            'local_size': info['size'] if is_installed else 0,
+            'remote_size': remote_size,
+        })
+        files.append(item)
+
+    if fetch_remote_size:
+        to_probe = [item['url'] for item in files if not item['is_installed'] and item['url'] and not item['remote_size']]
+        if to_probe:
+            sizes = get_remote_file_sizes(to_probe)
+            for item in files:
+                if not item['is_installed'] and item['url'] and not item['remote_size']:
+                    item['remote_size'] = sizes.get(item['url'])
+
+    if verify:
+        from .verify import verify_files
+        verify_files(files, mode=verify)
+
+    for item in files:
+        # The URL a download would start from, ranked on recorded stats only
+        source_url = rank_urls(candidate_urls(item['url'], item.get('mirrors')), probe=False)[0] if item['url'] else None
+        item['mirror'] = _resolved_host(source_url) if source_url else None
+        item['download_size'] = _download_size(item)
+        item['estimated_seconds'] = None
+        if item['download_size'] and source_url:
+            throughput = get_throughput(source_url)
+            if throughput:
+                item['estimated_seconds'] = round(item['download_size'] / throughput, 1)
+    return files
+
+def _download_size(item):
+    """Bytes still to fetch: all of a missing file, the rest of an incomplete one."""
+    if item['is_installed']:
+        return 0
+    if not item['remote_size']:
+        return None
+    if item['status'] == "incomplete":
+        return item['remote_size'] - item['local_size']
+    return item['remote_size']
+
+def dedupe_entries(entries):
+    """
+    Drop entries whose dest was already claimed by an earlier entry.
+    Returns (unique_entries, conflicts) where conflicts lists
+    (kept, dropped) pairs that disagree on the URL.
+    """
+    by_dest = {}
+    unique = []
+    conflicts = []
+    for entry in entries:
+        dest = entry.get('dest')
+        if not dest:
+            continue
+        key = os.path.normpath(dest)
+        kept = by_dest.get(key)
+        if kept is None:
+            by_dest[key] = entry
+            unique.append(entry)
+        elif kept.get('url') != entry.get('url'):
+            conflicts.append((kept, entry))
+    return unique, conflicts
+
+def build_plan(entries, comfyui_path, fetch_remote_size=True, verify=None):
+    """
+    Build a download plan: per-file status plus the totals needed to decide
+    whether to proceed (download size, free space, estimated time).
+    """
+    files = plan_files(entries, comfyui_path, fetch_remote_size=fetch_remote_size, verify=verify)
+    pending = [item for item in files if not item['is_installed']]
+    total_download_size = sum(item['download_size'] or 0 for item in pending)
+    free_space = get_free_disk_space(comfyui_path)
+
+    estimates = [item['estimated_seconds'] for item in pending if item['download_size']]
+    if not estimates:
+        estimated_seconds = 0 if not pending else None
+    elif all(e is not None for e in estimates):
+        estimated_seconds = round(sum(estimates), 1)
+    else:
+        estimated_seconds = None
+
+    return {
+        'comfyui_path': comfyui_path,
+        'files': files,
+        'pending_count': len(pending),
+        'unknown_size_count': sum(1 for item in pending if item['download_size'] is None),
+        'total_download_size': total_download_size,
+        'free_space': free_space,
+        'has_space': total_download_size <= free_space,
+        # Sequential estimate; parallel downloads to different hosts finish sooner.
+        'estimated_seconds': estimated_seconds,
+    }
+
+def plan_entries(entries, comfyui_path, fetch_remote_size=True, verify=None):
+    """
+    dedupe_entries and build_plan in one step. The plan gets 'conflicts':
+    {'dest', 'kept', 'dropped'} for each dest claimed with different URLs
+    (the first one wins).
+    """
+    unique, conflicts = dedupe_entries(entries)
+    plan = build_plan(unique, comfyui_path, fetch_remote_size=fetch_remote_size, verify=verify)
+    plan['conflicts'] = [
+        {'dest': kept['dest'], 'kept': kept.get('source'), 'dropped': dropped.get('source')}
+        for kept, dropped in conflicts
+    ]
+    return plan
+
+PLAN_FILE_KEYS = ('source', 'url', 'dest', 'path', 'is_installed', 'status', 'verify_note', 'local_size', 'remote_size', 'download_size', 'sha256', 'mirrors', 'mirror', 'priority', 'estimated_seconds')
+
+def plan_to_json(plan):
+    """
+    Serialize a plan with a stable set of keys per file. Free space that
+    could not be determined (infinite) becomes null.
+    """
+    data = dict(plan)
+    if data.get('free_space') == float('inf'):
+        data['free_space'] = None
+    data['files'] = [{key: item.get(key) for key in PLAN_FILE_KEYS} for item in plan['files']]
+    return json.dumps(data, indent=2)
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
+def print_plan_summary(plan):
+    """Print the totals of a plan (the per-file tree is printed by the caller)."""
+    print(f"Files to download: {plan['pending_count']} of {len(plan['files'])}")
+    if plan['unknown_size_count']:
+        print(f"Files with unknown size: {plan['unknown_size_count']}")
+    print(f"Total download size: {format_size(plan['total_download_size'])}")
+    print(f"Free disk space: {format_size(plan['free_space'])}")
+    if not plan['has_space']:
+        print("Warning: Not enough disk space!")
+    print(f"Estimated time: {format_duration(plan['estimated_seconds'])}")
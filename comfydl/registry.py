@@ -1,11 +1,17 @@
 import os
 import json
-import requests
+import time
+import yaml
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from .config import get_registries, add_registry, get_registry_path, get_config_value, remove_registry
+from .config import get_registries, add_registry, get_registry_path, get_registry_meta_path, get_config_value, remove_registry, atomic_write, get_comfydl_dir
+from .utils import get_http_session, format_size
+from .events import emit
+from .retry import get_retry_policy, METADATA_ATTEMPTS
 
 DEFAULT_REGISTRY_URL = "https://shinchven.github.io/comfydl-sources/sources.json"
 DEFAULT_REGISTRY_NAME = "default"
+MAX_REGISTRY_WORKERS = 8
 
 def init_registries():
     """Ensure default registry exists in config."""
@@ -18,11 +24,64 @@ def init_registries():
         return True
     return False
 
+def _read_registry_meta(name):
+    path = get_registry_meta_path(name)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def fetch_registry(name, url):
+    """
+    Fetch one registry, sending If-None-Match / If-Modified-Since from the
+    previous fetch so an unchanged registry costs a 304.
+    Returns a dict with 'name', 'status' ('updated', 'unchanged' or
+    'failed'), 'elapsed', 'size', 'retries' and 'error'.
+    """
+    start = time.time()
+    result = {'name': name, 'url': url, 'status': 'failed', 'elapsed': 0, 'size': 0, 'retries': 0, 'error': None}
+    dest_path = get_registry_path(name)
+    meta = _read_registry_meta(name)
+
+    headers = {}
+    if dest_path.exists() and meta.get('url') == url:
+        if meta.get('etag'):
+            headers["If-None-Match"] = meta['etag']
+        if meta.get('last_modified'):
+            headers["If-Modified-Since"] = meta['last_modified']
+
+    try:
+        session = get_http_session()
+        response, result['retries'] = get_retry_policy(METADATA_ATTEMPTS).request(lambda: session.get(url, headers=headers, timeout=10))
+        if response.status_code == 304:
+            result['status'] = 'unchanged'
+        else:
+            response.raise_for_status()
+            # Validate before replacing the local copy, but store the bytes
+            # as served instead of re-serializing them.
+            response.json()
+            atomic_write(dest_path, response.content)
+            result['status'] = 'updated'
+            result['size'] = len(response.content)
+            meta = {
+                'url': url,
+                'etag': response.headers.get("ETag"),
+                'last_modified': response.headers.get("Last-Modified"),
+            }
+            atomic_write(get_registry_meta_path(name), json.dumps(meta))
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed'] = time.time() - start
+    return result
+
 def update_registry(name=None):
     """
     Update local cache of registries.
     If name is provided, update only that registry.
-    Otherwise update all.
+    Otherwise update all, fetching them concurrently.
     """
     init_registries()
     registries = get_registries()
@@ -36,77 +95,168 @@ def update_registry(name=None):
             return False
     else:
         to_update = list(registries.items())
-        
-    success = True
+
+    if not to_update:
+        return True
+
     for reg_name, url in to_update:
         print(f"Updating registry '{reg_name}' from {url}...")
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Validate structure? For now we assume it's a list or dict of sources
-            # actually the format is likely { "source_name": { ... }, ... } or similar
-            # Wait, the user said "the sources.json file fill be downloaded to local as <registry_name>.json"
-            # It seems the content of sources.json IS the registry content.
-            
-            dest_path = get_registry_path(reg_name)
-            with open(dest_path, 'w') as f:
-                json.dump(data, f, indent=2)
-            print(f"  ✓ Updated {reg_name}")
-        except Exception as e:
-            print(f"  ✗ Failed to update {reg_name}: {e}")
-            success = False
-            
+
+    success = True
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=min(MAX_REGISTRY_WORKERS, len(to_update))) as executor:
+        futures = [executor.submit(fetch_registry, reg_name, url) for reg_name, url in to_update]
+        for future in as_completed(futures):
+            result = future.result()
+            emit("registry_update", registry=result['name'], url=result['url'],
+                 bytes=result.get('size'), latency=round(result['elapsed'], 3),
+                 retries=result['retries'], outcome=result['status'], error=result.get('error'))
+            timing = f"{result['elapsed'] * 1000:.0f} ms"
+            if result['status'] == 'updated':
+                print(f"  ✓ Updated {result['name']} ({format_size(result['size'])}, {timing})")
+            elif result['status'] == 'unchanged':
+                print(f"  ✓ {result['name']} is up to date ({timing})")
+            else:
+                print(f"  ✗ Failed to update {result['name']}: {result['error']} ({timing})")
+                success = False
+
+    if len(to_update) > 1:
+        print(f"Updated {len(to_update)} registries in {time.time() - start:.2f}s.")
     return success
 
-def load_registry_sources():
+def _registry_index_path():
+    return get_comfydl_dir() / "registries" / ".index.json"
+
+def _registry_signature(registries):
     """
-    Load all sources from all local registry files.
-    Returns a dict {source_name: {config...}, ...}
-    Later registries overwrite earlier ones? Or maybe we prefix? 
-    For now, let's merge, but maybe warn on collision?
-    Actually, let's just merge.
+    Identify the current state of the local registry files by name, path,
+    mtime and size, in config order.
     """
-    registries = get_registries()
-    all_sources = {}
-    
-    # Order matters? Maybe sorted by name?
+    signature = []
     for name in registries:
         path = get_registry_path(name)
-        if not path.exists():
+        try:
+            st = path.stat()
+        except FileNotFoundError:
             continue
+        signature.append([name, str(path), st.st_mtime_ns, st.st_size])
+    return signature
+
+def _read_registry_file(name, path):
+    """Return the sources dict of one registry file, or None."""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
             
-        try:
-            with open(path, 'r') as f:
-                data = json.load(f)
-                
-            # data structure: The user said "sources.json" contains the sources. 
-            # If it's the repo linked (comfydl-sources), let's assume it's a dict where keys are source names.
-            if isinstance(data, dict):
-                # Check if wrapped in 'sources' key
-                sources_dict = data.get('sources', data)
-                
-                # If sources_dict is not a dict (e.g. string version), skip
-                if not isinstance(sources_dict, dict):
-                    print(f"Warning: Invalid registry format for '{name}'. Expected dict of sources.")
-                    continue
-
-                for source_name, source_config in sources_dict.items():
-                    all_sources[source_name] = source_config
-            elif isinstance(data, list):
-                # What if it is a list? 
-                pass
-                
-        except Exception as e:
-            print(f"Warning: Failed to load registry '{name}': {e}")
+        # data structure: The user said "sources.json" contains the sources. 
+        # If it's the repo linked (comfydl-sources), let's assume it's a dict where keys are source names.
+        if isinstance(data, dict):
+            # Check if wrapped in 'sources' key
+            sources_dict = data.get('sources', data)
             
-    return all_sources
+            # If sources_dict is not a dict (e.g. string version), skip
+            if not isinstance(sources_dict, dict):
+                print(f"Warning: Invalid registry format for '{name}'. Expected dict of sources.")
+                return None
+            return sources_dict
+        elif isinstance(data, list):
+            # What if it is a list? 
+            pass
+            
+    except Exception as e:
+        print(f"Warning: Failed to load registry '{name}': {e}")
+    return None
+
+_source_file_cache = {}
+
+def load_source_file(path):
+    """
+    Parse a local YAML source file, reusing the parsed result while the
+    file's mtime and size are unchanged.
+    """
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _source_file_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    with open(path, 'r') as f:
+        data = yaml.safe_load(f)
+    _source_file_cache[path] = (signature, data)
+    return data
+
+def source_downloads(config):
+    """Return the downloads list of a source config (list or dict form)."""
+    if isinstance(config, list):
+        return config
+    if isinstance(config, dict):
+        return config.get('downloads', []) or []
+    return []
+
+def _build_registry_index(signature):
+    all_sources = {}
+    # Later registries overwrite earlier ones
+    for name, path, _, _ in signature:
+        sources_dict = _read_registry_file(name, path)
+        if sources_dict:
+            all_sources.update(sources_dict)
+
+    urls = {}
+    for source_name, config in all_sources.items():
+        for item in source_downloads(config):
+            if not isinstance(item, dict):
+                continue
+            url = item.get('url')
+            dest = item.get('dest')
+            if url and dest:
+                dests = urls.setdefault(url, [])
+                if dest not in dests:
+                    dests.append(dest)
+    return {'signature': signature, 'sources': all_sources, 'urls': urls}
+
+_registry_index = None
+
+def get_registry_index():
+    """
+    Return the merged registry index {'signature', 'sources', 'urls'}.
+    'sources' maps source name to config and 'urls' maps download URL to
+    the dest paths that use it (the registry half of urlindex). The index is built once per process and
+    persisted next to the registry files; either copy is reused as long
+    as no registry file changed (by mtime and size).
+    """
+    global _registry_index
+    signature = _registry_signature(get_registries())
+    if _registry_index is not None and _registry_index['signature'] == signature:
+        return _registry_index
+
+    index_path = _registry_index_path()
+    if index_path.exists():
+        try:
+            with open(index_path, 'r') as f:
+                persisted = json.load(f)
+            if persisted.get('signature') == signature:
+                _registry_index = persisted
+                return _registry_index
+        except Exception:
+            pass
+
+    _registry_index = _build_registry_index(signature)
+    try:
+        atomic_write(index_path, json.dumps(_registry_index, separators=(",", ":")))
+    except Exception as e:
+        print(f"Warning: Could not save registry index: {e}")
+    return _registry_index
+
+def load_registry_sources():
+    """
+    Load all sources from all local registry files.
+    Returns a dict {source_name: {config...}, ...}; later registries
+    overwrite earlier ones. The dict is shared, do not modify it.
+    """
+    return get_registry_index()['sources']
 
 def resolve_registry_source(source_name):
     """
     Look for a source in the loaded registries.
     Returns config dict if found, else None.
     """
-    sources = load_registry_sources()
-    return sources.get(source_name)
+    return get_registry_index()['sources'].get(source_name)
@@ -0,0 +1,122 @@
+import email.utils
+import random
+import re
+import time
+import requests
+from .config import get_config_value
+
+DEFAULT_MAX_ATTEMPTS = 5
+# Metadata lookups give up sooner; a stale cache entry usually serves instead
+METADATA_ATTEMPTS = 3
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+# Longest Retry-After we are willing to wait
+MAX_RETRY_AFTER = 120
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    ConnectionError,
+    TimeoutError,
+)
+# wget: 4 network failure, 8 server error response
+WGET_RETRY_CODES = (4, 8)
+# aria2c: 1 unknown (mostly network), 2 timeout, 6 network problem,
+# 19 name resolution, 22 unexpected HTTP response, 29 server overloaded
+ARIA2_RETRY_CODES = (1, 2, 6, 19, 22, 29)
+_WGET_STATUS_RE = re.compile(r'ERROR (\d{3})')
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delay or HTTP date), or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+def is_transient(error):
+    """True for errors worth retrying: connection problems, timeouts, 429 and 5xx."""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRY_STATUSES
+    return isinstance(error, TRANSIENT_ERRORS)
+
+def is_transient_exit(downloader, returncode, output=None):
+    """
+    True if an aria2c or wget exit status means a retry may succeed.
+    output (the engine's console output) tells wget's 404 from a 503; a
+    server error without a status to inspect is not retried.
+    """
+    if downloader == "aria2c":
+        return returncode in ARIA2_RETRY_CODES
+    if downloader == "wget":
+        if returncode == 8:
+            statuses = _WGET_STATUS_RE.findall(output or "")
+            return bool(statuses) and int(statuses[-1]) in RETRY_STATUSES
+        return returncode in WGET_RETRY_CODES
+    return False
+
+class RetryPolicy:
+    """
+    How often and how long to retry: up to max_attempts tries, waiting
+    with exponential backoff and jitter in between, or as long as the
+    server's Retry-After asks.
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, response=None):
+        """Seconds to wait after failed attempt number attempt (from 0)."""
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return min(retry_after, MAX_RETRY_AFTER)
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        # "Equal jitter": at least half the backoff, so clients that failed
+        # together spread out without retrying immediately.
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def request(self, send):
+        """
+        Call send() (returning a requests response) until the response is
+        not a retryable status or attempts run out. Transient exceptions
+        are retried too; others, and the last one, propagate.
+        Returns (response, retries).
+        """
+        for attempt in range(self.max_attempts):
+            last = attempt == self.max_attempts - 1
+            try:
+                response = send()
+            except Exception as e:
+                if last or not is_transient(e):
+                    raise
+                time.sleep(self.delay(attempt))
+                continue
+            if last or response.status_code not in RETRY_STATUSES:
+                return response, attempt
+            delay = self.delay(attempt, response)
+            response.close()
+            time.sleep(delay)
+
+def get_retry_policy(max_attempts=None):
+    """
+    The retry policy for transfers (RETRY_ATTEMPTS, default 5), or with
+    max_attempts for calls that should give up sooner.
+    """
+    if max_attempts is not None:
+        return RetryPolicy(max_attempts=max_attempts)
+    value = get_config_value("RETRY_ATTEMPTS")
+    try:
+        attempts = int(value) if value is not None else DEFAULT_MAX_ATTEMPTS
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid RETRY_ATTEMPTS '{value}', using {DEFAULT_MAX_ATTEMPTS}.")
+        attempts = DEFAULT_MAX_ATTEMPTS
+    return RetryPolicy(max_attempts=attempts)
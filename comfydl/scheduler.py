@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+from tqdm import tqdm
+from .config import get_config_value
+from .utils import download_file
+from .partials import part_path, clean_stale_partials
+
+DEFAULT_MAX_CONCURRENT = 4
+# Per-host limits applied on top of the global limit. Civitai throttles
+# parallel downloads per token much more aggressively than Hugging Face.
+DEFAULT_HOST_LIMITS = {
+    "huggingface.co": 4,
+    "civitai.com": 2,
+}
+
+def parse_host_limits(value):
+    """
+    Parse per-host limits from config.
+    Accepts a dict or a string like "huggingface.co=4,civitai.com=2".
+    """
+    limits = {}
+    if not value:
+        return limits
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = []
+        for part in str(value).split(","):
+            if "=" in part:
+                host, limit = part.split("=", 1)
+                items.append((host, limit))
+    for host, limit in items:
+        try:
+            limits[host.strip().lower()] = max(1, int(limit))
+        except (TypeError, ValueError):
+            print(f"Warning: Invalid concurrency limit for host '{host}': {limit}")
+    return limits
+
+def get_max_concurrent():
+    value = get_config_value("MAX_CONCURRENT_DOWNLOADS")
+    try:
+        return max(1, int(value)) if value else DEFAULT_MAX_CONCURRENT
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid MAX_CONCURRENT_DOWNLOADS '{value}', using {DEFAULT_MAX_CONCURRENT}.")
+        return DEFAULT_MAX_CONCURRENT
+
+def get_host_limits():
+    limits = dict(DEFAULT_HOST_LIMITS)
+    limits.update(parse_host_limits(get_config_value("HOST_CONCURRENCY")))
+    return limits
+
+def host_key(url, host_limits):
+    """
+    Return the host_limits key governing url, or the bare hostname if
+    no configured limit matches.
+    """
+    host = (urlparse(url).hostname or "").lower()
+    for key in host_limits:
+        if host == key or host.endswith("." + key):
+            return key
+    return host
+
+def bytes_on_disk(path):
+    """
+    Bytes actually written to path. Downloaders may create sparse files, so
+    allocated blocks are a better progress measure than st_size.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0
+    blocks = getattr(st, "st_blocks", None)
+    if blocks is None:
+        return st.st_size
+    return min(st.st_size, blocks * 512)
+
+def expected_size(item):
+    """Expected bytes of a download item or plan file, if known."""
+    return item.get('size') or item.get('remote_size')
+
+def run_item(item, downloader, quiet):
+    """
+    Download one item, setting its 'retries' count and 'error' message
+    (None on success). Returns True on success.
+    """
+    report = {}
+    try:
+        ok = download_file(item['url'], item['path'], downloader, quiet=quiet, sha256=item.get('sha256'), mirrors=item.get('mirrors'), report=report)
+    except Exception as e:
+        ok = False
+        report['error'] = f"{type(e).__name__}: {e}"
+    item['retries'] = report.get('retries', 0)
+    item['error'] = None if ok else (report.get('error') or "download failed")
+    return ok
+
+class DownloadScheduler:
+    """
+    Run download items in parallel, bounded by a global limit on files in
+    flight and by per-host limits.
+
+    Each item is a dict with 'url', 'path' (absolute destination) and
+    optionally 'size' (expected bytes, used for progress reporting; plan
+    files' 'remote_size' works too), 'sha256' (verified while
+    downloading), 'mirrors' (alternative URLs) and 'priority' (higher
+    starts first, default 0).
+
+    Items are only handed to a worker once their host has capacity, so
+    a busy host never ties up workers that could serve other hosts.
+
+    Nothing is printed unless show_progress is set. on_progress(item,
+    done_bytes, total_bytes) is called about twice a second for each
+    download in flight, and on_file_done(item, ok, retries) when one
+    finishes; both run on scheduler threads. quiet (default: when more
+    than one download runs at once) captures the engines' own output.
+    """
+
+    def __init__(self, downloader, max_concurrent=None, host_limits=None, show_progress=True, quiet=None, on_progress=None, on_file_done=None):
+        self.downloader = downloader
+        self.max_concurrent = max_concurrent or get_max_concurrent()
+        self.host_limits = host_limits if host_limits is not None else get_host_limits()
+        self.show_progress = show_progress
+        self.quiet = quiet
+        self.on_progress = on_progress
+        self.on_file_done = on_file_done
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def _host_limit(self, key):
+        return self.host_limits.get(key, self.max_concurrent)
+
+    def _take_ready(self, pending, host_active):
+        """Remove and return the first pending item whose host has a free slot."""
+        for i, item in enumerate(pending):
+            key = host_key(item['url'], self.host_limits)
+            if host_active.get(key, 0) < self._host_limit(key):
+                return pending.pop(i)
+        return None
+
+    def _run_item(self, item, quiet):
+        return run_item(item, self.downloader, quiet)
+
+    def run(self, items):
+        """
+        Download all items. Returns a dict with 'succeeded' and 'failed'
+        lists of items, 'retried' listing the items that needed retries
+        and the elapsed 'seconds'. Each item gets 'ok', a 'retries' count
+        and an 'error' message (None on success).
+        """
+        results = {'succeeded': [], 'failed': [], 'retried': [], 'seconds': 0}
+        if not items:
+            return results
+        # Stable sort: equal priorities keep their order.
+        pending = sorted(items, key=lambda item: -(item.get('priority') or 0))
+        items = list(pending)
+
+        workers = min(self.max_concurrent, len(items))
+        # A single download keeps the downloader's own console output.
+        quiet = self.quiet if self.quiet is not None else workers > 1
+        show_progress = self.show_progress and quiet
+
+        # Bars exist only for downloads in flight; each takes a free row.
+        bars = {}
+        rows = {}
+        free_rows = list(range(1, workers + 1))
+        total_bar = None
+        if show_progress:
+            total_bytes = sum(expected_size(item) or 0 for item in items)
+            total_bar = tqdm(total=total_bytes or None, unit="B", unit_scale=True, unit_divisor=1024,
+                             desc=f"Total (0/{len(items)})", position=0, leave=True)
+
+        stop = threading.Event()
+        monitor = None
+        if show_progress or self.on_progress is not None:
+            monitor = threading.Thread(target=self._monitor, args=(items, bars, total_bar, stop), daemon=True)
+            monitor.start()
+
+        start = time.time()
+        running = {}
+        host_active = {}
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                while pending or running:
+                    while len(running) < workers:
+                        item = self._take_ready(pending, host_active)
+                        if item is None:
+                            break
+                        key = host_key(item['url'], self.host_limits)
+                        host_active[key] = host_active.get(key, 0) + 1
+                        with self._lock:
+                            self._in_flight[item['path']] = item
+                            if show_progress:
+                                row = free_rows.pop(0)
+                                rows[item['path']] = row
+                                bars[item['path']] = tqdm(total=expected_size(item) or None, unit="B", unit_scale=True,
+                                                          unit_divisor=1024, desc=os.path.basename(item['path'])[:40],
+                                                          position=row, leave=False)
+                        running[executor.submit(self._run_item, item, quiet)] = (item, key)
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        item, key = running.pop(future)
+                        host_active[key] -= 1
+                        ok = future.result()
+                        item['ok'] = ok
+                        results['succeeded' if ok else 'failed'].append(item)
+                        if item['retries']:
+                            results['retried'].append(item)
+                        with self._lock:
+                            self._in_flight.pop(item['path'], None)
+                            bar = bars.pop(item['path'], None)
+                            if bar is not None:
+                                bar.close()
+                                free_rows.append(rows.pop(item['path']))
+                        if total_bar is not None:
+                            finished = len(results['succeeded']) + len(results['failed'])
+                            total_bar.set_description(f"Total ({finished}/{len(items)})")
+                            tqdm.write(f"  {'✓' if ok else '✗'} {os.path.basename(item['path'])}")
+                        if self.on_file_done is not None:
+                            self.on_file_done(item, ok, item['retries'])
+        finally:
+            stop.set()
+            if monitor is not None:
+                monitor.join()
+                if show_progress:
+                    self._update_bars(items, bars, total_bar)
+            for bar in bars.values():
+                bar.close()
+            if total_bar is not None:
+                total_bar.close()
+
+        results['seconds'] = round(time.time() - start, 3)
+        return results
+
+    def _update_bars(self, items, bars, total_bar):
+        total = 0
+        progress = []
+        with self._lock:
+            for item in items:
+                # Downloads are written to a .part file and renamed when done
+                current = bytes_on_disk(part_path(item['path'])) or bytes_on_disk(item['path'])
+                total += current
+                bar = bars.get(item['path'])
+                if bar is not None:
+                    bar.n = current
+                    bar.refresh()
+                if item['path'] in self._in_flight:
+                    progress.append((item, current))
+        if total_bar is not None:
+            total_bar.n = total
+            total_bar.refresh()
+        if self.on_progress is not None:
+            for item, current in progress:
+                self.on_progress(item, current, expected_size(item))
+
+    def _monitor(self, items, bars, total_bar, stop):
+        while not stop.wait(0.5):
+            self._update_bars(items, bars, total_bar)
+
+def print_summary(results, count):
+    """Print the outcome of DownloadScheduler.run for count items."""
+    print(f"\nDownloaded {len(results['succeeded'])}/{count} files in {results['seconds']:.1f}s.")
+    if results['retried']:
+        print("Needed retries:")
+        for item in results['retried']:
+            outcome = "failed" if item in results['failed'] else "ok"
+            print(f"  - {os.path.basename(item['path'])} ({item['retries']} {'retry' if item['retries'] == 1 else 'retries'}, {outcome})")
+    if results['failed']:
+        print("Failed:")
+        for item in results['failed']:
+            print(f"  - {os.path.basename(item['path'])}: {item['error']}")
+
+def download_items(items, downloader, max_concurrent=None):
+    """
+    Download items with the configured limits, showing progress and a
+    summary. Crash leftovers in the items' folders are cleaned up first
+    (see partials.clean_stale_partials). Returns the results dict from
+    DownloadScheduler.run.
+    """
+    paths = {item['path'] for item in items}
+    others = [p for p in clean_stale_partials(os.path.dirname(path) for path in paths) if p['path'] not in paths]
+    if others:
+        print(f"Found {len(others)} other interrupted download(s) next to these files; "
+              "run 'comfydl recover' to resume or remove them.")
+    scheduler = DownloadScheduler(downloader, max_concurrent=max_concurrent)
+    results = scheduler.run(items)
+    if items:
+        print_summary(results, len(items))
+    return results
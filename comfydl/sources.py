@@ -0,0 +1,237 @@
+import os
+from pathlib import Path
+from .config import get_config_value
+from .registry import init_registries, load_registry_sources, resolve_registry_source, load_source_file, source_downloads
+from .urlindex import find_url_folders
+from .utils import stat_paths
+
+def resolve_model_source(source_name):
+    # Check if exact path
+    if os.path.exists(source_name):
+        return source_name
+
+    # Check custom model sources path
+    custom_sources_path = get_config_value("MODEL_SOURCES_PATH")
+    if custom_sources_path and os.path.exists(custom_sources_path):
+        custom_sources = Path(custom_sources_path)
+        candidate = custom_sources / f"{source_name}.yaml"
+        if candidate.exists():
+            return str(candidate)
+
+        candidate = custom_sources / source_name
+        if candidate.exists():
+            return str(candidate)
+
+    # Maybe package provided sources? For now we assume local execution context
+    return None
+
+def get_source_config(source_name):
+    """
+    Resolve a source name to a configuration dictionary.
+    Returns (config_dict, source_origin_description)
+    """
+    # 1. Check local file paths (legacy/development override)
+    path = resolve_model_source(source_name)
+    if path:
+        try:
+            return load_source_file(path), path
+        except Exception as e:
+            print(f"Error loading local source {path}: {e}")
+            return None, None
+
+    # 2. Check registries
+    init_registries()
+    config = resolve_registry_source(source_name)
+    if config:
+        return config, f"registry:{source_name}"
+        
+    return None, None
+
+def get_available_sources():
+    sources = set()
+    
+    # Check custom model sources path
+    custom_sources_path = get_config_value("MODEL_SOURCES_PATH")
+    if custom_sources_path and os.path.exists(custom_sources_path):
+        for f in Path(custom_sources_path).glob("*.yaml"):
+            sources.add(f.stem)
+
+    # Add registry sources
+    init_registries()
+    registry_sources = load_registry_sources()
+    sources.update(registry_sources.keys())
+
+    return sorted(list(sources))
+
+def _build_items_status(downloads, comfyui_path, stats):
+    items_status = []
+    for item in downloads:
+        url = item.get('url')
+        dest = item.get('dest')
+        if not dest:
+            continue
+        
+        info = stats[os.path.join(comfyui_path, dest)]
+        is_installed = info['is_file'] and not info['pending']
+        
+        local_size = info['size'] if is_installed else 0
+            
+        items_status.append({
+            'dest': dest,
+            'path': os.path.join(comfyui_path, dest),
+            'is_installed': is_installed,
+            'status': "installed" if is_installed else "missing",
+            'local_size': local_size,
+            'remote_size': None,
+            'url': url,
+            'sha256': item.get('sha256')
+        })
+    return items_status
+
+def get_batch_downloads_status(sources_downloads, comfyui_path):
+    """
+    Check the status of many sources in one filesystem pass.
+    sources_downloads maps source name to its downloads list. All dest
+    paths are collected, deduplicated and stat-ed once (one scandir per
+    directory), then fanned back out per source.
+    Returns {source_name: items_status}.
+    """
+    paths = []
+    for downloads in sources_downloads.values():
+        paths.extend(os.path.join(comfyui_path, item['dest']) for item in downloads if item.get('dest'))
+    stats = stat_paths(paths)
+    return {
+        name: _build_items_status(downloads, comfyui_path, stats)
+        for name, downloads in sources_downloads.items()
+    }
+
+def installed_source_names(comfyui_path):
+    """Names of the available sources with at least one file installed in comfyui_path."""
+    sources_downloads = {}
+    for source_name in get_available_sources():
+        config_data, _ = get_source_config(source_name)
+        if config_data:
+            sources_downloads[source_name] = [item for item in source_downloads(config_data) if isinstance(item, dict)]
+    statuses = get_batch_downloads_status(sources_downloads, comfyui_path)
+    return [name for name, items in statuses.items() if any(item['is_installed'] for item in items)]
+
+def source_entries(source_name, priority=None):
+    """
+    Return (entries, origin) for a model source, each entry tagged with
+    the source name, or (None, None) if the source cannot be loaded.
+    Entries without their own 'priority' get priority, or the source's.
+    """
+    config_data, origin = get_source_config(source_name)
+    if not config_data:
+        return None, None
+    if priority is None and isinstance(config_data, dict):
+        priority = config_data.get('priority')
+    entries = []
+    for item in source_downloads(config_data):
+        if isinstance(item, dict):
+            entry = dict(item, source=source_name)
+            if entry.get('priority') is None:
+                entry['priority'] = priority
+            entries.append(entry)
+    return entries, origin
+
+def installed_files(downloads, comfyui_path):
+    """
+    Return (path, size) for each download of a source that exists as a
+    file under comfyui_path, and the paths that exist as directories.
+    """
+    files = []
+    directories = []
+    for item in downloads:
+        dest = item.get('dest') if isinstance(item, dict) else None
+        if not dest:
+            continue
+        full_path = os.path.join(comfyui_path, dest)
+        if os.path.isfile(full_path):
+            files.append((full_path, os.path.getsize(full_path)))
+        elif os.path.isdir(full_path):
+            directories.append(full_path)
+    return files, directories
+
+def remove_files(files):
+    """
+    Delete installed files, given as (path, size) pairs. Returns a dict
+    with the 'removed' paths, the 'bytes' they used and 'errors'
+    ({path: message}) for files that could not be deleted.
+    """
+    result = {'removed': [], 'bytes': 0, 'errors': {}}
+    for path, size in files:
+        if path in result['removed'] or path in result['errors']:
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            result['errors'][path] = str(e)
+            continue
+        result['removed'].append(path)
+        result['bytes'] += size
+    return result
+
+def url_filename(url):
+    """File name a direct URL download is saved as ('' if it has none)."""
+    from urllib.parse import urlparse, unquote
+    return unquote(os.path.basename(urlparse(url).path))
+
+def url_entry(url, dest=None, directory=None, sha256=None, mirrors=None, priority=None):
+    """
+    Plan entry for a direct URL. Without dest the file goes to directory
+    (relative to the ComfyUI root) or, failing that, to the folder known
+    sources use for the same URL. Raises ValueError if neither is known.
+    """
+    if not dest:
+        filename = url_filename(url)
+        if not filename:
+            raise ValueError(f"Could not determine filename from URL {url}")
+        directory = directory or search_url_in_sources(url)
+        if not directory:
+            raise ValueError(f"No known destination for {url}; give a dest or directory")
+        dest = os.path.join(directory, filename)
+    return {'source': url, 'url': url, 'dest': dest, 'sha256': sha256, 'mirrors': mirrors, 'priority': priority}
+
+def collect_entries(sources=(), urls=()):
+    """
+    Resolve sources (names, or dicts with 'name' and 'priority') and urls
+    (strings, or dicts with 'url' and optional 'dest', 'dir', 'sha256',
+    'mirrors', 'priority') to plan entries.
+    Returns (entries, errors): errors holds a LookupError or ValueError
+    for each source or URL that could not be resolved.
+    """
+    entries = []
+    errors = []
+    for source in sources:
+        if isinstance(source, dict):
+            name, priority = str(source.get('name')), source.get('priority')
+        else:
+            name, priority = str(source), None
+        found, _ = source_entries(name, priority=priority)
+        if found is None:
+            errors.append(LookupError(f"Could not load configuration for source '{name}'"))
+        else:
+            entries.extend(found)
+
+    for item in urls:
+        if isinstance(item, str):
+            item = {'url': item}
+        if not isinstance(item, dict) or not item.get('url'):
+            errors.append(ValueError(f"Invalid URL entry: {item}"))
+            continue
+        try:
+            entries.append(url_entry(item['url'], dest=item.get('dest'), directory=item.get('dir'), sha256=item.get('sha256'),
+                                     mirrors=item.get('mirrors'), priority=item.get('priority')))
+        except ValueError as e:
+            errors.append(e)
+    return entries, errors
+
+def search_url_in_sources(url):
+    """
+    Search for a URL in all available model sources to find a suggested destination.
+    Equivalent URLs (blob vs resolve, tokens, Civitai version IDs) match too.
+    Returns the folder path (dirname of dest) if found, else None.
+    """
+    folders = find_url_folders(url)
+    return folders[0] if folders else None
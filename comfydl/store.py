@@ -0,0 +1,371 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from .config import get_config_value, atomic_write
+from .integrity import normalize_sha256
+from .partials import is_partial_name
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LINK_MODES = ("hardlink", "reflink", "symlink", "copy")
+DEFAULT_LINK_MODE = "auto"
+
+# Linux FICLONE ioctl: share extents between two files on btrfs/xfs/etc.
+FICLONE = 0x40049409
+
+def blob_key(url, sha256=None):
+    """
+    Content key for a download: its SHA256 when known, otherwise a hash of
+    the URL (tokens are added later, so the plain URL is stable).
+    """
+    digest = normalize_sha256(sha256)
+    if digest:
+        return digest
+    return URL_KEY_PREFIX + hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+URL_KEY_PREFIX = "url-"
+
+def blob_shard(key):
+    """
+    Two-character shard folder of a blob key, taken from its digest so
+    URL-derived keys spread out like content hashes do.
+    """
+    return key[len(URL_KEY_PREFIX):][:2] if key.startswith(URL_KEY_PREFIX) else key[:2]
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dst)
+            raise
+
+@contextmanager
+def _file_lock(path):
+    """
+    Hold an advisory lock on the lock file path, so other processes
+    sharing the store wait (a no-op where fcntl is unavailable).
+    """
+    lock_file = None
+    if fcntl is not None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            lock_file = open(path, 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except OSError:
+            if lock_file is not None:
+                lock_file.close()
+            lock_file = None
+    try:
+        yield
+    finally:
+        if lock_file is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+def _link(src, dst, mode):
+    if mode == "hardlink":
+        os.link(src, dst)
+    elif mode == "reflink":
+        _reflink(src, dst)
+    elif mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+    elif mode == "copy":
+        shutil.copy2(src, dst)
+    else:
+        raise ValueError(f"Unknown link mode '{mode}'")
+
+def _ref_record(path, mode):
+    """
+    Index record of a materialized file: its link mode plus, for copies
+    and reflinks, the identity of the file written, so gc() can tell it
+    apart from a different file later put at the same path.
+    """
+    record = {'mode': mode}
+    if mode in ("reflink", "copy"):
+        st = os.stat(path)
+        record.update(dev=st.st_dev, ino=st.st_ino, size=st.st_size, mtime_ns=st.st_mtime_ns)
+    return record
+
+class ModelStore:
+    """
+    A content-addressed blob store shared by several ComfyUI roots.
+
+    Blobs live at <root>/blobs/<shard>/<key>/<filename> (see blob_shard) and are
+    materialized into each root's dest by hardlink, reflink or symlink.
+    <root>/index.json records which paths reference each blob (and, for
+    copies and reflinks, which file was written there) so gc() can
+    remove blobs nothing points at any more.
+
+    Several processes may share a store: each blob key and the index are
+    guarded by lock files under <root>/locks, taken in that order.
+    """
+
+    def __init__(self, root, link_mode=DEFAULT_LINK_MODE):
+        self.root = Path(root).expanduser()
+        self.link_mode = link_mode
+        self.index_path = self.root / "index.json"
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_dir(self, key):
+        return self.root / "blobs" / blob_shard(key) / key
+
+    def _key_dirs(self, key):
+        """
+        Where a key's blobs may be. Stores written before URL keys were
+        sharded by digest keep them under blobs/ur/; links may point
+        there, so they stay put.
+        """
+        return list(dict.fromkeys([self._key_dir(key), self.root / "blobs" / key[:2] / key]))
+
+    def blob_path(self, key, filename):
+        return self._key_dir(key) / filename
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not read model store index: {e}")
+            return {}
+
+    def _save_index(self, index):
+        atomic_write(self.index_path, json.dumps(index, indent=2))
+
+    @contextmanager
+    def _locked_key(self, key):
+        """Exclusive access to one blob key, across threads and processes."""
+        with self._lock:
+            lock = self._key_locks.setdefault(key, threading.Lock())
+        with lock, _file_lock(self.root / "locks" / f"{key}.lock"):
+            yield
+
+    @contextmanager
+    def _locked_index(self):
+        """Exclusive access to index.json for a read-modify-write."""
+        with self._index_lock, _file_lock(self.root / "locks" / "index.lock"):
+            yield
+
+    def _find_blob(self, key):
+        from .utils import has_pending_download
+        for key_dir in self._key_dirs(key):
+            if not key_dir.is_dir():
+                continue
+            for entry in key_dir.iterdir():
+                if entry.is_file() and not has_pending_download(str(entry)) and entry.suffix not in (".aria2", ".comfydl", ".corrupt") and not is_partial_name(entry.name):
+                    return entry
+        return None
+
+    def materialize(self, blob, dest):
+        """Link blob into dest using the configured mode. Returns the mode used."""
+        modes = LINK_MODES if self.link_mode == "auto" else (self.link_mode,)
+        last_error = None
+        for mode in modes:
+            try:
+                _link(str(blob), dest, mode)
+                return mode
+            except (OSError, ImportError) as e:
+                # EXDEV (different filesystem), EPERM or no reflink support
+                last_error = e
+                if self.link_mode != "auto":
+                    break
+        raise OSError(getattr(last_error, "errno", errno.EIO), f"Could not link {blob} to {dest}: {last_error}")
+
+    def install(self, url, dest, downloader, quiet=False, sha256=None, mirrors=None, report=None):
+        """
+        Ensure the blob for url is in the store (downloading it if needed)
+        and materialize it at dest. Returns True on success.
+        """
+        from .events import emit
+        from .utils import fetch_file
+        key = blob_key(url, sha256)
+        filename = os.path.basename(dest)
+        with self._locked_key(key):
+            blob = self._find_blob(key)
+            if blob is None:
+                blob = self.blob_path(key, filename)
+                if not fetch_file(url, str(blob), downloader, quiet=quiet, sha256=sha256, mirrors=mirrors, report=report):
+                    return False
+            else:
+                emit("download", url=url, path=dest, outcome="store")
+                if not quiet:
+                    print(f"Found {filename} in model store.")
+
+            try:
+                mode = self.materialize(blob, dest)
+            except OSError as e:
+                print(f"Error: {e}")
+                if report is not None:
+                    report['error'] = str(e)
+                return False
+
+            with self._locked_index():
+                index = self._load_index()
+                entry = index.setdefault(key, {'url': url, 'sha256': normalize_sha256(sha256), 'refs': {}})
+                entry['size'] = blob.stat().st_size
+                entry['blob'] = str(blob)
+                entry['refs'][os.path.abspath(dest)] = _ref_record(dest, mode)
+                self._save_index(index)
+
+        if not quiet:
+            print(f"Installed {filename} from model store ({mode}).")
+        return True
+
+    def prepare_repair(self, item, downloader):
+        """
+        Get a damaged installed file and, when it is damaged too, its blob
+        out of the way so install() repairs both instead of relinking the
+        damaged blob. A hardlink or symlink shares the file's damage; an
+        independent copy (reflink or copy mode) has its blob checked.
+        An incomplete blob becomes the .part file of the blob download and
+        is resumed; a corrupt one is quarantined and dropped from the index.
+        """
+        from .integrity import quarantine
+        from .verify import check_file, make_resumable
+        path = item['path']
+        key = blob_key(item['url'], item.get('sha256'))
+        target = str(self.blob_path(key, os.path.basename(path)))
+        with self._locked_key(key):
+            blob = self._find_blob(key)
+            shared = blob is not None and os.path.exists(path) and os.path.samefile(path, blob)
+            if blob is None:
+                status = None
+            elif shared:
+                status = item['status']
+            else:
+                status = check_file(dict(item, path=str(blob), local_size=blob.stat().st_size), "quick")
+
+            if blob is None and item['status'] == "incomplete" and not os.path.islink(path):
+                # Installed before the store was enabled: resume it as the blob
+                try:
+                    make_resumable(path, target, item, downloader)
+                    return
+                except OSError:
+                    pass
+            if item['status'] == "corrupt" and not shared:
+                moved = quarantine(path)
+                print(f"Moved corrupt {os.path.basename(path)} to {moved}.")
+            elif os.path.lexists(path):
+                os.remove(path)
+
+            if status == "incomplete":
+                make_resumable(str(blob), target, item, downloader)
+            elif status == "corrupt":
+                moved = quarantine(str(blob))
+                print(f"Moved corrupt blob {blob.name} to {moved}.")
+                with self._locked_index():
+                    index = self._load_index()
+                    if index.pop(key, None) is not None:
+                        self._save_index(index)
+
+    def _is_referenced(self, blob, refs):
+        try:
+            if blob.stat().st_nlink > 1:
+                return True
+        except OSError:
+            return False
+        for path, record in refs.items():
+            if not os.path.lexists(path):
+                continue
+            # Older indexes stored just the mode
+            if not isinstance(record, dict):
+                record = {'mode': record}
+            mode = record.get('mode')
+            try:
+                if mode == "symlink" and os.path.realpath(path) == os.path.realpath(blob):
+                    return True
+                if mode == "hardlink" and os.path.samefile(path, blob):
+                    return True
+                if mode in ("reflink", "copy"):
+                    st = os.stat(path)
+                    if 'ino' in record:
+                        identity = (record['dev'], record['ino'], record['size'], record['mtime_ns'])
+                    else:
+                        # No recorded identity: only a copy2 copy of the blob
+                        # still matches its size and mtime
+                        blob_st = blob.stat()
+                        identity = (st.st_dev, st.st_ino, blob_st.st_size, blob_st.st_mtime_ns)
+                    if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) == identity:
+                        return True
+            except OSError:
+                continue
+        return False
+
+    def gc(self, dry_run=False):
+        """
+        Remove blobs no ComfyUI root references any more.
+        Returns (removed_count, reclaimed_bytes).
+        """
+        from .utils import has_pending_download
+        blobs_dir = self.root / "blobs"
+        removed = 0
+        reclaimed = 0
+        if not blobs_dir.exists():
+            return 0, 0
+        for prefix_dir in blobs_dir.iterdir():
+            if not prefix_dir.is_dir():
+                continue
+            for key_dir in prefix_dir.iterdir():
+                key = key_dir.name
+                # Holding the key lock keeps installs of this blob out, and
+                # the index is read under it so their refs are seen.
+                with self._locked_key(key):
+                    with self._locked_index():
+                        refs = self._load_index().get(key, {}).get('refs', {})
+                    for blob in list(key_dir.iterdir()):
+                        if has_pending_download(str(blob)) or blob.suffix in (".aria2", ".comfydl") or is_partial_name(blob.name):
+                            continue
+                        if self._is_referenced(blob, refs):
+                            continue
+                        size = blob.stat().st_size
+                        print(f"{'Would remove' if dry_run else 'Removing'}: {key[:16]}.../{blob.name} ({size} bytes)")
+                        removed += 1
+                        reclaimed += size
+                        if not dry_run:
+                            blob.unlink()
+                    if not dry_run and not any(key_dir.iterdir()):
+                        key_dir.rmdir()
+                        if any(other.is_dir() for other in self._key_dirs(key)):
+                            continue
+                        with self._locked_index():
+                            index = self._load_index()
+                            if index.pop(key, None) is not None:
+                                self._save_index(index)
+            if not dry_run and not any(prefix_dir.iterdir()):
+                prefix_dir.rmdir()
+        return removed, reclaimed
+
+_store = None
+_store_config = None
+
+def get_model_store():
+    """
+    Return the ModelStore configured by MODEL_STORE_PATH, or None when
+    the store is disabled.
+    """
+    global _store, _store_config
+    path = get_config_value("MODEL_STORE_PATH")
+    if not path:
+        return None
+    mode = get_config_value("MODEL_STORE_LINK") or DEFAULT_LINK_MODE
+    if mode != "auto" and mode not in LINK_MODES:
+        print(f"Warning: Invalid MODEL_STORE_LINK '{mode}', using auto.")
+        mode = "auto"
+    if _store is None or _store_config != (path, mode):
+        _store = ModelStore(path, mode)
+        _store_config = (path, mode)
+    return _store
@@ -0,0 +1,162 @@
+import json
+import os
+import re
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl, urlencode
+from .config import get_config_value, get_comfydl_dir, atomic_write
+from .registry import init_registries, get_registry_index, load_source_file, source_downloads
+
+# Query parameters that never change which file a URL points to
+NOISE_PARAMS = {"token", "download", "dl"}
+
+_CIVITAI_DOWNLOAD_RE = re.compile(r'^/api/download/models/(\d+)')
+_CIVITAI_VERSION_RE = re.compile(r'(?:^|&)modelVersionId=(\d+)')
+
+def normalize_url(url):
+    """
+    Reduce a model URL to a key shared by equivalent URLs:
+    - Hugging Face 'blob' and 'resolve' URLs (and hf.co) map to one key,
+      without '?download=true' and similar query noise.
+    - Civitai download URLs and model page URLs with modelVersionId map
+      to 'civitai:<version_id>'.
+    - Other URLs drop tokens, scheme and host case, and sort the query.
+    """
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parsed.path.rstrip("/")
+
+    if host in ("huggingface.co", "hf.co"):
+        parts = path.split("/")
+        if "blob" in parts:
+            parts[parts.index("blob")] = "resolve"
+        return "hf:" + "/".join(parts)
+
+    if host == "civitai.com" or host.endswith(".civitai.com"):
+        match = _CIVITAI_DOWNLOAD_RE.match(path)
+        if match:
+            return f"civitai:{match.group(1)}"
+        match = _CIVITAI_VERSION_RE.search(parsed.query)
+        if match:
+            return f"civitai:{match.group(1)}"
+
+    query = sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k.lower() not in NOISE_PARAMS)
+    key = f"{host}{path}"
+    if query:
+        key += "?" + urlencode(query)
+    return key
+
+def _index_entries(url_dests):
+    """Map normalized URL -> list of dest folders from {url: [dest, ...]}."""
+    entries = {}
+    for url, dests in url_dests.items():
+        folders = entries.setdefault(normalize_url(url), [])
+        for dest in dests:
+            folder = os.path.dirname(dest)
+            if folder not in folders:
+                folders.append(folder)
+    return entries
+
+def _source_file_urls(path):
+    urls = {}
+    try:
+        config = load_source_file(path)
+    except Exception:
+        return urls
+    for item in source_downloads(config):
+        if isinstance(item, dict) and item.get('url') and item.get('dest'):
+            urls.setdefault(item['url'], []).append(item['dest'])
+    return urls
+
+def _local_source_files():
+    custom_sources_path = get_config_value("MODEL_SOURCES_PATH")
+    if not custom_sources_path or not os.path.exists(custom_sources_path):
+        return []
+    return sorted(str(f) for f in Path(custom_sources_path).glob("*.yaml"))
+
+def _file_signature(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+_url_index = None
+
+def _index_path():
+    return get_comfydl_dir() / "url_index.json"
+
+def _load_persisted():
+    path = _index_path()
+    if not path.exists():
+        return {'origins': {}}
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if isinstance(data.get('origins'), dict):
+            return data
+    except Exception:
+        pass
+    return {'origins': {}}
+
+def get_url_index():
+    """
+    Return the URL index {'origins': {origin: {'signature', 'entries'}}}.
+    Origins are each local YAML source file and the merged registries;
+    only origins whose files changed are re-indexed, and the result is
+    cached on disk.
+    """
+    global _url_index
+
+    index = _url_index if _url_index is not None else _load_persisted()
+    origins = {}
+    changed = False
+
+    for path in _local_source_files():
+        key = f"file:{path}"
+        try:
+            signature = _file_signature(path)
+        except OSError:
+            continue
+        previous = index['origins'].get(key)
+        if previous and previous.get('signature') == signature:
+            origins[key] = previous
+        else:
+            origins[key] = {'signature': signature, 'entries': _index_entries(_source_file_urls(path))}
+            changed = True
+
+    init_registries()
+    registry_index = get_registry_index()
+    previous = index['origins'].get("registries")
+    if previous and previous.get('signature') == registry_index['signature']:
+        origins["registries"] = previous
+    else:
+        origins["registries"] = {
+            'signature': registry_index['signature'],
+            'entries': _index_entries(registry_index['urls']),
+        }
+        changed = True
+
+    if set(origins) != set(index['origins']):
+        changed = True
+
+    _url_index = {'origins': origins}
+    if changed:
+        try:
+            atomic_write(_index_path(), json.dumps(_url_index, separators=(",", ":")))
+        except Exception as e:
+            print(f"Warning: Could not save URL index: {e}")
+    return _url_index
+
+def find_url_folders(url):
+    """
+    Return candidate dest folders for url, matching equivalent URLs.
+    Local sources come before registries.
+    """
+    key = normalize_url(url)
+    folders = []
+    origins = get_url_index()['origins']
+    ordered = [k for k in origins if k != "registries"] + ["registries"]
+    for origin in ordered:
+        for folder in origins.get(origin, {}).get('entries', {}).get(key, []):
+            if folder not in folders:
+                folders.append(folder)
+    return folders
@@ -1,11 +1,18 @@
+import codecs
 import os
 import shutil
 import subprocess
 import sys
 import math
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 from .config import get_config_value
+from .cache import get_remote_cache
+from .events import emit
+from .retry import get_retry_policy, is_transient, is_transient_exit, METADATA_ATTEMPTS
 import questionary
 
 def user_confirm(message, default=True):
@@ -53,14 +60,6 @@ def get_free_disk_space(path):
         print(f"Warning: Could not check disk space: {e}")
         return float('inf')
 
-def check_disk_space(path, required_bytes):
-    """
-    Checks if there is enough disk space.
-    Returns (has_enough_space, free_bytes)
-    """
-    free_bytes = get_free_disk_space(path)
-    return free_bytes >= required_bytes, free_bytes
-
 def append_civitai_token(url):
     if "civitai.com" not in url:
         return url
@@ -81,29 +80,254 @@ def append_civitai_token(url):
     parsed = parsed._replace(query=new_query)
     return urlunparse(parsed)
 
+DOWNLOADERS = ("aria2c", "wget", "native")
+
 def check_downloader():
+    """
+    Pick the download engine: the DOWNLOADER config value if usable,
+    otherwise aria2c, then wget, then the built-in native engine.
+    """
+    preferred = get_config_value("DOWNLOADER")
+    if preferred:
+        if preferred == "native" or (preferred in DOWNLOADERS and shutil.which(preferred)):
+            return preferred
+        print(f"Warning: Configured DOWNLOADER '{preferred}' is not available, detecting automatically.")
+
     if shutil.which("aria2c"):
         return "aria2c"
     elif shutil.which("wget"):
         return "wget"
     else:
-        return None
+        return "native"
+
+PENDING_SUFFIXES = (".aria2", ".comfydl")
 
-def download_file(url, filepath, downloader):
+def has_pending_download(filepath):
+    """
+    True if filepath belongs to an unfinished download (aria2c control file
+    or native engine state file next to it).
+    """
+    return any(os.path.exists(filepath + suffix) for suffix in PENDING_SUFFIXES)
+
+def _stat_directory(directory, names):
+    """Stat the given names in one directory with a single scandir pass."""
+    try:
+        with os.scandir(directory) as it:
+            entries = {entry.name: entry for entry in it}
+    except OSError:
+        entries = {}
+    result = {}
+    for name in names:
+        info = {
+            'is_file': False,
+            'size': 0,
+            'pending': any(name + suffix in entries for suffix in PENDING_SUFFIXES),
+        }
+        entry = entries.get(name)
+        if entry is not None:
+            try:
+                if entry.is_file():
+                    info['is_file'] = True
+                    info['size'] = entry.stat().st_size
+            except OSError:
+                pass
+        result[os.path.join(directory, name)] = info
+    return result
+
+def stat_paths(paths, workers=8):
+    """
+    Stat many file paths at once. Paths are deduplicated and grouped by
+    directory, and each directory is listed once (directories in parallel),
+    instead of exists/isfile/getsize calls per path.
+    Returns {path: {'is_file', 'size', 'pending'}}.
+    """
+    by_dir = {}
+    for path in set(paths):
+        by_dir.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+    results = {}
+    if not by_dir:
+        return results
+    with ThreadPoolExecutor(max_workers=min(workers, len(by_dir))) as executor:
+        for result in executor.map(lambda kv: _stat_directory(*kv), by_dir.items()):
+            results.update(result)
+    return results
+
+def download_file(url, filepath, downloader, quiet=False, sha256=None, mirrors=None, report=None):
+    """
+    Download url to filepath using the given downloader ('aria2c', 'wget'
+    or 'native').
+    When quiet is True the downloader output is captured instead of being
+    written to the terminal (used when several downloads run at once).
+    If sha256 is given (or known from Hugging Face LFS metadata) the file
+    is hashed while it is written and quarantined on mismatch.
+    mirrors are alternative URLs for the same file (see fetch_file).
+    report, if given, is a dict that receives the number of 'retries'
+    and the 'error' message of a failed download (else None).
+    When a model store is configured the file is fetched into the store
+    once and linked into place.
+    Returns True if the file is present afterwards, otherwise False.
+    """
     filename = os.path.basename(filepath)
     directory = os.path.dirname(filepath)
     
     if not os.path.exists(directory):
         os.makedirs(directory, exist_ok=True)
         
-    if os.path.exists(filepath):
-        print(f"Skipping existing file: {filename}")
-        return
+    if os.path.exists(filepath) and not has_pending_download(filepath):
+        if not quiet:
+            print(f"Skipping existing file: {filename}")
+        emit("download", url=url, path=filepath, outcome="skipped")
+        return True
+
+    from .store import get_model_store
+    store = get_model_store()
+    if store is not None:
+        return store.install(url, filepath, downloader, quiet=quiet, sha256=sha256, mirrors=mirrors, report=report)
+    return fetch_file(url, filepath, downloader, quiet=quiet, sha256=sha256, mirrors=mirrors, report=report)
+
+def fetch_file(url, filepath, downloader, quiet=False, sha256=None, mirrors=None, report=None):
+    """
+    Run the download engine for url into filepath (no skip or store
+    handling). The engine writes <filepath>.part, described by a journal
+    (see partials.py), and the file is only renamed into place once it is
+    complete and verified, so an interrupted download never looks
+    installed and is resumed on the next run.
+    When the file has mirrors (see mirrors.candidate_urls) the fastest
+    host is tried first; if it fails, the next one resumes the same .part
+    file with a ranged request. Transient failures (connection resets,
+    timeouts, 429 and 5xx) are retried with backoff (see retry.py), also
+    resuming. Transfers feed the per-host stats, and report (a dict, if
+    given) receives the number of 'retries' and the 'error' message.
+    Returns True on success.
+    """
+    from .bandwidth import get_limiter
+    from .hoststats import record_transfer, record_failure, url_host
+    from .integrity import normalize_sha256, lfs_sha256
+    from .mirrors import candidate_urls, rank_urls
+    from .partials import part_path, write_journal, adopt_legacy_partial, finalize, discard
+    from .scheduler import bytes_on_disk
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    adopt_legacy_partial(filepath)
+    part = part_path(filepath)
+    write_journal(filepath, url, sha256, mirrors)
+    filename = os.path.basename(filepath)
+
+    candidates = rank_urls(candidate_urls(url, mirrors))
+    if len(candidates) > 1:
+        # Mirrors don't carry Hugging Face's LFS headers; look the hash up once.
+        sha256 = normalize_sha256(sha256) or lfs_sha256(url)
+
+    policy = get_retry_policy()
+    max_attempts = max(policy.max_attempts, len(candidates))
+    queue = list(candidates)
+    failed_hosts = set()
+    # Last failed response per candidate, for its Retry-After
+    failed_responses = {}
+    ok = False
+    error = None
+    started = time.time()
+    transferred = 0
+    retries = 0
+    while queue:
+        candidate = queue.pop(0)
+        if candidate in failed_hosts:
+            delay = policy.delay(retries - 1, failed_responses.pop(candidate, None))
+            print(f"Retrying {filename} from {url_host(candidate)} in {delay:.0f}s (resuming at {format_size(bytes_on_disk(part))})...")
+            time.sleep(delay)
+        elif retries:
+            print(f"Retrying {filename} from {url_host(candidate)}...")
+        start_bytes = bytes_on_disk(part)
+        start = time.time()
+        failure = {}
+        with get_limiter().transfer(candidate) as transfer:
+            status = _run_engine(candidate, part, downloader, quiet=quiet, sha256=sha256, display_name=filename, transfer=transfer, failure=failure)
+        transferred += max(0, bytes_on_disk(part) - start_bytes)
+        if status == "ok":
+            ok = True
+            if os.path.exists(part):
+                record_transfer(candidate, os.path.getsize(part) - start_bytes, time.time() - start)
+            break
+        record_failure(candidate)
+        failed_hosts.add(candidate)
+        error = failure.get('error') or error
+        if failure.get('response') is not None:
+            failed_responses[candidate] = failure['response']
+        if retries + 1 >= max_attempts:
+            break
+        if status == "retry":
+            # The engines resume from the .part file, so a retry only
+            # fetches what is still missing.
+            queue.append(candidate)
+        if queue:
+            retries += 1
+
+    if ok:
+        error = _verify_size(url, part, filename)
+        ok = error is None
+    if ok:
+        finalize(filepath)
+    elif not os.path.exists(part):
+        # Quarantined or never started: nothing left to resume
+        discard(filepath)
+
+    seconds = time.time() - started
+    if report is not None:
+        report['retries'] = retries
+        report['error'] = None if ok else (error or "download failed")
+    emit("download", url=url, path=filepath, engine=downloader, mirror=url_host(candidate),
+         bytes=transferred, seconds=round(seconds, 3),
+         throughput=round(transferred / seconds) if seconds > 0 else None,
+         retries=retries, outcome="ok" if ok else "failed")
+    return ok
+
+def _verify_size(url, path, display_name):
+    """
+    Compare a finished download with the size the server reported when it
+    was probed (if it was). On mismatch the cached metadata is dropped so
+    the next run probes again. Returns None if the size is right, else
+    an error message.
+    """
+    cache = get_remote_cache()
+    entry = cache.get(url, allow_stale=True)
+    expected = entry['value'].get('size') if entry else None
+    actual = os.path.getsize(path)
+    if expected is None or actual == expected:
+        return None
+    cache.delete(url)
+    if actual < expected:
+        print(f"Error: {display_name} is incomplete ({actual} of {expected} bytes); it will resume on the next run.")
+        return f"incomplete ({actual} of {expected} bytes)"
+    from .integrity import quarantine
+    moved = quarantine(path)
+    print(f"Error: {display_name} is larger than expected ({actual} > {expected} bytes). Moved to {moved}.")
+    return f"larger than expected ({actual} > {expected} bytes)"
 
-    print(f"Downloading {filename}...")
+def _run_engine(url, filepath, downloader, quiet=False, sha256=None, display_name=None, transfer=None, failure=None):
+    """
+    Download url into filepath with one engine. transfer (see
+    bandwidth.Transfer) limits the rate: aria2c and wget get a fixed
+    share when they start, the native engine is throttled continuously.
+    Returns "ok", "retry" (a transient failure; running again resumes
+    from what is on disk) or "failed". failure (a dict, if given)
+    receives an 'error' message and the 'response' of a failed HTTP
+    request, whose Retry-After the next attempt honors.
+    """
+    failure = failure if failure is not None else {}
+    from .integrity import normalize_sha256, lfs_sha256, HashFollower, file_size_watermark
+
+    filename = os.path.basename(filepath)
+    display_name = display_name or filename
+    directory = os.path.dirname(filepath)
+    os.makedirs(directory, exist_ok=True)
+
+    if not quiet:
+        print(f"Downloading {display_name}...")
     
     # Process URL for Civitai
     final_url = append_civitai_token(url)
+    expected_hash = normalize_sha256(sha256) or lfs_sha256(url)
+    rate = transfer.rate() if transfer is not None and downloader in ("aria2c", "wget") else None
+    follower = None
     
     try:
         if downloader == "aria2c":
@@ -112,12 +336,25 @@ def download_file(url, filepath, downloader):
                 "--console-log-level=warn", "-c",
                 "-d", directory, "-o", filename, final_url
             ]
+            if quiet:
+                # Write sequentially into a sparse file so progress can be
+                # measured from the allocated size on disk.
+                cmd[1:1] = ["--file-allocation=none", "--summary-interval=0", "--show-console-readout=false"]
+            if rate:
+                cmd.insert(-1, f"--max-download-limit={int(rate)}")
+            if expected_hash:
+                # aria2c writes segments out of order; let it verify itself.
+                cmd.insert(-1, f"--checksum=sha-256={expected_hash}")
             if "huggingface.co" in final_url:
                 hf_token = get_config_value("HF_TOKEN")
                 if hf_token:
                     cmd.insert(-1, f"--header=Authorization: Bearer {hf_token}")
         elif downloader == "wget":
             cmd = ["wget", "-c", "-O", filepath]
+            if quiet:
+                cmd.append("-nv")
+            if rate:
+                cmd.append(f"--limit-rate={int(rate)}")
             
             if "huggingface.co" in final_url:
                 hf_token = get_config_value("HF_TOKEN")
@@ -126,47 +363,270 @@ def download_file(url, filepath, downloader):
                     cmd.append("--content-disposition")
 
             cmd.append(final_url)
+            if expected_hash:
+                follower = HashFollower(filepath, file_size_watermark(filepath))
+        elif downloader == "native":
+            from .native import NativeDownload
+            throttle = transfer.throttle if transfer is not None else None
+            download = NativeDownload(final_url, filepath, headers=auth_headers(final_url), quiet=quiet, throttle=throttle)
+            if expected_hash:
+                follower = HashFollower(filepath, download.contiguous_bytes)
+                follower.start()
+            download.run()
+            return "ok" if _finish_download(filepath, expected_hash, follower, quiet, display_name, failure) else "failed"
         else:
-            # Fallback to python requests if needed, but for now we error or just warn
-            print("Error: No external downloader found (aria2c/wget).")
-            return
+            print(f"Error: Unknown downloader '{downloader}'.")
+            failure['error'] = f"Unknown downloader '{downloader}'"
+            return "failed"
+
+        if follower is not None:
+            follower.start()
             
-        subprocess.run(cmd, check=True)
-        print(f"{filename} downloaded successfully.")
+        if quiet:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                output = (result.stderr or result.stdout or "").strip()
+                lines = output.splitlines()
+                detail = f": {lines[-1]}" if lines else ""
+                print(f"Error downloading {display_name}{detail}")
+                failure['error'] = lines[-1] if lines else f"{downloader} exited with status {result.returncode}"
+                _check_aria2_checksum(downloader, result.returncode, filepath, display_name)
+                return "retry" if is_transient_exit(downloader, result.returncode, output) else "failed"
+        else:
+            if downloader == "wget":
+                # Keep wget's messages to tell a 503 from a 404
+                returncode, output = _run_with_console(cmd[:1] + ["--progress=bar:force"] + cmd[1:])
+            else:
+                returncode, output = subprocess.run(cmd).returncode, None
+            if returncode != 0:
+                print(f"Error downloading {display_name}.")
+                lines = (output or "").strip().splitlines()
+                failure['error'] = lines[-1].strip() if lines else f"{downloader} exited with status {returncode}"
+                _check_aria2_checksum(downloader, returncode, filepath, display_name)
+                return "retry" if is_transient_exit(downloader, returncode, output) else "failed"
+        return "ok" if _finish_download(filepath, expected_hash, follower, quiet, display_name, failure) else "failed"
         
-    except subprocess.CalledProcessError:
-        print(f"Error downloading {filename}.")
+    except requests.exceptions.RequestException as e:
+        print(f"Error downloading {display_name}: {e}")
+        failure['error'] = str(e)
+        if e.response is not None:
+            failure['response'] = e.response
+        return "retry" if is_transient(e) else "failed"
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+        failure['error'] = str(e)
+        return "retry" if is_transient(e) else "failed"
+    finally:
+        if follower is not None and follower.is_alive():
+            follower.finish()
 
-def get_remote_file_size(url):
+# Tail of a console-mode engine's output kept to classify failures
+CONSOLE_TAIL = 64 * 1024
+
+def _run_with_console(cmd):
     """
-    Get the remote file size using an HTTP HEAD request.
-    Returns size in bytes if successful, otherwise None.
+    Run cmd with its stderr passed through to the terminal, keeping the
+    tail of it. Returns (returncode, output).
     """
-    final_url = append_civitai_token(url)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    process = subprocess.Popen(cmd, stderr=subprocess.PIPE)
+    tail = ""
+    try:
+        while True:
+            chunk = os.read(process.stderr.fileno(), 4096)
+            if not chunk:
+                break
+            text = decoder.decode(chunk)
+            sys.stderr.write(text)
+            sys.stderr.flush()
+            tail = (tail + text)[-CONSOLE_TAIL:]
+    finally:
+        process.stderr.close()
+    return process.wait(), tail
+
+# aria2c exit status for a failed --checksum verification
+ARIA2_CHECKSUM_ERROR = 32
+
+def _check_aria2_checksum(downloader, returncode, filepath, display_name):
+    if downloader == "aria2c" and returncode == ARIA2_CHECKSUM_ERROR and os.path.exists(filepath):
+        from .integrity import quarantine
+        moved = quarantine(filepath)
+        print(f"Error: SHA256 mismatch for {display_name}. Moved to {moved}.")
+
+def _finish_download(filepath, expected_hash, follower, quiet, display_name, failure):
+    """Check the streamed hash, if any, and report the result."""
+    from .integrity import quarantine
+    filename = display_name
+    if follower is not None:
+        digest = follower.finish(os.path.getsize(filepath))
+        if digest != expected_hash:
+            moved = quarantine(filepath)
+            print(f"Error: SHA256 mismatch for {filename} (expected {expected_hash}, got {digest}). Moved to {moved}.")
+            failure['error'] = f"SHA256 mismatch (expected {expected_hash}, got {digest})"
+            return False
+    if not quiet:
+        suffix = " (SHA256 verified)" if expected_hash else ""
+        print(f"{filename} downloaded successfully{suffix}.")
+    return True
+
+DEFAULT_PROBE_WORKERS = 8
+DEFAULT_PROBE_DEADLINE = 30
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """
+    Return the process-wide requests session.
+    Connections are pooled so repeated requests to the same host
+    (e.g. probing every file of a source) reuse TCP/TLS connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=32)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "ComfyDL/1.0"
+            _session = session
+        return _session
+
+def auth_headers(final_url):
     headers = {}
-    
     if "huggingface.co" in final_url:
         hf_token = get_config_value("HF_TOKEN")
         if hf_token:
             headers["Authorization"] = f"Bearer {hf_token}"
-            
+    return headers
+
+def _response_metadata(response):
+    """
+    Extract cacheable metadata from a (possibly redirected) response.
+    Hugging Face reports the LFS object hash and size on the first hop as
+    X-Linked-Etag / X-Linked-Size before redirecting to its CDN.
+    """
+    first = response.history[0] if response.history else response
+    info = {
+        'size': None,
+        'etag': first.headers.get("ETag"),
+        'linked_etag': None,
+        'last_modified': first.headers.get("Last-Modified"),
+        'final_url': response.url if response.history else None,
+    }
+    linked_size = None
+    for r in list(response.history) + [response]:
+        if not info['linked_etag'] and r.headers.get("X-Linked-Etag"):
+            info['linked_etag'] = r.headers["X-Linked-Etag"].strip('"')
+        if linked_size is None and r.headers.get("X-Linked-Size"):
+            linked_size = r.headers["X-Linked-Size"]
+    content_length = response.headers.get("Content-Length") if response.status_code == 200 else None
+    size = content_length or linked_size
+    if size:
+        info['size'] = int(size)
+    return info
+
+def get_remote_file_info(url, session=None, use_cache=True):
+    """
+    Get remote metadata for url: size, etag, linked_etag, last_modified and
+    final_url (redirect target).
+    Results are kept in the persistent remote cache. Stale entries are
+    revalidated with a conditional request, and used as-is when the remote
+    cannot be reached. Returns a dict, or None if nothing is known.
+    """
+    if session is None:
+        session = get_http_session()
+    cache = get_remote_cache() if use_cache else None
+    entry = cache.get(url, allow_stale=True) if cache else None
+    if entry and cache.is_fresh(entry):
+        return entry['value']
+    cached = entry['value'] if entry else None
+    start = time.time()
+
+    final_url = append_civitai_token(url)
+    headers = auth_headers(final_url)
+    conditional = dict(headers)
+    if cached:
+        if cached.get('etag'):
+            conditional["If-None-Match"] = cached['etag']
+        if cached.get('last_modified'):
+            conditional["If-Modified-Since"] = cached['last_modified']
+
+    policy = get_retry_policy(METADATA_ATTEMPTS)
+    retries = 0
     try:
         # Use allow_redirects=True because HEAD on some CDNs might redirect
-        response = requests.head(final_url, headers=headers, allow_redirects=True, timeout=5)
-        if response.status_code == 200:
-            content_length = response.headers.get("Content-Length")
-            if content_length:
-                return int(content_length)
-        
-        # Fallback to GET with stream=True if HEAD fails or doesn't provide Content-Length
-        response = requests.get(final_url, headers=headers, stream=True, allow_redirects=True, timeout=5)
-        if response.status_code == 200:
-            content_length = response.headers.get("Content-Length")
-            if content_length:
-                return int(content_length)
+        response, retries = policy.request(lambda: session.head(final_url, headers=conditional, allow_redirects=True, timeout=5))
+        if response.status_code == 304 and cached:
+            cache.touch(url)
+            emit("remote_size", url=url, size=cached.get('size'), latency=round(time.time() - start, 3), retries=retries, outcome="not_modified")
+            return cached
+
+        info = _response_metadata(response) if response.status_code == 200 else None
+        if not info or info['size'] is None:
+            # Fallback to GET with stream=True if HEAD fails or doesn't provide Content-Length
+            response, get_retries = policy.request(lambda: session.get(final_url, headers=headers, stream=True, allow_redirects=True, timeout=5))
+            retries += get_retries
+            with response:
+                if response.status_code == 200:
+                    info = _response_metadata(response)
+
+        if info and info['size'] is not None:
+            if cache:
+                cache.set(url, info)
+            emit("remote_size", url=url, size=info['size'], latency=round(time.time() - start, 3), retries=retries, outcome="ok")
+            return info
     except Exception:
         pass
-    
-    return None
+
+    # Offline or failing remote: fall back to what we knew before
+    emit("remote_size", url=url, size=cached.get('size') if cached else None, latency=round(time.time() - start, 3),
+         retries=retries, outcome="stale" if cached else "failed")
+    return cached
+
+def get_remote_file_size(url, session=None):
+    """
+    Get the remote file size using an HTTP HEAD request.
+    Returns size in bytes if successful, otherwise None.
+    """
+    info = get_remote_file_info(url, session=session)
+    return info.get('size') if info else None
+
+def get_remote_file_sizes(urls, max_workers=DEFAULT_PROBE_WORKERS, deadline=DEFAULT_PROBE_DEADLINE):
+    """
+    Probe the remote size of many URLs concurrently over the shared session.
+    URLs with fresh cache entries are answered without touching the network.
+    Probes still running when the overall deadline (seconds) expires are
+    reported as unknown.
+    Returns a dict {url: size_or_None}.
+    """
+    unique_urls = list(dict.fromkeys(u for u in urls if u))
+    sizes = {url: None for url in unique_urls}
+
+    cache = get_remote_cache()
+    to_probe = []
+    for url in unique_urls:
+        entry = cache.get(url)
+        if entry:
+            sizes[url] = entry['value'].get('size')
+        else:
+            to_probe.append(url)
+    if not to_probe:
+        return sizes
+
+    session = get_http_session()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(to_probe)))
+    try:
+        futures = {executor.submit(get_remote_file_size, url, session): url for url in to_probe}
+        done, not_done = wait(futures, timeout=deadline)
+        for future in done:
+            sizes[futures[future]] = future.result()
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            print(f"Warning: Timed out probing {len(not_done)} remote file size(s).")
+    finally:
+        # Don't block on probes that overran the deadline.
+        executor.shutdown(wait=False)
+        cache.flush()
+    return sizes
@@ -0,0 +1,168 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from .utils import get_http_session, get_remote_file_sizes, append_civitai_token, auth_headers
+from .integrity import normalize_sha256, lfs_sha256, sha256_file, quarantine
+
+VERIFY_MODES = ("size", "quick", "full")
+# Bytes compared at the start and end of a file by a quick check
+QUICK_BLOCK_SIZE = 1024 * 1024
+DEFAULT_VERIFY_WORKERS = 8
+
+def _local_block_digest(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(length)).hexdigest()
+
+def _remote_block_digest(url, start, length, session):
+    final_url = append_civitai_token(url)
+    headers = auth_headers(final_url)
+    headers["Range"] = f"bytes={start}-{start + length - 1}"
+    with session.get(final_url, headers=headers, allow_redirects=True, timeout=30) as response:
+        if response.status_code != 206:
+            return None
+        return hashlib.sha256(response.content).hexdigest()
+
+def quick_check(path, url, session=None):
+    """
+    Compare the first and last blocks of the local file with the same
+    byte ranges on the server. Works on truncated files too (the ranges
+    end at the local size), so it tells a clean prefix that can be resumed
+    from a file with different content.
+    Returns True/False, or None if the server does not support ranges.
+    """
+    session = session or get_http_session()
+    size = os.path.getsize(path)
+    if size == 0:
+        return True
+    length = min(QUICK_BLOCK_SIZE, size)
+    for start in sorted({0, size - length}):
+        remote = _remote_block_digest(url, start, length, session)
+        if remote is None:
+            return None
+        if remote != _local_block_digest(path, start, length):
+            return False
+    return True
+
+def _expected_sha256(item):
+    return normalize_sha256(item.get('sha256')) or (lfs_sha256(item['url']) if item.get('url') else None)
+
+def _verify_one(item, mode, session):
+    """Set item['status'] and item['verify_note'] for an installed file."""
+    local_size = item['local_size']
+    remote_size = item.get('remote_size')
+
+    if remote_size is not None and local_size < remote_size:
+        item['status'] = "incomplete"
+        item['verify_note'] = f"{local_size} of {remote_size} bytes"
+    elif remote_size is not None and local_size > remote_size:
+        item['status'] = "corrupt"
+        item['verify_note'] = f"larger than remote ({local_size} > {remote_size} bytes)"
+    else:
+        item['status'] = "installed"
+        item['verify_note'] = None if remote_size is not None else "remote size unknown"
+
+    if item['status'] == "corrupt":
+        return
+    try:
+        if mode in ("quick", "full") or item['status'] == "incomplete":
+            # An incomplete file is only worth resuming if its prefix matches.
+            matches = quick_check(item['path'], item['url'], session)
+            if matches is False:
+                item['status'] = "corrupt"
+                item['verify_note'] = "content differs from remote"
+                return
+        if mode == "full" and item['status'] == "installed":
+            expected = _expected_sha256(item)
+            if not expected:
+                item['verify_note'] = "no reference hash"
+            elif sha256_file(item['path']) != expected:
+                item['status'] = "corrupt"
+                item['verify_note'] = "SHA256 mismatch"
+            else:
+                item['verify_note'] = "SHA256 verified"
+    except Exception as e:
+        item['verify_note'] = f"could not check: {e}"
+
+def verify_files(files, mode="size", workers=DEFAULT_VERIFY_WORKERS):
+    """
+    Verify the installed files of a plan (see planner.plan_files) in place.
+
+    mode 'size' compares local sizes with the cached or probed remote size;
+    'quick' also compares the first and last blocks with the server;
+    'full' also hashes the whole file against its known SHA256.
+    Files whose size falls short of the remote size are marked
+    'incomplete', files that cannot be resumed 'corrupt'; both are no
+    longer counted as installed.
+    """
+    installed = [item for item in files if item['is_installed'] and item.get('url')]
+    # Sizes from catalogues (e.g. Civitai's sizeKB) are approximate; only
+    # the server's Content-Length is exact enough to compare against.
+    sizes = get_remote_file_sizes([item['url'] for item in installed])
+    for item in installed:
+        item['remote_size'] = sizes.get(item['url'])
+
+    session = get_http_session()
+    if installed:
+        with ThreadPoolExecutor(max_workers=min(workers, len(installed))) as executor:
+            list(executor.map(lambda item: _verify_one(item, mode, session), installed))
+    for item in installed:
+        if item['status'] != "installed":
+            item['is_installed'] = False
+    return files
+
+def check_file(item, mode="size", session=None):
+    """
+    Verify one installed file (a plan file with 'path', 'url',
+    'local_size' and 'remote_size') without changing item.
+    Returns its status: 'installed', 'incomplete' or 'corrupt'.
+    """
+    item = dict(item)
+    _verify_one(item, mode, session or get_http_session())
+    return item['status']
+
+def make_resumable(src, filepath, item, downloader):
+    """
+    Turn src, a clean prefix of item's file, into the .part file of a
+    download to filepath, so the next download only fetches the rest.
+    """
+    from .partials import part_path, write_journal
+    part = part_path(filepath)
+    os.makedirs(os.path.dirname(part), exist_ok=True)
+    os.replace(src, part)
+    write_journal(filepath, item['url'], item.get('sha256'), item.get('mirrors'))
+    if downloader == "native" and item.get('remote_size'):
+        from .native import seed_state
+        seed_state(part, item['remote_size'], os.path.getsize(part))
+
+def prepare_repair(item, downloader):
+    """
+    Get a damaged file out of the way so a normal download repairs it.
+    An incomplete file becomes the .part file of a new download and is
+    resumed with a ranged request; a corrupt one is quarantined.
+    With a model store the blob is repaired instead (see
+    ModelStore.prepare_repair).
+    """
+    from .store import get_model_store
+    path = item['path']
+    store = get_model_store()
+    if store is not None:
+        store.prepare_repair(item, downloader)
+        return
+    if item['status'] == "corrupt":
+        moved = quarantine(path)
+        print(f"Moved corrupt {os.path.basename(path)} to {moved}.")
+        return
+    if os.path.islink(path):
+        os.remove(path)
+        return
+    make_resumable(path, path, item, downloader)
+
+def recheck(files, comfyui_path, mode="size"):
+    """
+    Verify repaired plan files again. Returns the freshly planned files
+    that are still not intact, with their 'status' and 'verify_note'.
+    """
+    from .planner import build_plan
+    entries = [{key: item.get(key) for key in ('source', 'url', 'dest', 'sha256', 'mirrors')} for item in files]
+    return [item for item in build_plan(entries, comfyui_path, verify=mode)['files'] if item['status'] != "installed"]
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Keep the real ~/.comfydl_config and caches out of reach before comfydl
+# computes its paths at import time.
+os.environ["HOME"] = tempfile.mkdtemp(prefix="comfydl-tests-")
+
+from comfydl import bandwidth, cache, config, events, hoststats, registry, store, urlindex
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def payload(size, seed=0):
+    """Deterministic, incompressible test file contents."""
+    count = -(-size // hashlib.sha256().digest_size)
+    return b"".join(hashlib.sha256(f"{seed}:{i}".encode()).digest() for i in range(count))[:size]
+
+def sha256_of(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_file(self, head):
+        server = self.server.owner
+        path = self.path.split("?", 1)[0]
+        server.requests.append((self.command, path, self.headers.get("Range")))
+        fault = server.next_fault(path)
+        if fault is not None:
+            status, headers = fault
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = server.files.get(path)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        size = len(data)
+        start, end = 0, size - 1
+        status = 200
+        match = _RANGE_RE.match(self.headers.get("Range", ""))
+        if match and match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{hashlib.sha256(data).hexdigest()[:16]}"')
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head:
+            return
+        try:
+            offset = start
+            while offset <= end:
+                chunk = data[offset:min(offset + server.chunk_size, end + 1)]
+                self.wfile.write(chunk)
+                offset += len(chunk)
+                if server.delay:
+                    time.sleep(server.delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_HEAD(self):
+        self._send_file(head=True)
+
+    def do_GET(self):
+        self._send_file(head=False)
+
+class RangeServer:
+    """
+    Local HTTP server for the tests. files maps paths to bytes, served
+    with Range support. fail(path, status, ...) queues error responses
+    for the next requests of path; delay slows every chunk down.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        self.delay = 0
+        self.chunk_size = 64 * 1024
+        self._faults = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, path):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def add(self, path, data):
+        self.files[path] = data
+        return self.url(path)
+
+    def fail(self, path, status, times=1, headers=None):
+        with self._lock:
+            self._faults.setdefault(path, []).extend([(status, headers or {})] * times)
+
+    def next_fault(self, path):
+        with self._lock:
+            faults = self._faults.get(path)
+            return faults.pop(0) if faults else None
+
+    def gets(self, path):
+        return [r for r in self.requests if r[0] == "GET" and r[1] == path]
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+@pytest.fixture
+def server():
+    srv = RangeServer()
+    yield srv
+    srv.close()
+
+@pytest.fixture(autouse=True)
+def comfydl_home(tmp_path, monkeypatch):
+    """
+    A fresh home directory per test, with comfydl's per-process caches
+    reset so config, caches and stats from other tests do not leak in.
+    """
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setattr(config, "CONFIG_FILE", home / ".comfydl_config")
+    monkeypatch.setattr(config, "_config", config.ConfigFile(home / ".comfydl_config"))
+    for module, name in ((cache, "_remote_cache"), (cache, "_civitai_cache"), (hoststats, "_stats"),
+                         (bandwidth, "_limiter"), (bandwidth, "_rate_override"), (events, "_sink"),
+                         (store, "_store"), (store, "_store_config"), (urlindex, "_url_index"),
+                         (registry, "_registry_index")):
+        monkeypatch.setattr(module, name, None)
+    monkeypatch.setattr(events, "_overrides", {})
+    monkeypatch.setattr(registry, "_source_file_cache", {})
+    return home
+
+def set_config(**values):
+    with config._config.update() as data:
+        data.update(values)
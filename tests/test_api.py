@@ -0,0 +1,86 @@
+import asyncio
+import os
+import threading
+
+from comfydl import api
+
+from conftest import payload, set_config
+
+def _file(url, tmp_path, name, **extra):
+    return dict({'url': url, 'path': str(tmp_path / "models" / name), 'is_installed': False}, **extra)
+
+def test_concurrent_calls_share_the_global_limit(server, tmp_path, monkeypatch):
+    set_config(MAX_CONCURRENT_DOWNLOADS=1)
+    server.delay = 0.01
+    urls = [server.add(f"/{i}.bin", payload(256 * 1024, seed=i)) for i in range(3)]
+    lock = threading.Lock()
+    active = [0, 0]
+    real_run_item = api.run_item
+
+    def counting_run_item(item, downloader, quiet):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        try:
+            return real_run_item(item, downloader, quiet)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(api, "run_item", counting_run_item)
+
+    async def main():
+        return await asyncio.gather(*(api.download([_file(url, tmp_path, f"{i}.bin")], downloader="native")
+                                      for i, url in enumerate(urls)))
+
+    results = asyncio.run(main())
+    assert all(len(r['succeeded']) == 1 for r in results)
+    assert active[1] == 1
+
+def test_callbacks_run_on_the_loop(server, tmp_path):
+    server.delay = 0.05
+    data = payload(1024 * 1024)
+    url = server.add("/p.bin", data)
+    progress = []
+    done = []
+
+    async def on_file_done(item, ok, retries):
+        done.append((os.path.basename(item['path']), ok, threading.current_thread() is threading.main_thread()))
+
+    async def main():
+        return await api.download([_file(url, tmp_path, "p.bin", remote_size=len(data))], downloader="native",
+                                  on_progress=lambda item, n, total: progress.append(total),
+                                  on_file_done=on_file_done)
+
+    results = asyncio.run(main())
+    assert results['succeeded'][0]['error'] is None
+    assert done == [("p.bin", True, True)]
+    assert progress and all(total == len(data) for total in progress)
+
+def test_failed_download_reports_error(server, tmp_path):
+    async def main():
+        return await api.download([_file(server.url("/missing.bin"), tmp_path, "missing.bin")], downloader="native")
+
+    results = asyncio.run(main())
+    assert results['failed'][0]['ok'] is False
+    assert "404" in results['failed'][0]['error']
+
+def test_narrowed_call_does_not_hold_shared_host_slots(server, tmp_path):
+    set_config(MAX_CONCURRENT_DOWNLOADS=4, HOST_CONCURRENCY="127.0.0.1=2")
+    server.delay = 0.02
+    slow = [server.add(f"/a{i}.bin", payload(512 * 1024, seed=i)) for i in range(3)]
+    quick = server.add("/b.bin", payload(1000))
+    finished = []
+
+    def on_file_done(item, ok, retries):
+        finished.append(os.path.basename(item['path']))
+
+    async def main():
+        narrowed = api.download([_file(url, tmp_path, f"a{i}.bin") for i, url in enumerate(slow)],
+                                downloader="native", max_concurrent=1, on_file_done=on_file_done)
+        other = api.download([_file(quick, tmp_path, "b.bin")], downloader="native", on_file_done=on_file_done)
+        return await asyncio.gather(narrowed, other)
+
+    asyncio.run(main())
+    # b.bin gets the host's second slot while a0.bin is still running
+    assert finished[0] == "b.bin"
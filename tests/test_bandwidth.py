@@ -0,0 +1,66 @@
+import threading
+import time
+from contextlib import ExitStack
+
+from comfydl.bandwidth import BandwidthLimiter, TokenBucket, parse_rate
+
+M = 1024 * 1024
+
+def test_parse_rate():
+    assert parse_rate("20M") == 20 * M
+    assert parse_rate("1.5k") == 1536
+    assert parse_rate("0") is None
+
+def test_staggered_fixed_rates_stay_within_global_budget():
+    limiter = BandwidthLimiter(limit=20 * M, slots=4)
+    rates = []
+    with ExitStack() as stack:
+        for i in range(4):
+            transfer = stack.enter_context(limiter.transfer(f"https://h{i}.example/f"))
+            rates.append(transfer.rate())
+            assert limiter.allotted_rate() <= 20 * M + 1
+    assert rates == [5 * M] * 4
+    assert limiter.allotted_rate() == 0
+
+def test_host_fixed_rates_stay_within_host_cap():
+    limiter = BandwidthLimiter(host_rates={'a.example': 8 * M}, slots=4, host_slots=lambda url: 2)
+    with limiter.transfer("https://a.example/1") as first, limiter.transfer("https://cdn.a.example/2") as second:
+        assert first.rate() == 4 * M
+        assert second.rate() == 4 * M
+        assert limiter.allotted_rate("a.example") == 8 * M
+        with limiter.transfer("https://b.example/3") as other:
+            assert other.rate() is None
+
+def test_transfer_beyond_slots_waits_for_budget():
+    limiter = BandwidthLimiter(limit=10 * M, slots=1)
+    started = threading.Event()
+    finish = threading.Event()
+    rates = []
+
+    def first():
+        with limiter.transfer("https://a.example/1") as transfer:
+            rates.append(transfer.rate())
+            started.set()
+            finish.wait(5)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    started.wait(5)
+    threading.Timer(0.2, finish.set).start()
+    start = time.monotonic()
+    with limiter.transfer("https://b.example/2") as second:
+        rate = second.rate()
+        waited = time.monotonic() - start
+        assert limiter.allotted_rate() <= 10 * M + 1
+    thread.join()
+    assert rates == [10 * M]
+    assert waited >= 0.15
+    assert rate == 10 * M
+
+def test_token_bucket_holds_the_rate():
+    bucket = TokenBucket(lambda: 200 * 1024)
+    start = time.monotonic()
+    for _ in range(10):
+        bucket.consume(10 * 1024)
+    # 100 KiB at 200 KiB/s, starting with an empty bucket
+    assert time.monotonic() - start >= 0.45
@@ -0,0 +1,35 @@
+import time
+
+from comfydl import cache
+from comfydl.cache import DiskCache
+
+def test_hit_does_not_rewrite_cache(tmp_path):
+    path = tmp_path / "cache.json"
+    first = DiskCache(path, ttl=3600, max_entries=10)
+    first.set("k", {'size': 1})
+    first.flush()
+    mtime = path.stat().st_mtime_ns
+
+    second = DiskCache(path, ttl=3600, max_entries=10)
+    assert second.get("k")['value'] == {'size': 1}
+    assert not second._dirty
+    second.flush()
+    assert path.stat().st_mtime_ns == mtime
+
+def test_hit_on_old_lru_timestamp_is_saved(tmp_path):
+    c = DiskCache(tmp_path / "cache.json", ttl=10 * cache.USED_AT_RESOLUTION, max_entries=10)
+    c.set("k", 1)
+    c.flush()
+    c._entries["k"]['used_at'] -= cache.USED_AT_RESOLUTION
+    assert c.get("k") is not None
+    assert c._dirty
+    assert time.time() - c._entries["k"]['used_at'] < 60
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    c = DiskCache(tmp_path / "cache.json", ttl=3600, max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c._entries["b"]['used_at'] -= 10
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") is not None
@@ -0,0 +1,50 @@
+from comfydl.civitai import select_files
+
+def _file(name, type="Model", format="SafeTensor", fp="fp16", size="pruned", kb=1000, primary=False):
+    return {'name': name, 'type': type, 'sizeKB': kb, 'primary': primary,
+            'metadata': {'format': format, 'fp': fp, 'size': size}}
+
+FILES = [
+    _file("full-fp32.safetensors", fp="fp32", size="full", kb=4000, primary=True),
+    _file("pruned-fp16.safetensors", kb=2000),
+    _file("pruned-fp16.ckpt", format="PickleTensor", kb=1500),
+    _file("vae.safetensors", type="VAE", kb=300),
+]
+
+def _names(files):
+    return [f['name'] for f in files]
+
+def test_no_filters_picks_primary():
+    assert _names(select_files(FILES)) == ["full-fp32.safetensors"]
+    assert _names(select_files(FILES[1:])) == ["pruned-fp16.safetensors"]
+
+def test_format_and_precision_filters():
+    assert _names(select_files(FILES, {'format': ["safetensors"], 'fp': ["fp16"]})) == ["pruned-fp16.safetensors"]
+    assert _names(select_files(FILES, {'format': ["PickleTensor"]})) == ["pruned-fp16.ckpt"]
+
+def test_size_filter():
+    assert _names(select_files(FILES, {'size': ["full"]})) == ["full-fp32.safetensors"]
+
+def test_smallest_prefers_model_files_over_vae():
+    assert _names(select_files(FILES, {'smallest': True})) == ["pruned-fp16.ckpt"]
+
+def test_type_filter_selects_vae():
+    assert _names(select_files(FILES, {'types': ["VAE"]})) == ["vae.safetensors"]
+
+def test_all_returns_every_match():
+    assert _names(select_files(FILES, {'all': True, 'format': ["safetensors"]})) == [
+        "full-fp32.safetensors", "pruned-fp16.safetensors", "vae.safetensors"]
+
+def test_no_match_returns_empty():
+    assert select_files(FILES, {'fp': ["bf16"]}) == []
+    assert select_files([], {'all': True}) == []
+
+def test_civitai_command_passes_downloader(tmp_path, monkeypatch):
+    import sys
+    from comfydl import main as cli
+    calls = []
+    monkeypatch.setattr(cli, "process_civitai_batch", lambda inputs, root, **kwargs: calls.append((inputs, kwargs)) or True)
+    monkeypatch.setattr(sys, "argv", ["comfydl", "civitai", "691639", "--comfyui_path", str(tmp_path), "--downloader", "native", "-y"])
+    cli.main()
+    assert calls[0][0] == ["691639"]
+    assert calls[0][1]['downloader'] == "native"
@@ -0,0 +1,41 @@
+import hashlib
+import os
+
+from comfydl.integrity import HashFollower, normalize_sha256, file_size_watermark
+from comfydl.utils import download_file
+
+from conftest import payload, sha256_of
+
+def test_normalize_sha256():
+    digest = "A" * 64
+    assert normalize_sha256(digest) == "a" * 64
+    assert normalize_sha256(f'"sha256:{digest}"') == "a" * 64
+    assert normalize_sha256("abc") is None
+    assert normalize_sha256(None) is None
+
+def test_hash_follower_matches_file_hash(tmp_path):
+    path = tmp_path / "f.bin"
+    data = payload(100 * 1024)
+    path.write_bytes(data)
+    follower = HashFollower(str(path), file_size_watermark(str(path)))
+    follower.start()
+    assert follower.finish(len(data)) == hashlib.sha256(data).hexdigest()
+
+def test_verified_download_is_installed(server, tmp_path):
+    data = payload(200 * 1024)
+    url = server.add("/m.bin", data)
+    path = str(tmp_path / "m.bin")
+    assert download_file(url, path, "native", quiet=True, sha256=hashlib.sha256(data).hexdigest())
+    assert sha256_of(path) == hashlib.sha256(data).hexdigest()
+
+def test_hash_mismatch_is_quarantined(server, tmp_path):
+    url = server.add("/m.bin", payload(200 * 1024))
+    path = str(tmp_path / "m.bin")
+    report = {}
+    assert not download_file(url, path, "native", quiet=True, sha256="0" * 64, report=report)
+
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + ".part")
+    quarantined = [name for name in os.listdir(tmp_path) if name.endswith(".corrupt")]
+    assert len(quarantined) == 1
+    assert "SHA256 mismatch" in report['error']
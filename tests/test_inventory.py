@@ -0,0 +1,34 @@
+import json
+
+from comfydl.inventory import is_model_file, scan_models, _snapshot_path
+
+def test_is_model_file_skips_non_models():
+    assert is_model_file("model.safetensors")
+    for name in ("model.safetensors.corrupt", "model.safetensors.part", "model.safetensors.part.json",
+                 "model.safetensors.aria2", "model.safetensors.comfydl", "README.md", ".DS_Store"):
+        assert not is_model_file(name)
+
+def test_scan_skips_quarantined_files(tmp_path):
+    models = tmp_path / "models"
+    (models / "checkpoints").mkdir(parents=True)
+    (models / "checkpoints" / "good.safetensors").write_bytes(b"x" * 10)
+    (models / "checkpoints" / "bad.safetensors.corrupt").write_bytes(b"x" * 20)
+
+    inventory = scan_models(str(models))
+    assert [f['path'] for f in inventory['files']] == ["checkpoints/good.safetensors"]
+    assert inventory['total_size'] == 10
+
+def test_old_snapshot_entries_are_filtered(tmp_path):
+    models = tmp_path / "models"
+    models.mkdir()
+    (models / "good.safetensors").write_bytes(b"x" * 10)
+    (models / "bad.safetensors.corrupt").write_bytes(b"x" * 20)
+    scan_models(str(models), use_snapshot=True)
+    path = _snapshot_path(str(models))
+    snapshot = json.loads(path.read_text())
+    snapshot['dirs']['.']['files'].append(["bad.safetensors.corrupt", 20])
+    path.write_text(json.dumps(snapshot))
+
+    inventory = scan_models(str(models), use_snapshot=True)
+    assert inventory['dirs_reused'] == 1
+    assert [f['path'] for f in inventory['files']] == ["good.safetensors"]
@@ -0,0 +1,26 @@
+from comfydl import hoststats
+from comfydl.mirrors import rank_urls
+
+A = "https://a.example/m.bin"
+B = "https://b.example/m.bin"
+
+def test_measured_host_beats_slower_latency_unmeasured_host():
+    hoststats.record_transfer(A, 10 * hoststats.MIN_SAMPLE_BYTES, 1)
+    hoststats.record_latency(A, 0.05)
+    hoststats.record_latency(B, 0.5)
+    assert rank_urls([B, A], probe=False) == [A, B]
+
+def test_unmeasured_host_with_lower_latency_gets_measured():
+    hoststats.record_transfer(A, 10 * hoststats.MIN_SAMPLE_BYTES, 1)
+    hoststats.record_latency(A, 0.5)
+    hoststats.record_latency(B, 0.05)
+    assert rank_urls([A, B], probe=False) == [B, A]
+
+def test_small_transfers_are_recorded_with_less_weight():
+    hoststats.record_transfer(A, hoststats.MIN_SAMPLE_BYTES, 1)
+    hoststats.record_transfer(A, hoststats.MIN_SAMPLE_BYTES // 10, 1)
+    throughput = hoststats.get_throughput(A)
+    assert hoststats.MIN_SAMPLE_BYTES * 0.9 < throughput < hoststats.MIN_SAMPLE_BYTES
+
+    hoststats.record_transfer(B, 1000, 1)
+    assert hoststats.get_throughput(B) == 1000
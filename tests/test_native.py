@@ -0,0 +1,73 @@
+import json
+import os
+
+from comfydl.native import NativeDownload, get_state_path, seed_state
+
+from conftest import payload
+
+def test_segmented_download(server, tmp_path):
+    data = payload(300 * 1024)
+    url = server.add("/m.bin", data)
+    path = str(tmp_path / "m.bin")
+    NativeDownload(url, path, segments=4, quiet=True).run()
+
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    assert not os.path.exists(get_state_path(path))
+
+def test_resume_fetches_only_missing_bytes(server, tmp_path):
+    data = payload(300 * 1024)
+    url = server.add("/m.bin", data)
+    path = str(tmp_path / "m.bin")
+    done = 100 * 1024
+    with open(path, 'wb') as f:
+        f.write(data[:done])
+    seed_state(path, len(data), done)
+
+    NativeDownload(url, path, segments=2, quiet=True).run()
+
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    ranges = [r for _, _, r in server.gets("/m.bin") if r != "bytes=0-0"]
+    assert ranges == [f"bytes={done}-{len(data) - 1}"]
+    assert not os.path.exists(get_state_path(path))
+
+def test_interrupted_segment_resumes_from_state_file(server, tmp_path):
+    data = payload(200 * 1024)
+    url = server.add("/m.bin", data)
+    path = str(tmp_path / "m.bin")
+    # A previous run wrote half of each of two segments and then died
+    half = len(data) // 2
+    with open(path, 'wb') as f:
+        f.truncate(len(data))
+        f.seek(0)
+        f.write(data[:1000])
+        f.seek(half)
+        f.write(data[half:half + 2000])
+    state = {'size': len(data), 'segments': [
+        {'start': 0, 'end': half - 1, 'done': 1000},
+        {'start': half, 'end': len(data) - 1, 'done': 2000},
+    ]}
+    with open(get_state_path(path), 'w') as f:
+        json.dump(state, f)
+
+    NativeDownload(url, path, quiet=True).run()
+
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    ranges = sorted(r for _, _, r in server.gets("/m.bin") if r != "bytes=0-0")
+    assert ranges == sorted([f"bytes=1000-{half - 1}", f"bytes={half + 2000}-{len(data) - 1}"])
+
+def test_state_for_other_size_is_ignored(server, tmp_path):
+    data = payload(50 * 1024)
+    url = server.add("/m.bin", data)
+    path = str(tmp_path / "m.bin")
+    with open(path, 'wb') as f:
+        f.write(b"\0" * 10)
+    with open(get_state_path(path), 'w') as f:
+        json.dump({'size': 10, 'segments': [{'start': 0, 'end': 9, 'done': 10}]}, f)
+
+    NativeDownload(url, path, quiet=True).run()
+
+    with open(path, 'rb') as f:
+        assert f.read() == data
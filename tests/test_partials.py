@@ -0,0 +1,66 @@
+import os
+
+from comfydl.partials import clean_stale_partials, find_partials, write_journal
+from comfydl.scheduler import download_items
+
+from conftest import payload
+
+def _touch(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def test_find_partials_sees_lone_engine_sidecar(tmp_path):
+    path = str(tmp_path / "models" / "a.bin")
+    _touch(path + ".part.aria2")
+    [partial] = find_partials(str(tmp_path / "models"))
+    assert partial['path'] == path
+    assert partial['state'] == "orphaned"
+
+def test_journal_of_running_download_is_left_alone(tmp_path):
+    path = str(tmp_path / "models" / "a.bin")
+    _touch(path + ".part")
+    write_journal(path, "http://example.com/a.bin")
+    assert clean_stale_partials([str(tmp_path / "models")]) == []
+    assert os.path.exists(path + ".part.json")
+
+def test_clean_removes_leftovers_and_keeps_partial_files(tmp_path):
+    models = tmp_path / "models" / "checkpoints"
+    finished = str(models / "done.bin")
+    _touch(finished)
+    _touch(finished + ".part.json", b"{}")
+    stale_journal = str(models / "gone.bin")
+    _touch(stale_journal + ".part.json", b'{"url": "http://example.com/gone.bin"}')
+    resumable = str(models / "half.bin")
+    _touch(resumable + ".part")
+    _touch(resumable + ".part.json", b'{"url": "http://example.com/half.bin"}')
+    bare_part = str(models / "bare.bin")
+    _touch(bare_part + ".part")
+    elsewhere = str(tmp_path / "models" / "loras" / "done.bin")
+    _touch(elsewhere)
+    _touch(elsewhere + ".part.json", b"{}")
+
+    unfinished = clean_stale_partials([str(models)])
+
+    assert sorted(p['path'] for p in unfinished) == [bare_part, resumable]
+    assert os.path.exists(finished)
+    assert not os.path.exists(finished + ".part.json")
+    assert not os.path.exists(stale_journal + ".part.json")
+    assert os.path.exists(resumable + ".part") and os.path.exists(resumable + ".part.json")
+    assert os.path.exists(bare_part + ".part")
+    # Only the given folders are looked at
+    assert os.path.exists(elsewhere + ".part.json")
+
+def test_download_items_cleans_its_folders_first(server, tmp_path, capsys):
+    url = server.add("/new.bin", payload(1000))
+    folder = tmp_path / "models" / "checkpoints"
+    leftover = str(folder / "old.bin")
+    _touch(leftover)
+    _touch(leftover + ".part.json", b"{}")
+    _touch(str(folder / "half.bin.part"))
+
+    results = download_items([{'url': url, 'path': str(folder / "new.bin")}], "native")
+
+    assert results['succeeded']
+    assert not os.path.exists(leftover + ".part.json")
+    assert "Found 1 other interrupted download(s)" in capsys.readouterr().out
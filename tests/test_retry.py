@@ -0,0 +1,95 @@
+import email.utils
+import time
+
+import pytest
+import requests
+
+from comfydl import retry
+from comfydl.retry import RetryPolicy, is_transient, is_transient_exit, retry_after_seconds
+from comfydl.utils import download_file
+
+from conftest import payload
+
+class _Response:
+    def __init__(self, status, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(retry.time, "sleep", slept.append)
+    return slept
+
+def test_backoff_stays_within_bounds():
+    policy = RetryPolicy(base_delay=1.0, max_delay=8.0)
+    for attempt in range(8):
+        ceiling = min(8.0, 2 ** attempt)
+        for _ in range(50):
+            assert ceiling / 2 <= policy.delay(attempt) <= ceiling
+
+def test_retry_after_seconds_and_date():
+    assert retry_after_seconds(_Response(429, {"Retry-After": "7"})) == 7
+    when = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= retry_after_seconds(_Response(503, {"Retry-After": when})) <= 31
+    assert retry_after_seconds(_Response(503)) is None
+    assert retry_after_seconds(None) is None
+
+def test_retry_after_overrides_backoff_up_to_a_cap():
+    policy = RetryPolicy()
+    assert policy.delay(0, _Response(429, {"Retry-After": "3"})) == 3
+    assert policy.delay(0, _Response(429, {"Retry-After": "100000"})) == retry.MAX_RETRY_AFTER
+
+def test_request_retries_429_and_5xx(no_sleep):
+    responses = [_Response(429, {"Retry-After": "2"}), _Response(503), _Response(200)]
+    response, retries = RetryPolicy(max_attempts=5).request(lambda: responses.pop(0))
+    assert response.status_code == 200
+    assert retries == 2
+    assert no_sleep[0] == 2
+
+def test_request_does_not_retry_4xx(no_sleep):
+    calls = []
+    response, retries = RetryPolicy().request(lambda: calls.append(1) or _Response(404))
+    assert response.status_code == 404
+    assert retries == 0
+    assert len(calls) == 1
+    assert no_sleep == []
+
+def test_request_gives_up_after_max_attempts(no_sleep):
+    calls = []
+    response, retries = RetryPolicy(max_attempts=3).request(lambda: calls.append(1) or _Response(500))
+    assert response.status_code == 500
+    assert len(calls) == 3
+
+def test_transient_errors():
+    assert is_transient(requests.exceptions.ConnectionError())
+    assert is_transient(requests.exceptions.HTTPError(response=_Response(502)))
+    assert not is_transient(requests.exceptions.HTTPError(response=_Response(403)))
+    assert not is_transient(ValueError())
+
+def test_transient_engine_exits():
+    assert is_transient_exit("wget", 4)
+    assert is_transient_exit("wget", 8, "ERROR 503: Service Unavailable.")
+    assert not is_transient_exit("wget", 8, "ERROR 404: Not Found.")
+    assert not is_transient_exit("wget", 8)
+    assert is_transient_exit("aria2c", 29)
+    assert not is_transient_exit("aria2c", 3)
+
+def test_download_retries_server_errors_and_not_404(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    data = payload(64 * 1024)
+    url = server.add("/m.bin", data)
+    server.fail("/m.bin", 503, times=2)
+    report = {}
+    assert download_file(url, str(tmp_path / "m.bin"), "native", quiet=True, report=report)
+    assert report['retries'] >= 1
+
+    missing = server.url("/missing.bin")
+    report = {}
+    assert not download_file(missing, str(tmp_path / "missing.bin"), "native", quiet=True, report=report)
+    assert report['retries'] == 0
+    assert len(server.gets("/missing.bin")) == 1
@@ -0,0 +1,70 @@
+import os
+
+from comfydl.scheduler import DownloadScheduler, host_key, parse_host_limits
+
+from conftest import payload
+
+def _item(url, tmp_path, name, **extra):
+    return dict({'url': url, 'path': str(tmp_path / "models" / name)}, **extra)
+
+def test_parse_host_limits():
+    assert parse_host_limits("huggingface.co=4, civitai.com=2") == {'huggingface.co': 4, 'civitai.com': 2}
+    assert parse_host_limits({'Example.com': 0}) == {'example.com': 1}
+
+def test_host_key_matches_subdomains():
+    limits = {'huggingface.co': 4}
+    assert host_key("https://cdn-lfs.huggingface.co/x", limits) == "huggingface.co"
+    assert host_key("https://example.com/x", limits) == "example.com"
+
+def test_busy_host_does_not_block_other_hosts(server, tmp_path):
+    server.delay = 0.02
+    slow = payload(1024 * 1024)
+    a = server.add("/a.bin", slow)
+    b = server.add("/b.bin", slow)
+    c = server.add("/c.bin", payload(1000)).replace("127.0.0.1", "localhost")
+    done = []
+    scheduler = DownloadScheduler("native", max_concurrent=2, host_limits={'127.0.0.1': 1}, show_progress=False,
+                                  on_file_done=lambda item, ok, retries: done.append(os.path.basename(item['path'])))
+
+    items = [_item(a, tmp_path, "a.bin"), _item(b, tmp_path, "b.bin"), _item(c, tmp_path, "c.bin")]
+    results = scheduler.run(items)
+
+    assert len(results['succeeded']) == 3
+    # c's host had a free slot while b waited for a's host
+    assert done[0] == "c.bin"
+    assert done.index("a.bin") < done.index("b.bin")
+
+def test_priority_orders_downloads(server, tmp_path):
+    low = server.add("/low.bin", payload(100))
+    high = server.add("/high.bin", payload(100, seed=1))
+    done = []
+    scheduler = DownloadScheduler("native", max_concurrent=1, show_progress=False,
+                                  on_file_done=lambda item, ok, retries: done.append(os.path.basename(item['path'])))
+    scheduler.run([_item(low, tmp_path, "low.bin"), _item(high, tmp_path, "high.bin", priority=10)])
+    assert done == ["high.bin", "low.bin"]
+
+def test_failed_item_carries_error(server, tmp_path):
+    ok_url = server.add("/ok.bin", payload(100))
+    missing = server.url("/missing.bin")
+    scheduler = DownloadScheduler("native", max_concurrent=2, show_progress=False)
+    results = scheduler.run([_item(ok_url, tmp_path, "ok.bin"), _item(missing, tmp_path, "missing.bin")])
+
+    assert [os.path.basename(i['path']) for i in results['failed']] == ["missing.bin"]
+    failed = results['failed'][0]
+    assert failed['ok'] is False
+    assert "404" in failed['error']
+    assert results['succeeded'][0]['error'] is None
+
+def test_progress_reports_in_flight_items(server, tmp_path):
+    server.delay = 0.05
+    data = payload(1024 * 1024)
+    url = server.add("/p.bin", data)
+    progress = []
+    scheduler = DownloadScheduler("native", max_concurrent=1, show_progress=False,
+                                  on_progress=lambda item, done, total: progress.append((done, total)))
+    results = scheduler.run([_item(url, tmp_path, "p.bin", size=len(data))])
+
+    assert results['succeeded']
+    assert progress
+    assert all(total == len(data) for _, total in progress)
+    assert all(0 <= done <= len(data) for done, _ in progress)
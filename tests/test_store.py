@@ -0,0 +1,62 @@
+import os
+
+from comfydl.store import ModelStore, blob_key, blob_shard
+
+from conftest import payload
+
+def test_gc_keeps_blob_of_installed_copy(server, tmp_path):
+    url = server.add("/m.bin", payload(5000))
+    store = ModelStore(tmp_path / "store", "copy")
+    dest = tmp_path / "root" / "m.bin"
+    dest.parent.mkdir()
+    assert store.install(url, str(dest), "native", quiet=True)
+
+    assert store.gc() == (0, 0)
+
+def test_gc_drops_blob_when_copy_is_replaced_by_same_size_file(server, tmp_path):
+    url = server.add("/m.bin", payload(5000))
+    store = ModelStore(tmp_path / "store", "copy")
+    dest = tmp_path / "root" / "m.bin"
+    dest.parent.mkdir()
+    assert store.install(url, str(dest), "native", quiet=True)
+
+    os.remove(dest)
+    dest.write_bytes(payload(5000, seed=1))
+    assert store.gc() == (1, 5000)
+
+def test_gc_keeps_hardlinked_blob(server, tmp_path):
+    url = server.add("/m.bin", payload(5000))
+    store = ModelStore(tmp_path / "store", "hardlink")
+    dest = tmp_path / "root" / "m.bin"
+    dest.parent.mkdir()
+    assert store.install(url, str(dest), "native", quiet=True)
+
+    assert store.gc() == (0, 0)
+    os.remove(dest)
+    assert store.gc() == (1, 5000)
+
+def test_url_keys_are_sharded_by_digest(server, tmp_path):
+    url = server.add("/m.bin", payload(1000))
+    store = ModelStore(tmp_path / "store", "hardlink")
+    key = blob_key(url)
+    assert key.startswith("url-")
+    assert blob_shard(key) == key[4:6]
+    dest = tmp_path / "root" / "m.bin"
+    dest.parent.mkdir()
+    assert store.install(url, str(dest), "native", quiet=True)
+    assert os.path.samefile(dest, tmp_path / "store" / "blobs" / key[4:6] / key / "m.bin")
+    assert not (tmp_path / "store" / "blobs" / "ur").exists()
+
+def test_blob_in_legacy_url_shard_is_still_found(server, tmp_path):
+    url = server.add("/m.bin", payload(1000))
+    store = ModelStore(tmp_path / "store", "hardlink")
+    key = blob_key(url)
+    legacy = tmp_path / "store" / "blobs" / "ur" / key / "m.bin"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(payload(1000))
+    dest = tmp_path / "root" / "m.bin"
+    dest.parent.mkdir()
+
+    assert store.install(url, str(dest), "native", quiet=True)
+    assert os.path.samefile(dest, legacy)
+    assert server.gets("/m.bin") == []
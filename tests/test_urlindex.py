@@ -0,0 +1,22 @@
+from comfydl.urlindex import normalize_url
+
+def test_hf_blob_and_resolve_urls_share_a_key():
+    resolve = "https://huggingface.co/org/repo/resolve/main/model.safetensors"
+    assert normalize_url(resolve) == "hf:/org/repo/resolve/main/model.safetensors"
+    assert normalize_url("https://huggingface.co/org/repo/blob/main/model.safetensors") == normalize_url(resolve)
+    assert normalize_url("https://hf.co/org/repo/resolve/main/model.safetensors?download=true") == normalize_url(resolve)
+    assert normalize_url("https://www.huggingface.co/org/repo/resolve/main/model.safetensors/") == normalize_url(resolve)
+
+def test_hf_revisions_stay_distinct():
+    assert normalize_url("https://huggingface.co/org/repo/resolve/main/m.safetensors") != \
+        normalize_url("https://huggingface.co/org/repo/resolve/v2/m.safetensors")
+
+def test_civitai_urls_map_to_version_id():
+    assert normalize_url("https://civitai.com/api/download/models/128713") == "civitai:128713"
+    assert normalize_url("https://civitai.com/api/download/models/128713?type=Model&format=SafeTensor&token=abc") == "civitai:128713"
+    assert normalize_url("https://civitai.com/models/4201/realistic-vision?modelVersionId=128713") == "civitai:128713"
+    assert normalize_url("https://www.civitai.com/models/4201?foo=1&modelVersionId=128713") == "civitai:128713"
+
+def test_other_urls_drop_noise_and_sort_query():
+    assert normalize_url("HTTPS://Example.COM/files/m.bin?b=2&token=secret&a=1") == "example.com/files/m.bin?a=1&b=2"
+    assert normalize_url("http://example.com/files/m.bin") == normalize_url("https://example.com/files/m.bin")